@@ -1,8 +1,28 @@
 """
 The flask application package.
+
+``create_app()`` builds an application: the models and main routes from
+app.py, the pages in views.py and the JSON ``api`` blueprint under /api,
+with the database, login and service extensions bound to it. Each call
+returns a new, independent app; ``config`` overrides the settings read
+from the environment. Run, serve and script it through this factory:
+
+    flask --app Doctor_Patient_communication_system migrate
+    gunicorn -c gunicorn.conf.py
 """
 
 from flask import Flask
-app = Flask(__name__)
 
-import Doctor_Patient_communication_system.views
+
+def create_app(config=None):
+    """Build and return a new application"""
+    import app as core
+    from Doctor_Patient_communication_system import views
+    from Doctor_Patient_communication_system.api_routes import api
+
+    application = Flask(__name__)
+    core.load_config(application, config)
+    core.init_app(application)
+    views.init_app(application)
+    application.register_blueprint(api, url_prefix='/api')
+    return application
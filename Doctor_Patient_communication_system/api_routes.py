@@ -1,36 +1,84 @@
 # api_routes.py
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request, stream_with_context
 from flask_login import current_user, login_required
-from models import User, MedicalRecord, Discussion, Comment
-from app import db
-from datetime import datetime
+from flask import current_app
+from app import db, User, MedicalRecord, Discussion, ChatHistory
+from Doctor_Patient_communication_system.chat_archive import read_archive
+from Doctor_Patient_communication_system.pagination import (
+    StreamedPage, encode_cursor, decode_cursor, keyset_page, parse_datetime, stream_json_page
+)
+from Doctor_Patient_communication_system.response_cache import cached_response
+from Doctor_Patient_communication_system.search import KINDS as SEARCH_KINDS, search
 
 api = Blueprint('api', __name__)
 
+RECORD_TEXT_FIELDS = ('prescription', 'notes', 'summary')
+DEFAULT_RECORD_FIELDS = ('summary',)
+
+# Dashboard polls: cached per role until a commit touches one of the listed tables
 @api.route('/patients', methods=['GET'])
 @login_required
+@cached_response('user', 'medical_record')
 def get_patients():
     if not current_user.is_doctor:
         return jsonify({'error': 'Unauthorized access'}), 403
     
-    patients = User.query.filter_by(is_doctor=False).all()
+    # Every patient by default; keyset pages on patient id are opt-in:
+    # ?limit=<n>&after_id=<last id of previous page>
+    after_id = request.args.get('after_id', 0, type=int)
+    limit = request.args.get('limit', type=int)
+    if limit is not None:
+        limit = min(max(limit, 1), 500)
+    
+    # One statement: the page of patients, joined to a grouped pass over just
+    # their records (served by the user_id/record_date index)
+    page = db.session.query(
+        User.id.label('id'), User.username.label('username'), User.email.label('email')
+    ).filter(
+        User.is_doctor == False, User.id > after_id
+    ).order_by(
+        User.id
+    )
+    if limit is not None:
+        page = page.limit(limit)
+    page = page.subquery()
+    
+    record_stats = db.session.query(
+        MedicalRecord.user_id.label('user_id'),
+        db.func.max(MedicalRecord.record_date).label('last_visit'),
+        db.func.count(MedicalRecord.id).label('record_count')
+    ).filter(
+        MedicalRecord.user_id.in_(db.select(page.c.id))
+    ).group_by(
+        MedicalRecord.user_id
+    ).subquery()
+    
+    patients = db.session.query(
+        page.c.id, page.c.username, page.c.email, record_stats.c.last_visit, record_stats.c.record_count
+    ).outerjoin(
+        record_stats, record_stats.c.user_id == page.c.id
+    ).order_by(
+        page.c.id
+    ).all()
     
     patients_data = []
-    for patient in patients:
-        last_record = MedicalRecord.query.filter_by(user_id=patient.id).order_by(MedicalRecord.record_date.desc()).first()
-        
+    for patient_id, username, email, last_visit, record_count in patients:
         patients_data.append({
-            'id': patient.id,
-            'username': patient.username,
-            'email': patient.email,
-            'last_visit': last_record.record_date.isoformat() if last_record else None,
-            'record_count': len(patient.medical_records)
+            'id': patient_id,
+            'username': username,
+            'email': email,
+            'last_visit': last_visit.isoformat() if last_visit else None,
+            'record_count': record_count or 0
         })
     
-    return jsonify({'patients': patients_data})
+    if limit is None:
+        return jsonify({'patients': patients_data})
+    next_after_id = patients_data[-1]['id'] if len(patients_data) == limit else None
+    return jsonify({'patients': patients_data, 'next_after_id': next_after_id})
 
 @api.route('/recent_records', methods=['GET'])
 @login_required
+@cached_response('user', 'medical_record')
 def get_recent_records():
     if not current_user.is_doctor:
         return jsonify({'error': 'Unauthorized access'}), 403
@@ -57,33 +105,40 @@ def get_recent_records():
 
 @api.route('/recent_discussions', methods=['GET'])
 @login_required
+@cached_response('user', 'discussion', 'comment')
 def get_recent_discussions():
-    discussions = db.session.query(
-        Discussion, 
-        User.username.label('author_name'),
-        db.func.count(Comment.id).label('comment_count')
+    # Cursor pagination on (date_posted, id); comment counts are denormalized
+    # on Discussion, so no join against comment is needed
+    limit = min(max(request.args.get('limit', 5, type=int), 1), 100)
+    try:
+        after = decode_cursor(request.args['cursor'], (parse_datetime, int)) if request.args.get('cursor') else None
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    
+    query = db.session.query(
+        Discussion, User.username.label('author_name')
     ).join(
         User, Discussion.user_id == User.id
-    ).outerjoin(
-        Comment, Discussion.id == Comment.discussion_id
-    ).group_by(
-        Discussion.id
-    ).order_by(
-        Discussion.date_posted.desc()
-    ).limit(5).all()
+    )
+    discussions, has_more = keyset_page(query, [Discussion.date_posted, Discussion.id], after=after, limit=limit)
     
     discussions_data = []
-    for discussion, author_name, comment_count in discussions:
+    for discussion, author_name in discussions:
         discussions_data.append({
             'id': discussion.id,
             'title': discussion.title,
             'content': discussion.content,
             'date_posted': discussion.date_posted.isoformat(),
             'author_name': author_name,
-            'comment_count': comment_count
+            'comment_count': discussion.comment_count
         })
     
-    return jsonify({'discussions': discussions_data})
+    next_cursor = None
+    if has_more:
+        last = discussions[-1][0]
+        next_cursor = encode_cursor(last.date_posted, last.id)
+    
+    return jsonify({'discussions': discussions_data, 'next_cursor': next_cursor})
 
 @api.route('/medical_record/<int:record_id>', methods=['GET'])
 @login_required
@@ -116,15 +171,115 @@ def get_patient_records(user_id):
     if not current_user.is_doctor and user_id != current_user.id:
         return jsonify({'error': 'Unauthorized access'}), 403
     
-    records = MedicalRecord.query.filter_by(user_id=user_id).order_by(MedicalRecord.record_date.desc()).all()
+    # Records carry id, record_date, diagnosis and summary; ?fields= picks the
+    # text columns instead (e.g. ?fields=notes, or ?fields= for none of them)
+    if 'fields' in request.args:
+        fields = [field.strip() for field in request.args['fields'].split(',') if field.strip()]
+    else:
+        fields = list(DEFAULT_RECORD_FIELDS)
+    unknown = [field for field in fields if field not in RECORD_TEXT_FIELDS]
+    if unknown:
+        return jsonify({'error': f'Unknown fields: {", ".join(unknown)}'}), 400
     
-    records_data = []
-    for record in records:
-        records_data.append({
-            'id': record.id,
-            'record_date': record.record_date.isoformat(),
-            'diagnosis': record.diagnosis,
-            'summary': record.summary
-        })
+    # Optional keyset pages on (record_date, id), newest first; no limit returns everything
+    limit = request.args.get('limit', type=int)
+    if limit is not None:
+        limit = min(max(limit, 1), 1000)
+    try:
+        after = decode_cursor(request.args['cursor'], (parse_datetime, int)) if request.args.get('cursor') else None
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    
+    columns = [MedicalRecord.id, MedicalRecord.record_date, MedicalRecord.diagnosis]
+    columns += [getattr(MedicalRecord, field) for field in fields]
+    page = StreamedPage(
+        db.session, db.select(*columns).where(MedicalRecord.user_id == user_id),
+        [MedicalRecord.record_date, MedicalRecord.id], key=lambda row: (row.record_date, row.id),
+        after=after, limit=limit
+    )
+    
+    def serialize(row):
+        record = dict(row._mapping)
+        record['record_date'] = row.record_date.isoformat()
+        return record
+    
+    # ?stream=1 serializes rows as they come off the cursor, so memory stays
+    # flat for very long histories
+    if request.args.get('stream') == '1':
+        return Response(stream_with_context(stream_json_page(page, 'records', serialize)), mimetype='application/json')
+    
+    response = {'records': [serialize(row) for row in page]}
+    if limit is not None:
+        response['next_cursor'] = page.next_cursor
+    return jsonify(response)
+
+@api.route('/search', methods=['GET'])
+@login_required
+def search_records():
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Query is required'}), 400
+    
+    kind = request.args.get('type', 'all')
+    if kind != 'all' and kind not in SEARCH_KINDS:
+        return jsonify({'error': 'Invalid search type'}), 400
+    page = request.args.get('page', 1, type=int)
+    per_page = min(max(request.args.get('per_page', current_app.config['SEARCH_RESULTS_PER_PAGE'], type=int), 1), 100)
+    if page < 1:
+        return jsonify({'error': 'Invalid page'}), 400
+    
+    # Patients only match their own records; snippets are escaped HTML with <mark> highlights
+    results, has_more = search(
+        db.session.connection(), query, current_user.id, current_user.is_doctor,
+        kinds=SEARCH_KINDS if kind == 'all' else (kind,), page=page, per_page=per_page
+    )
+    for result in results:
+        result['date'] = result['date'].isoformat() if result['date'] else None
+    
+    return jsonify({'results': results, 'page': page, 'has_more': has_more})
+
+@api.route('/chat_history', methods=['GET'])
+@login_required
+def get_chat_history():
+    # Doctors may read any user's history; everyone else only their own
+    user_id = request.args.get('user_id', current_user.id, type=int)
+    if not current_user.is_doctor and user_id != current_user.id:
+        return jsonify({'error': 'Unauthorized access'}), 403
+    
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+    include_archive = request.args.get('include_archive', '0') in ('1', 'true', 'yes')
+    try:
+        after = decode_cursor(request.args['cursor'], (parse_datetime, int)) if request.args.get('cursor') else None
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    
+    # Newest first on (timestamp, id), served by the (user_id, timestamp) index
+    query = ChatHistory.query.filter(ChatHistory.user_id == user_id)
+    rows, has_more = keyset_page(query, [ChatHistory.timestamp, ChatHistory.id], after=after, limit=limit)
+    
+    messages = [{
+        'id': row.id,
+        'message': row.message,
+        'response': row.response,
+        'timestamp': row.timestamp.isoformat(),
+        'archived': False
+    } for row in rows]
+    last_key = (rows[-1].timestamp, rows[-1].id) if rows else after
+    
+    # Archived rows are all older than the hot table, so continue into them
+    if include_archive and not has_more:
+        archived = read_archive(current_app.config['CHAT_ARCHIVE_DIR'], user_id, before=last_key,
+                                limit=limit - len(messages) + 1)
+        has_more = len(archived) > limit - len(messages)
+        for row in archived[:limit - len(messages)]:
+            messages.append({
+                'id': row['id'],
+                'message': row['message'],
+                'response': row['response'],
+                'timestamp': row['timestamp'].isoformat(),
+                'archived': True
+            })
+            last_key = (row['timestamp'], row['id'])
     
-    return jsonify({'records': records_data})
\ No newline at end of file
+    next_cursor = encode_cursor(*last_key) if has_more and last_key else None
+    return jsonify({'messages': messages, 'next_cursor': next_cursor})
@@ -0,0 +1,143 @@
+# auth.py
+"""
+Authentication hot-path helpers.
+
+``UserCache`` lets Flask-Login's user loader skip the database: users are
+kept as detached snapshots for a short TTL and merged into the request's
+session without a query. Entries are only served while the user table's
+shared version (see table_versions.py) is the one they were loaded under,
+so a commit changing any user in any worker process retires them.
+
+``PasswordHasher`` runs PBKDF2 hashing and verification in a small thread
+pool, so a burst of logins occupies at most ``max_workers`` cores and
+request threads serving everyone else keep running. The work factor is
+configurable, and hashes made with another method or cost are reported by
+``needs_rehash`` so login can upgrade them.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class UserCache:
+    """TTL cache of user rows for ``load_user``, validated by ``TableVersions``"""
+
+    def __init__(self, session, model, versions, ttl=None, max_entries=None):
+        self.session = session
+        self.model = model
+        self.table_versions = versions
+        self.tables = (model.__table__.name,)
+        self.ttl = float(os.environ.get('USER_CACHE_TTL', 60) if ttl is None else ttl)
+        self.max_entries = max_entries or int(os.environ.get('USER_CACHE_SIZE', 4096))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _snapshot(self, instance):
+        mapper = inspect(instance).mapper
+        snapshot = self.model(**{attr.key: getattr(instance, attr.key) for attr in mapper.column_attrs})
+        make_transient_to_detached(snapshot)
+        return snapshot
+
+    def get(self, user_id):
+        """The user attached to the current session, or None if it does not exist"""
+        if self.ttl <= 0:
+            return self.session.get(self.model, user_id)
+
+        now = time.monotonic()
+        # Read before loading, so a load racing a commit is cached as already stale
+        version = self.table_versions.get(self.tables)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now and entry[2] == version:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                snapshot = entry[1]
+            else:
+                self.misses += 1
+                snapshot = None
+        if snapshot is not None:
+            # load=False copies the snapshot into the session without a SELECT
+            return self.session.merge(snapshot, load=False)
+
+        user = self.session.get(self.model, user_id)
+        if user is not None:
+            snapshot = self._snapshot(user)
+            with self._lock:
+                self._entries[user_id] = (now + self.ttl, snapshot, version)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return user
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses, 'ttl': self.ttl}
+
+
+class HasherBusy(Exception):
+    """Raised when too many hash operations are already queued"""
+
+
+class PasswordHasher:
+    """PBKDF2-SHA256 hashing on a bounded pool with a configurable iteration count"""
+
+    def __init__(self, iterations=None, max_workers=None, max_pending=None):
+        self.iterations = iterations or int(os.environ.get('PASSWORD_HASH_ITERATIONS', 600000))
+        self.max_workers = max_workers or int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+        max_pending = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 32) if max_pending is None else max_pending)
+        self.method = f'pbkdf2:sha256:{self.iterations}'
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(self.max_workers + max_pending)
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.rejected = 0
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HasherBusy("Password hashing queue is full")
+        try:
+            future = self._pool.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(self._done)
+        # hashlib releases the GIL while deriving, so waiting here costs other threads nothing
+        return future.result()
+
+    def _done(self, future):
+        self._slots.release()
+        with self._lock:
+            self.completed += 1
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """Whether ``pwhash`` was made with a different method or work factor"""
+        return not pwhash.startswith(self.method + '$')
+
+    def stats(self):
+        with self._lock:
+            return {'method': self.method, 'workers': self.max_workers,
+                    'completed': self.completed, 'rejected': self.rejected}
+
+    def close(self):
+        self._pool.shutdown(wait=False)
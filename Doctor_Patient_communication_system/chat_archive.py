@@ -0,0 +1,99 @@
+# chat_archive.py
+"""
+Monthly rollover of old chat history into compressed archive files.
+
+Rows older than the cutoff are appended to
+``<archive_dir>/chat_history_YYYY_MM.ndjson.gz`` (one gzip member per run,
+so a month can be archived across several runs) and then deleted from the
+hot table, keeping it small. Archived conversations are still readable
+through ``read_archive``.
+"""
+
+import gzip
+import json
+import os
+import re
+from datetime import datetime
+
+from sqlalchemy import delete, select
+
+ARCHIVE_NAME = re.compile(r'^chat_history_(\d{4})_(\d{2})\.ndjson\.gz$')
+
+
+def archive_path(archive_dir, year, month):
+    return os.path.join(archive_dir, f"chat_history_{year:04d}_{month:02d}.ndjson.gz")
+
+
+def archive_chat_history(session, model, before, archive_dir, batch_size=5000):
+    """Move rows with timestamp < ``before`` into monthly archive files; returns rows moved"""
+    os.makedirs(archive_dir, exist_ok=True)
+    moved = 0
+    while True:
+        rows = session.execute(
+            select(model.id, model.user_id, model.message, model.response, model.timestamp)
+            .where(model.timestamp < before)
+            .order_by(model.timestamp, model.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return moved
+
+        by_month = {}
+        for row in rows:
+            by_month.setdefault((row.timestamp.year, row.timestamp.month), []).append(row)
+
+        # Write and fsync the archive before deleting, so a crash can only
+        # leave duplicates (skipped on read), never lose rows
+        for (year, month), month_rows in by_month.items():
+            with open(archive_path(archive_dir, year, month), 'ab') as raw:
+                with gzip.GzipFile(fileobj=raw, mode='ab') as f:
+                    for row in month_rows:
+                        f.write((json.dumps({
+                            'id': row.id,
+                            'user_id': row.user_id,
+                            'message': row.message,
+                            'response': row.response,
+                            'timestamp': row.timestamp.isoformat(),
+                        }) + "\n").encode('utf-8'))
+                raw.flush()
+                os.fsync(raw.fileno())
+
+        session.execute(delete(model).where(model.id.in_([row.id for row in rows])))
+        session.commit()
+        moved += len(rows)
+
+
+def archive_months(archive_dir):
+    """(year, month) of every archive file, newest first"""
+    if not os.path.isdir(archive_dir):
+        return []
+    months = []
+    for name in os.listdir(archive_dir):
+        match = ARCHIVE_NAME.match(name)
+        if match:
+            months.append((int(match.group(1)), int(match.group(2))))
+    return sorted(months, reverse=True)
+
+
+def read_archive(archive_dir, user_id, before=None, limit=50):
+    """Archived messages for a user, newest first, older than the (timestamp, id) key ``before``"""
+    results = []
+    for year, month in archive_months(archive_dir):
+        if before is not None and (year, month) > (before[0].year, before[0].month):
+            continue
+        seen = set()
+        month_rows = []
+        with gzip.open(archive_path(archive_dir, year, month), 'rt', encoding='utf-8') as f:
+            for line in f:
+                row = json.loads(line)
+                if row['user_id'] != user_id or row['id'] in seen:
+                    continue
+                seen.add(row['id'])
+                row['timestamp'] = datetime.fromisoformat(row['timestamp'])
+                if before is None or (row['timestamp'], row['id']) < tuple(before):
+                    month_rows.append(row)
+        month_rows.sort(key=lambda r: (r['timestamp'], r['id']), reverse=True)
+        results.extend(month_rows)
+        if len(results) >= limit:
+            break
+    return results[:limit]
@@ -0,0 +1,90 @@
+# extensions.py
+"""
+Lazily built, fork-aware services for the app factory.
+
+A ``LazyExtension`` wraps a factory: the service is built on first use and
+then reused by the process. Threads, locks and sockets do not survive
+fork, so a forked worker that touches an extension built by the master
+gets its own fresh copy instead. Attribute access is forwarded to the
+service, so call sites use the extension as if it were the service.
+
+``after_fork`` registers callbacks that run in every forked child (gunicorn
+workers included), for state that is reset rather than rebuilt, such as
+database connection pools and the batch schedulers' worker threads.
+
+Extensions belong to one app; their factories close over it, and work they
+hand to their threads is wrapped with ``in_app_context``.
+"""
+
+import functools
+import os
+import threading
+import weakref
+
+_after_fork_hooks = []
+_extensions = weakref.WeakSet()
+
+
+def after_fork(fn):
+    """Decorator: run ``fn()`` in each child process after a fork"""
+    _after_fork_hooks.append(fn)
+    return fn
+
+
+def _run_after_fork():
+    for extension in list(_extensions):
+        extension._lock = threading.Lock()
+    for fn in _after_fork_hooks:
+        try:
+            fn()
+        except Exception as e:
+            print(f"After-fork hook {fn.__name__} failed: {str(e)}")
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_run_after_fork)
+
+
+def in_app_context(app, fn):
+    """``fn`` wrapped to run inside ``app``'s application context, for service threads"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with app.app_context():
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+class LazyExtension:
+    """A service built on first use, once per process"""
+
+    def __init__(self, name, factory):
+        self.name = name
+        self.factory = factory
+        self._instance = None
+        self._pid = None
+        self._lock = threading.Lock()
+        _extensions.add(self)
+
+    def init_app(self, app):
+        app.extensions[self.name] = self
+
+    @property
+    def loaded(self):
+        """Whether this process has built the service"""
+        return self._instance is not None and self._pid == os.getpid()
+
+    def get(self):
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._instance = self.factory()
+                    self._pid = pid
+        return self._instance
+
+    def __getattr__(self, attr):
+        # Only reached for attributes not set in __init__, i.e. the service's
+        return getattr(self.get(), attr)
+
+    def __repr__(self):
+        return f"<LazyExtension {self.name} {'loaded' if self.loaded else 'not loaded'}>"
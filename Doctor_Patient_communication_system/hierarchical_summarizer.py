@@ -0,0 +1,144 @@
+# hierarchical_summarizer.py
+import re
+from bisect import bisect_left, bisect_right
+
+# Sentence ends: terminal punctuation followed by whitespace, or a blank line
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+|\n\s*\n')
+
+
+class HierarchicalSummarizer:
+    """Map-reduce summarization for inputs longer than the model's context
+
+    The input is tokenized once; its offset mapping is used to cut chunks on
+    sentence boundaries (falling back to token boundaries for run-on
+    sentences), with a few sentences of overlap between neighbours. All
+    chunks are summarized in one batched call, then the chunk summaries are
+    grouped and summarized again, level by level, until they fit the
+    context or ``max_levels`` is reached. If they still do not fit, a last
+    pass summarizes as much of them as one context holds and the rest is
+    dropped with a warning. Pass an ``EncodingCache`` as
+    ``encodings`` to share tokenizations with the rest of the service.
+    """
+
+    def __init__(self, tokenizer, summarize_batch, max_tokens, overlap_tokens=64, max_levels=3,
+                 chunk_max_length=100, chunk_min_length=30, encodings=None):
+        self.tokenizer = tokenizer
+        self.encodings = encodings
+        self.summarize_batch = summarize_batch
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.max_levels = max_levels
+        self.chunk_max_length = chunk_max_length
+        self.chunk_min_length = chunk_min_length
+
+    def summarize(self, text, max_length, min_length):
+        offsets = self._offsets(text)
+
+        if len(offsets) <= self.max_tokens:
+            return self.summarize_batch([text], max_length=max_length, min_length=min_length)[0]
+
+        # Map: every chunk in one batched call
+        chunks = self.chunk(text, offsets)
+        summaries = self.summarize_batch(chunks, max_length=self.chunk_max_length, min_length=self.chunk_min_length)
+
+        # Reduce: summarize groups of summaries until they fit in one context
+        for _ in range(self.max_levels):
+            lengths = self._token_lengths(summaries)
+            if sum(lengths) + len(lengths) <= self.max_tokens:
+                break
+            groups = self._group(summaries, lengths)
+            if len(groups) == len(summaries):
+                # Every summary already fills a context on its own; grouping cannot shrink it
+                break
+            summaries = self.summarize_batch(
+                [" ".join(group) for group in groups],
+                max_length=self.chunk_max_length, min_length=self.chunk_min_length
+            )
+
+        combined = " ".join(summaries)
+        offsets = self._offsets(combined)
+        if len(offsets) <= self.max_tokens:
+            return combined
+
+        # Out of levels: summarize what fits in one context rather than
+        # return raw, truncated chunk summaries
+        print(f"Summary input still {len(offsets)} tokens after reducing; "
+              f"dropping {len(offsets) - self.max_tokens} tokens")
+        truncated = combined[:offsets[self.max_tokens - 1][1]]
+        return self.summarize_batch([truncated], max_length=max_length, min_length=min_length)[0]
+
+    def chunk(self, text, offsets):
+        """Split ``text`` into chunks of at most ``max_tokens`` tokens using its offset mapping"""
+        token_starts = [start for start, _ in offsets]
+        token_ends = [end for _, end in offsets]
+
+        # Token span of every sentence
+        sentences = []
+        position = 0
+        for match in list(SENTENCE_BOUNDARY.finditer(text)) + [None]:
+            end = match.start() if match else len(text)
+            first = bisect_left(token_ends, position + 1)
+            last = bisect_right(token_starts, end - 1)
+            if last > first:
+                sentences.extend(self._split_long_span(first, last))
+            position = match.end() if match else len(text)
+
+        chunks = []
+        current = []
+        current_tokens = 0
+        for first, last in sentences:
+            size = last - first
+            if current and current_tokens + size > self.max_tokens:
+                chunks.append(current)
+                # Carry trailing sentences into the next chunk as overlap
+                overlap = []
+                overlap_tokens = 0
+                for span in reversed(current):
+                    span_size = span[1] - span[0]
+                    if overlap_tokens + span_size > self.overlap_tokens or overlap_tokens + span_size + size > self.max_tokens:
+                        break
+                    overlap.insert(0, span)
+                    overlap_tokens += span_size
+                current = overlap
+                current_tokens = overlap_tokens
+            current.append((first, last))
+            current_tokens += size
+        if current:
+            chunks.append(current)
+
+        return [text[offsets[spans[0][0]][0]:offsets[spans[-1][1] - 1][1]] for spans in chunks]
+
+    def _split_long_span(self, first, last):
+        spans = []
+        while last - first > self.max_tokens:
+            spans.append((first, first + self.max_tokens))
+            first += self.max_tokens
+        spans.append((first, last))
+        return spans
+
+    def _offsets(self, text):
+        if self.encodings is not None:
+            return self.encodings.encode(text)['offset_mapping']
+        return self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)['offset_mapping']
+
+    def _token_lengths(self, texts):
+        if self.encodings is not None:
+            return self.encodings.lengths(texts)
+        encoded = self.tokenizer(texts, add_special_tokens=False)['input_ids']
+        return [len(ids) for ids in encoded]
+
+    def _group(self, texts, lengths):
+        groups = []
+        current = []
+        current_tokens = 0
+        for text, length in zip(texts, lengths):
+            if current and current_tokens + length + 1 > self.max_tokens:
+                groups.append(current)
+                current = []
+                current_tokens = 0
+            current.append(text)
+            current_tokens += length + 1
+        if current:
+            groups.append(current)
+        return groups
+
@@ -0,0 +1,223 @@
+# inference_backend.py
+"""
+Selectable CPU inference backends for the app's models and LLMService.
+
+    torch  plain fp32 PyTorch (default)
+    int8   PyTorch with nn.Linear layers dynamically quantized to int8
+    onnx   ONNX Runtime graphs exported with optimum
+
+Both load their pipelines through ``load_pipeline``, choosing the backend
+with INFERENCE_BACKEND and the exported copies' location with
+MODEL_EXPORT_DIR. Export/quantize once, then check quality against fp32:
+
+    python -m Doctor_Patient_communication_system.inference_backend export --backend onnx
+    python -m Doctor_Patient_communication_system.inference_backend export --backend int8
+    python -m Doctor_Patient_communication_system.inference_backend check --backend int8
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import torch
+
+try:
+    from optimum.onnxruntime import ORTModelForQuestionAnswering, ORTModelForSeq2SeqLM
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
+BACKENDS = ('torch', 'int8', 'onnx')
+DEFAULT_EXPORT_DIR = os.path.join('models', 'exported')
+
+# transformers pipeline task for each of our task names
+PIPELINE_TASKS = {
+    'summarization': 'summarization',
+    'qa': 'question-answering',
+    'translation': 'translation',
+}
+
+
+def _export_path(export_dir, backend, model_name):
+    return os.path.join(export_dir, backend, model_name.replace('/', '--'))
+
+
+def quantize_int8(model):
+    """Dynamically quantize every nn.Linear to int8 (weights int8, activations quantized per batch)"""
+    model.eval()
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_model(model_name, model_cls, task, backend='torch', export_dir=DEFAULT_EXPORT_DIR, **load_kwargs):
+    """Load a model for the given backend, preferring a previously exported copy"""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}', expected one of {', '.join(BACKENDS)}")
+
+    if backend == 'torch':
+        return model_cls.from_pretrained(model_name, **load_kwargs)
+
+    if backend == 'int8':
+        path = os.path.join(_export_path(export_dir, 'int8', model_name), 'model.pt')
+        if os.path.exists(path):
+            return torch.load(path, weights_only=False)
+        return quantize_int8(model_cls.from_pretrained(model_name, **load_kwargs))
+
+    if not ONNX_AVAILABLE:
+        raise RuntimeError("The onnx backend requires optimum[onnxruntime] to be installed")
+    ort_cls = ORTModelForQuestionAnswering if task == 'qa' else ORTModelForSeq2SeqLM
+    path = _export_path(export_dir, 'onnx', model_name)
+    if os.path.isdir(path):
+        return ort_cls.from_pretrained(path)
+    return ort_cls.from_pretrained(model_name, export=True)
+
+
+def load_pipeline(task, model_name, backend='torch', export_dir=DEFAULT_EXPORT_DIR, mmap_weights=False,
+                  device='cpu'):
+    """A frozen transformers pipeline for ``task`` whose model is loaded through ``backend``"""
+    from transformers import AutoModelForQuestionAnswering, AutoModelForSeq2SeqLM, AutoTokenizer, pipeline
+    from Doctor_Patient_communication_system.shared_weights import freeze_model, mmap_load_kwargs
+
+    model_cls = AutoModelForQuestionAnswering if task == 'qa' else AutoModelForSeq2SeqLM
+    load_kwargs = mmap_load_kwargs() if mmap_weights and backend != 'onnx' else {}
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = load_model(model_name, model_cls, task, backend=backend, export_dir=export_dir, **load_kwargs)
+    if backend == 'torch':
+        model = model.to(device)
+    return pipeline(PIPELINE_TASKS[task], model=freeze_model(model), tokenizer=tokenizer,
+                    device=0 if device == 'cuda' else -1)
+
+
+def export_model(model_name, model_cls, task, backend, export_dir=DEFAULT_EXPORT_DIR):
+    """Write the exported/quantized model to disk so workers can load it without converting"""
+    from transformers import AutoTokenizer
+
+    path = _export_path(export_dir, backend, model_name)
+    os.makedirs(path, exist_ok=True)
+
+    if backend == 'int8':
+        model = quantize_int8(model_cls.from_pretrained(model_name))
+        torch.save(model, os.path.join(path, 'model.pt'))
+    elif backend == 'onnx':
+        if not ONNX_AVAILABLE:
+            raise RuntimeError("The onnx backend requires optimum[onnxruntime] to be installed")
+        ort_cls = ORTModelForQuestionAnswering if task == 'qa' else ORTModelForSeq2SeqLM
+        ort_cls.from_pretrained(model_name, export=True).save_pretrained(path)
+    else:
+        raise ValueError(f"Nothing to export for backend '{backend}'")
+
+    AutoTokenizer.from_pretrained(model_name).save_pretrained(path)
+    return path
+
+
+# Quality check samples: short clinical notes and questions about them
+CHECK_SAMPLES = [
+    "Patient is a 54-year-old male presenting with chest pain radiating to the left arm for two hours. "
+    "ECG showed ST elevation in leads II, III and aVF. Troponin was elevated. He was taken for emergent "
+    "catheterization and a stent was placed in the right coronary artery. Discharged on aspirin, "
+    "clopidogrel, atorvastatin and metoprolol with cardiology follow-up in two weeks.",
+    "The patient reports a persistent dry cough and low-grade fever for five days. Chest X-ray shows a "
+    "right lower lobe infiltrate consistent with community-acquired pneumonia. Started on amoxicillin "
+    "for seven days. Advised rest, fluids and to return if shortness of breath worsens.",
+    "Follow-up visit for type 2 diabetes. HbA1c has improved from 8.9 to 7.1 percent since metformin was "
+    "increased. Blood pressure is 128 over 82. Continue current regimen, recheck labs in three months and "
+    "schedule an annual eye examination.",
+]
+CHECK_QUESTIONS = [
+    "Which artery received a stent?",
+    "What antibiotic was started?",
+    "What was the latest HbA1c?",
+]
+
+
+def _token_f1(reference, candidate):
+    ref = reference.lower().split()
+    cand = candidate.lower().split()
+    if not ref or not cand:
+        return float(ref == cand)
+    common = 0
+    remaining = list(ref)
+    for token in cand:
+        if token in remaining:
+            remaining.remove(token)
+            common += 1
+    if common == 0:
+        return 0.0
+    precision = common / len(cand)
+    recall = common / len(ref)
+    return 2 * precision * recall / (precision + recall)
+
+
+def _timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def check_quality(backend, export_dir=DEFAULT_EXPORT_DIR):
+    """Compare a backend's outputs and latency against fp32 torch on the check samples"""
+    from Doctor_Patient_communication_system.llm_service import LLMService
+    from Doctor_Patient_communication_system.result_cache import create_cache
+
+    # A zero-size cache so every call really runs the model
+    reference = LLMService(backend='torch', result_cache=create_cache('memory', max_entries=0))
+    candidate = LLMService(backend=backend, export_dir=export_dir, result_cache=create_cache('memory', max_entries=0))
+
+    report = {'backend': backend, 'tasks': {}}
+    tasks = {
+        'summarization': [(lambda svc, text=text: svc.summarize_text(text)) for text in CHECK_SAMPLES],
+        'translation': [(lambda svc, text=text: svc.translate_text(text.split('. ')[0])) for text in CHECK_SAMPLES],
+        'qa': [(lambda svc, q=q, c=c: svc.answer_question(q, c)) for q, c in zip(CHECK_QUESTIONS, CHECK_SAMPLES)],
+    }
+    for task, calls in tasks.items():
+        # Warm both services so load time is not counted as latency
+        calls[0](reference)
+        calls[0](candidate)
+
+        f1s, exact, ref_time, cand_time = [], 0, 0.0, 0.0
+        for call in calls:
+            expected, t_ref = _timed(call, reference)
+            actual, t_cand = _timed(call, candidate)
+            f1s.append(_token_f1(expected, actual))
+            exact += int(expected.strip() == actual.strip())
+            ref_time += t_ref
+            cand_time += t_cand
+        report['tasks'][task] = {
+            'samples': len(calls),
+            'exact_match': exact / len(calls),
+            'mean_token_f1': sum(f1s) / len(f1s),
+            'fp32_mean_latency_s': ref_time / len(calls),
+            'backend_mean_latency_s': cand_time / len(calls),
+            'speedup': (ref_time / cand_time) if cand_time else None,
+        }
+    return report
+
+
+def main(argv=None):
+    from transformers import AutoModelForQuestionAnswering, AutoModelForSeq2SeqLM
+    from Doctor_Patient_communication_system.llm_service import MODEL_NAMES
+    from Doctor_Patient_communication_system.translation_engine import LANGUAGE_PAIR_MODELS
+
+    parser = argparse.ArgumentParser(description="Export, quantize and check LLMService inference backends")
+    parser.add_argument('command', choices=['export', 'check'])
+    parser.add_argument('--backend', choices=['int8', 'onnx'], required=True)
+    parser.add_argument('--export-dir', default=DEFAULT_EXPORT_DIR)
+    args = parser.parse_args(argv)
+
+    if args.command == 'export':
+        for task, model_name in MODEL_NAMES.items():
+            model_cls = AutoModelForQuestionAnswering if task == 'qa' else AutoModelForSeq2SeqLM
+            path = export_model(model_name, model_cls, task, args.backend, export_dir=args.export_dir)
+            print(f"{task}: exported {model_name} to {path}")
+        for (source, target), model_name in LANGUAGE_PAIR_MODELS.items():
+            path = export_model(model_name, AutoModelForSeq2SeqLM, 'translation', args.backend, export_dir=args.export_dir)
+            print(f"translation {source}-{target}: exported {model_name} to {path}")
+        return 0
+
+    print(json.dumps(check_quality(args.backend, export_dir=args.export_dir), indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,320 @@
+# inference_scheduler.py
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import Future
+
+from Doctor_Patient_communication_system.extensions import after_fork
+
+# Live schedulers, so a forked child can drop the worker threads it did not inherit
+_schedulers = weakref.WeakSet()
+
+
+class _PendingRequest:
+    """A single caller's input waiting to be batched"""
+
+    __slots__ = ("item", "params", "future", "enqueued_at")
+
+    def __init__(self, item, params):
+        self.item = item
+        self.params = params
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class BatchScheduler:
+    """Collects concurrent inference requests into batched pipeline calls
+
+    Requests that arrive within ``max_wait_ms`` of each other (up to
+    ``max_batch_size``) are passed to ``batch_fn`` as one list. ``batch_fn``
+    must return one result per input, in order. Requests are only batched
+    together when they share the same keyword parameters, since generation
+    settings apply to the whole batch.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=8, max_wait_ms=10, name="default"):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._worker = None
+        self._running = False
+
+        self._metrics_lock = threading.Lock()
+        self._batch_sizes = {}
+        self._total_requests = 0
+        self._total_batches = 0
+        self._failed_batches = 0
+        self._recent_waits = deque(maxlen=1000)
+        self._max_wait_seen = 0.0
+        _schedulers.add(self)
+
+    def _reset_after_fork(self):
+        # The worker thread stayed in the parent; queued requests belong to its callers
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._metrics_lock = threading.Lock()
+        self._worker = None
+        self._running = False
+
+    def submit(self, item, **params):
+        """Queue an input and return a Future for its result"""
+        request = _PendingRequest(item, params)
+        with self._cond:
+            if not self._running:
+                self._start()
+            self._queue.append(request)
+            self._cond.notify()
+        return request.future
+
+    def __call__(self, item, timeout=None, **params):
+        """Queue an input and block until its result is ready"""
+        return self.submit(item, **params).result(timeout=timeout)
+
+    def _start(self):
+        self._running = True
+        self._worker = threading.Thread(target=self._run, name=f"batch-scheduler-{self.name}", daemon=True)
+        self._worker.start()
+
+    def shutdown(self, wait=True):
+        """Stop the worker thread after the queue drains"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if wait and self._worker is not None:
+            self._worker.join()
+
+    def _collect_batch(self):
+        """Wait for the first request, then gather more until the window closes"""
+        with self._cond:
+            while not self._queue:
+                if not self._running:
+                    return None
+                self._cond.wait()
+
+            batch = [self._queue.popleft()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                if self._queue:
+                    batch.append(self._queue.popleft())
+                    continue
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            if batch is None:
+                return
+
+            # Generation settings apply to the whole call, so split by params
+            groups = {}
+            for request in batch:
+                key = tuple(sorted(request.params.items()))
+                groups.setdefault(key, []).append(request)
+
+            for requests in groups.values():
+                self._dispatch(requests)
+
+    def _dispatch(self, requests):
+        started = time.perf_counter()
+        waits = [started - r.enqueued_at for r in requests]
+        self._record_batch(len(requests), waits)
+
+        try:
+            results = self.batch_fn([r.item for r in requests], **requests[0].params)
+            if len(results) != len(requests):
+                raise RuntimeError(
+                    f"{self.name}: batch function returned {len(results)} results for {len(requests)} inputs"
+                )
+        except Exception as e:
+            with self._metrics_lock:
+                self._failed_batches += 1
+            for request in requests:
+                request.future.set_exception(e)
+            return
+
+        for request, result in zip(requests, results):
+            request.future.set_result(result)
+
+    def _record_batch(self, size, waits):
+        with self._metrics_lock:
+            self._total_batches += 1
+            self._total_requests += size
+            self._batch_sizes[size] = self._batch_sizes.get(size, 0) + 1
+            self._recent_waits.extend(waits)
+            self._max_wait_seen = max(self._max_wait_seen, max(waits))
+
+    def queue_depth(self):
+        with self._cond:
+            return len(self._queue)
+
+    def metrics(self):
+        """Return batch-size and queue-wait statistics"""
+        with self._metrics_lock:
+            waits = sorted(self._recent_waits)
+            batches = self._total_batches
+
+            def percentile(p):
+                if not waits:
+                    return 0.0
+                index = min(len(waits) - 1, int(round(p * (len(waits) - 1))))
+                return waits[index] * 1000.0
+
+            return {
+                "name": self.name,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "queue_depth": self.queue_depth(),
+                "total_requests": self._total_requests,
+                "total_batches": batches,
+                "failed_batches": self._failed_batches,
+                "mean_batch_size": (self._total_requests / batches) if batches else 0.0,
+                "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+                "queue_wait_ms": {
+                    "p50": percentile(0.50),
+                    "p95": percentile(0.95),
+                    "p99": percentile(0.99),
+                    "max": self._max_wait_seen * 1000.0,
+                },
+            }
+
+
+@after_fork
+def _reset_schedulers():
+    for scheduler in list(_schedulers):
+        scheduler._reset_after_fork()
+
+
+# Batch functions adapting Hugging Face pipelines to the scheduler's list-in/list-out contract
+
+def summarization_batch_fn(summarizer):
+    def run(texts, **params):
+        outputs = summarizer(texts, batch_size=len(texts), **params)
+        return [output["summary_text"] for output in outputs]
+    return run
+
+
+def translation_batch_fn(translator):
+    def run(texts, **params):
+        outputs = translator(texts, batch_size=len(texts), **params)
+        return [output["translation_text"] for output in outputs]
+    return run
+
+
+def qa_batch_fn(qa_pipeline):
+    """Inputs are (question, context) pairs; results are the pipeline's answer dicts"""
+    def run(pairs, **params):
+        questions = [question for question, _ in pairs]
+        contexts = [context for _, context in pairs]
+        outputs = qa_pipeline(question=questions, context=contexts, batch_size=len(pairs), **params)
+        # The pipeline unwraps single-item batches
+        if isinstance(outputs, dict):
+            outputs = [outputs]
+        return outputs
+    return run
+
+
+def best_qa_span(start_logits, end_logits, context_start, context_end, null_positions=(), max_answer_len=15):
+    """Best (score, start, end) span of one feature, scored like the question-answering pipeline
+
+    As with the pipeline's p_mask, start and end probabilities are a softmax
+    over the context tokens plus the null-answer (CLS) positions, so a model
+    confident there is no answer yields low span scores. The null answer
+    itself is never returned. ``start``/``end`` are token indices relative to
+    ``context_start``; (0.0, None, None) if the feature has no context.
+    """
+    import numpy as np
+
+    if context_end <= context_start:
+        return 0.0, None, None
+    kept = list(null_positions) + list(range(context_start, context_end))
+    skip = len(null_positions)
+
+    def probabilities(logits):
+        logits = np.asarray(logits, dtype=np.float64)[kept]
+        exp = np.exp(logits - logits.max())
+        return exp[skip:] / exp.sum()
+
+    scores = np.outer(probabilities(start_logits), probabilities(end_logits))
+    scores = np.tril(np.triu(scores), max_answer_len - 1)
+    start, end = np.unravel_index(np.argmax(scores), scores.shape)
+    return float(scores[start, end]), int(start), int(end)
+
+
+def cached_qa_batch_fn(qa_pipeline, max_answer_len=15, max_batch_size=16, label="qa"):
+    """Like ``qa_batch_fn``, but tokenizes through a shared QAPreprocessor and runs the model directly
+
+    Context encodings are cached across questions, long contexts are split
+    into doc-stride windows, and windows are batched by length. Spans are
+    scored like the pipeline does (see ``best_qa_span``). Falls back to the
+    pipeline for tokenizers without offset mappings. As the pipeline's own
+    steps are bypassed, tokenize/forward/decode times are recorded here
+    under model ``label``.
+    """
+    tokenizer = qa_pipeline.tokenizer
+    if not getattr(tokenizer, "is_fast", False):
+        return qa_batch_fn(qa_pipeline)
+
+    import torch
+    from Doctor_Patient_communication_system.instrumentation import MODEL_STAGE
+    from Doctor_Patient_communication_system.preprocessing import QAPreprocessor, bucket_by_length
+
+    preprocessor = QAPreprocessor.for_tokenizer(tokenizer)
+    model = qa_pipeline.model
+
+    def best_span(feature, start_logits, end_logits):
+        shift = len(start_logits) - len(feature["input_ids"]) if tokenizer.padding_side == "left" else 0
+        null_positions = [
+            position + shift for position, token in enumerate(feature["input_ids"]) if token == tokenizer.cls_token_id
+        ] if tokenizer.cls_token_id is not None else []
+        return best_qa_span(start_logits, end_logits, feature["context_start"] + shift,
+                            feature["context_end"] + shift, null_positions, max_answer_len)
+
+    def run(pairs, **params):
+        features = []
+        owners = []
+        with MODEL_STAGE.time(model=label, stage="tokenize"):
+            for n, (question, context) in enumerate(pairs):
+                for feature in preprocessor.features(question, context):
+                    features.append(feature)
+                    owners.append(n)
+
+        best = [None] * len(pairs)
+        lengths = [len(feature["input_ids"]) for feature in features]
+        with torch.inference_mode():
+            for bucket in bucket_by_length(lengths, max_batch_size):
+                names = ["input_ids"] + (["token_type_ids"] if "token_type_ids" in features[0] else [])
+                with MODEL_STAGE.time(model=label, stage="tokenize"):
+                    batch = tokenizer.pad([{name: features[i][name] for name in names} for i in bucket],
+                                          return_tensors="pt")
+                device = getattr(model, "device", None)
+                if device is not None:
+                    batch = {name: tensor.to(device) for name, tensor in batch.items()}
+                with MODEL_STAGE.time(model=label, stage="forward"):
+                    outputs = model(**batch)
+                    start_logits = outputs.start_logits.float().cpu().numpy()
+                    end_logits = outputs.end_logits.float().cpu().numpy()
+                with MODEL_STAGE.time(model=label, stage="decode"):
+                    for row, i in enumerate(bucket):
+                        score, start, end = best_span(features[i], start_logits[row], end_logits[row])
+                        if start is not None and (best[owners[i]] is None or score > best[owners[i]][0]):
+                            best[owners[i]] = (score, features[i]["offsets"][start][0], features[i]["offsets"][end][1])
+
+        with MODEL_STAGE.time(model=label, stage="decode"):
+            results = []
+            for (question, context), found in zip(pairs, best):
+                if found is None:
+                    results.append({"score": 0.0, "start": 0, "end": 0, "answer": ""})
+                else:
+                    score, start, end = found
+                    results.append({"score": score, "start": start, "end": end, "answer": context[start:end]})
+        return results
+    return run
@@ -0,0 +1,376 @@
+# instrumentation.py
+"""
+Low-overhead metrics in the Prometheus text format, plus an opt-in
+per-request sampling profiler.
+
+    http_request_duration_seconds   per-route latency histogram
+    db_queries_per_request          SQL statements per request (SQLAlchemy events)
+    db_time_per_request_seconds     time spent in SQL per request
+    db_query_duration_seconds       per-statement latency, by statement verb
+    model_stage_seconds             pipeline tokenize/forward/decode time per model
+    callback gauges                 queue depths, memory, anything read at scrape time
+
+Metrics are per process; under gunicorn each worker exposes its own and
+Prometheus aggregates across scrape targets.
+"""
+
+import bisect
+import os
+import sys
+import threading
+import time
+from collections import Counter as _Counter
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 250)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(value)
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(labels.get(name, '') for name in self.labels)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, labels)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = dict(self._values)
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}" for key, value in sorted(values.items())
+        ]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def render(self):
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        lines = self.header()
+        for key, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labels, key, [('le', _format_value(float(bound)))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+class CallbackGauge(_Metric):
+    """Gauge whose samples are read at scrape time from ``fn()`` -> {label values tuple: value}"""
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, fn, labels=()):
+        super().__init__(name, help_text, labels)
+        self.fn = fn
+
+    def render(self):
+        try:
+            samples = self.fn()
+        except Exception as e:
+            print(f"Metrics callback {self.name} failed: {str(e)}")
+            return []
+        if not isinstance(samples, dict):
+            samples = {(): samples}
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+            for key, value in sorted(samples.items()) if value is not None
+        ]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self._register(Counter(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def gauge(self, name, help_text, fn, labels=()):
+        """Register (or replace) a callback gauge"""
+        with self._lock:
+            self._metrics[name] = CallbackGauge(name, help_text, fn, labels)
+            return self._metrics[name]
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+REQUEST_LATENCY = REGISTRY.histogram(
+    'http_request_duration_seconds', 'HTTP request latency', ('method', 'endpoint', 'status'))
+REQUEST_QUERIES = REGISTRY.histogram(
+    'db_queries_per_request', 'SQL statements executed per HTTP request', ('endpoint',), QUERY_COUNT_BUCKETS)
+REQUEST_DB_TIME = REGISTRY.histogram(
+    'db_time_per_request_seconds', 'Time spent executing SQL per HTTP request', ('endpoint',))
+QUERY_LATENCY = REGISTRY.histogram(
+    'db_query_duration_seconds', 'SQL statement latency', ('statement',))
+MODEL_STAGE = REGISTRY.histogram(
+    'model_stage_seconds', 'Inference pipeline stage time (tokenize, forward, decode)', ('model', 'stage'))
+
+
+# SQL timing: every engine in the process, attributed to the current request if any
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_started'].pop()
+    elapsed = time.perf_counter() - started
+    verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'OTHER'
+    QUERY_LATENCY.observe(elapsed, statement=verb)
+    if has_request_context() and 'metrics_queries' in g:
+        g.metrics_queries += 1
+        g.metrics_db_time += elapsed
+
+
+@event.listens_for(Engine, 'handle_error')
+def _query_failed(context):
+    if context.connection is not None and context.connection.info.get('query_started'):
+        context.connection.info['query_started'].pop()
+
+
+# Model stages: wrap the Hugging Face pipeline's preprocess/forward/postprocess
+
+def instrument_pipeline(pipe, model):
+    """Time a pipeline's tokenize (preprocess), forward and decode (postprocess) steps"""
+    for attribute, stage in (('preprocess', 'tokenize'), ('forward', 'forward'), ('postprocess', 'decode')):
+        method = getattr(pipe, attribute, None)
+        if method is None or getattr(method, '_instrumented', False):
+            continue
+        setattr(pipe, attribute, _timed_stage(method, model, stage))
+    return pipe
+
+
+def _timed_stage(method, model, stage):
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            MODEL_STAGE.observe(time.perf_counter() - started, model=model, stage=stage)
+    wrapper._instrumented = True
+    return wrapper
+
+
+# Process memory
+
+def process_memory_bytes():
+    """Resident and virtual memory of this process, from /proc (Linux) or getrusage"""
+    try:
+        with open('/proc/self/statm') as f:
+            size, resident = f.read().split()[:2]
+        page = os.sysconf('SC_PAGE_SIZE')
+        return {('resident',): int(resident) * page, ('virtual',): int(size) * page}
+    except (OSError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return {('peak_resident',): peak if sys.platform == 'darwin' else peak * 1024}
+
+
+REGISTRY.gauge('process_memory_bytes', 'Process memory', process_memory_bytes, ('type',))
+
+
+# Sampling profiler
+
+class SamplingProfiler:
+    """Samples one thread's Python stack every ``interval`` seconds from a helper thread
+
+    Results are collapsed stacks ("outer;inner;leaf count" lines), the
+    input format of flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, thread_id=None, interval=0.005):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.samples = _Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.samples[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.samples
+
+    def collapsed(self):
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common()) + "\n"
+
+
+# Flask integration
+
+def instrument_app(app, profile_dir=None):
+    """Record per-request latency and SQL counts; profile requests sent with ?profile=1
+
+    Profiling only happens when ``app.config['PROFILING_ENABLED']`` is set.
+    The collapsed stacks are written to ``profile_dir`` (default: the
+    ``PROFILE_DIR`` setting, else ``<instance>/profiles``) and the file name is
+    returned in the ``X-Profile`` response header. Metrics are recorded at
+    request teardown, so they include streamed bodies and requests that end
+    in an unhandled exception (labelled status 500).
+    """
+    def save_profile(profiler):
+        profiler.stop()
+        directory = profile_dir or app.config.get('PROFILE_DIR') or os.path.join(app.instance_path, 'profiles')
+        os.makedirs(directory, exist_ok=True)
+        endpoint = request.endpoint or 'unmatched'
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{endpoint}-{os.getpid()}-{threading.get_ident()}.folded"
+        with open(os.path.join(directory, name), 'w') as f:
+            f.write(profiler.collapsed())
+        return name
+
+    @app.before_request
+    def _start_request_metrics():
+        g.metrics_started = time.perf_counter()
+        g.metrics_queries = 0
+        g.metrics_db_time = 0.0
+        if app.config.get('PROFILING_ENABLED') and (
+                request.args.get('profile') == '1' or request.headers.get('X-Profile') == '1'):
+            g.profiler = SamplingProfiler(interval=app.config.get('PROFILING_INTERVAL', 0.005)).start()
+
+    @app.after_request
+    def _note_response(response):
+        g.metrics_status = response.status_code
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            response.headers['X-Profile'] = save_profile(profiler)
+        return response
+
+    @app.teardown_request
+    def _record_request_metrics(exc):
+        # A profiler still running means the request failed before after_request
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            try:
+                save_profile(profiler)
+            except OSError as e:
+                print(f"Could not save profile: {str(e)}")
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return
+        status = 500 if exc is not None else g.pop('metrics_status', 500)
+        endpoint = request.endpoint or 'unmatched'
+        REQUEST_LATENCY.observe(time.perf_counter() - started,
+                                method=request.method, endpoint=endpoint, status=status)
+        REQUEST_QUERIES.observe(g.pop('metrics_queries', 0), endpoint=endpoint)
+        REQUEST_DB_TIME.observe(g.pop('metrics_db_time', 0.0), endpoint=endpoint)
+
+    return app
@@ -0,0 +1,118 @@
+# job_queue.py
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobQueue:
+    """Runs background jobs on a local thread pool with bounded retries
+
+    ``handler(job_id, attempt)`` does the work and persists the job's state.
+    If it raises, the job is resubmitted with exponential backoff until
+    ``max_attempts`` is reached, after which ``on_failure(job_id, error)`` is
+    called so the final state can be recorded.
+    """
+
+    def __init__(self, handler, max_workers=2, max_attempts=3, retry_backoff=2.0, on_failure=None, name="jobs"):
+        self.handler = handler
+        self.max_attempts = max(1, int(max_attempts))
+        self.retry_backoff = retry_backoff
+        self.on_failure = on_failure
+        self.name = name
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"job-{name}")
+        self._lock = threading.Lock()
+        self._timers = set()
+        self._in_flight = 0
+        self._counts = {"submitted": 0, "succeeded": 0, "retried": 0, "failed": 0}
+
+    def submit(self, job_id):
+        with self._lock:
+            self._counts["submitted"] += 1
+        self._enqueue(job_id, 1)
+
+    def _enqueue(self, job_id, attempt):
+        with self._lock:
+            self._in_flight += 1
+        self._executor.submit(self._run, job_id, attempt)
+
+    def _run(self, job_id, attempt):
+        try:
+            self.handler(job_id, attempt)
+        except Exception as e:
+            if attempt < self.max_attempts:
+                with self._lock:
+                    self._counts["retried"] += 1
+                self._schedule_retry(job_id, attempt + 1)
+            else:
+                with self._lock:
+                    self._counts["failed"] += 1
+                print(f"Job {self.name}:{job_id} failed after {attempt} attempts: {str(e)}")
+                if self.on_failure is not None:
+                    self.on_failure(job_id, e)
+        else:
+            with self._lock:
+                self._counts["succeeded"] += 1
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def _schedule_retry(self, job_id, attempt):
+        delay = self.retry_backoff * (2 ** (attempt - 2))
+
+        def fire():
+            with self._lock:
+                self._timers.discard(timer)
+            self._enqueue(job_id, attempt)
+
+        timer = threading.Timer(delay, fire)
+        timer.daemon = True
+        with self._lock:
+            self._timers.add(timer)
+        timer.start()
+
+    def queue_depth(self):
+        with self._lock:
+            return self._in_flight + len(self._timers)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counts, in_flight=self._in_flight, waiting_retry=len(self._timers))
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            timers = list(self._timers)
+            self._timers.clear()
+        for timer in timers:
+            timer.cancel()
+        self._executor.shutdown(wait=wait)
+
+
+class PeriodicTask:
+    """Calls ``fn()`` now and then every ``interval`` seconds on a daemon thread
+
+    ``wake()`` runs it again without waiting for the rest of the interval.
+    """
+
+    def __init__(self, fn, interval, name="periodic"):
+        self.fn = fn
+        self.interval = interval
+        self.name = name
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.fn()
+            except Exception as e:
+                print(f"Periodic task {self.name} failed: {str(e)}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
@@ -1,65 +1,202 @@
 # llm_service.py
-from transformers import pipeline, AutoTokenizer, AutoModelForSeq2SeqLM, AutoModelForQuestionAnswering
 import os
 import torch
 
+from Doctor_Patient_communication_system.hierarchical_summarizer import HierarchicalSummarizer
+from Doctor_Patient_communication_system.inference_backend import load_pipeline, DEFAULT_EXPORT_DIR
+from Doctor_Patient_communication_system.inference_scheduler import (
+    BatchScheduler, summarization_batch_fn, cached_qa_batch_fn
+)
+from Doctor_Patient_communication_system.instrumentation import instrument_pipeline
+from Doctor_Patient_communication_system.model_registry import ModelRegistry
+from Doctor_Patient_communication_system.preprocessing import EncodingCache, bucketed
+from Doctor_Patient_communication_system.result_cache import create_cache
+from Doctor_Patient_communication_system.streaming import stream_generate
+from Doctor_Patient_communication_system.shared_weights import freeze_model, env_flag
+from Doctor_Patient_communication_system.translation_engine import TranslationEngine, TranslationModelPool, parse_pair
+
+# Hugging Face checkpoints, keyed by the task names used throughout the service;
+# translation models are per language pair, see translation_engine.py
+MODEL_NAMES = {
+    'summarization': "facebook/bart-large-cnn",
+    'qa': "deepset/roberta-base-squad2",
+}
+
 class LLMService:
     """Service for handling LLM-based operations like summarization, QA, and translation"""
     
-    def __init__(self):
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+    def __init__(self, max_batch_size=None, max_wait_ms=None, lazy=True, mmap_weights=None, result_cache=None,
+                 backend=None, export_dir=None):
+        # torch, int8 (dynamic quantization) or onnx; see inference_backend.py
+        self.backend = backend or os.environ.get("INFERENCE_BACKEND", "torch")
+        self.export_dir = export_dir or os.environ.get("MODEL_EXPORT_DIR", DEFAULT_EXPORT_DIR)
+        # Quantized and ONNX Runtime models run on CPU only
+        self.device = "cuda" if torch.cuda.is_available() and self.backend == "torch" else "cpu"
         self.models = {}
         self.tokenizers = {}
-        self.load_models()
+        self.encodings = {}
+        self.mmap_weights = env_flag("MODEL_MMAP_WEIGHTS") if mmap_weights is None else mmap_weights
+        self.result_cache = result_cache or create_cache()
+        self.max_batch_size = max_batch_size or int(os.environ.get("INFERENCE_MAX_BATCH_SIZE", 8))
+        self.max_wait_ms = max_wait_ms if max_wait_ms is not None else float(os.environ.get("INFERENCE_MAX_WAIT_MS", 10))
         
-    def load_models(self):
-        """Load all required models"""
-        # Load summarization model
-        self.tokenizers['summarization'] = AutoTokenizer.from_pretrained("facebook/bart-large-cnn")
-        self.models['summarization'] = AutoModelForSeq2SeqLM.from_pretrained("facebook/bart-large-cnn").to(self.device)
+        # Models are loaded on first use unless lazy loading is turned off
+        self.registry = ModelRegistry()
+        self.registry.register('summarization', lambda: self._load_pipeline('summarization'))
+        self.registry.register('qa', lambda: self._load_pipeline('qa'))
         
-        # Load QA model for medical chat
-        self.tokenizers['qa'] = AutoTokenizer.from_pretrained("deepset/roberta-base-squad2")
-        self.models['qa'] = AutoModelForQuestionAnswering.from_pretrained("deepset/roberta-base-squad2").to(self.device)
+        # One model per language pair, unloaded least-recently-used past the memory budget
+        self.translation = TranslationEngine(
+            TranslationModelPool(
+                self._load_translation_pipeline,
+                memory_budget=int(os.environ.get("TRANSLATION_MEMORY_MB", 1024)) * 1024 * 1024
+            ),
+            max_batch_size=int(os.environ.get("TRANSLATION_MAX_BATCH_SIZE", 16)),
+            max_wait_ms=self.max_wait_ms
+        )
         
-        # Load translation model
-        self.tokenizers['translation'] = AutoTokenizer.from_pretrained("t5-small")
-        self.models['translation'] = AutoModelForSeq2SeqLM.from_pretrained("t5-small").to(self.device)
+        # Batch concurrent callers into single forward passes
+        self.schedulers = {
+            'summarization': self._make_scheduler('summarization', lambda pipe: bucketed(
+                summarization_batch_fn(pipe), self._encodings('summarization').lengths, self.max_batch_size
+            )),
+            'qa': self._make_scheduler('qa', cached_qa_batch_fn),
+            'translation': self.translation.scheduler,
+        }
         
-        # Create pipelines
-        self.summarizer = pipeline("summarization", model=self.models['summarization'], tokenizer=self.tokenizers['summarization'], device=0 if self.device == "cuda" else -1)
-        self.qa_pipeline = pipeline("question-answering", model=self.models['qa'], tokenizer=self.tokenizers['qa'], device=0 if self.device == "cuda" else -1)
-        self.translator = pipeline("translation_en_to_fr", model=self.models['translation'], tokenizer=self.tokenizers['translation'], device=0 if self.device == "cuda" else -1)
+        if not lazy:
+            self.load_models()
+        
+    def load_models(self):
+        """Load all required models"""
+        self.registry.warm_up(background=False)
+    
+    def warm_up(self, background=True):
+        """Start loading all models ahead of the first request"""
+        return self.registry.warm_up(background=background)
+    
+    def preload(self):
+        """Load every model frozen and in eval mode, e.g. in the gunicorn master before forking"""
+        self.load_models()
+        for model in self.models.values():
+            freeze_model(model)
+        for pair in os.environ.get("TRANSLATION_PRELOAD_PAIRS", "en-fr").split(","):
+            if pair.strip():
+                freeze_model(self.translation.pool.get(*parse_pair(pair)).model)
+    
+    def _load(self, task, model_name):
+        return load_pipeline(task, model_name, backend=self.backend, export_dir=self.export_dir,
+                             mmap_weights=self.mmap_weights, device=self.device)
+    
+    def _load_pipeline(self, name):
+        pipe = self._load(name, MODEL_NAMES[name])
+        self.tokenizers[name] = pipe.tokenizer
+        self.models[name] = pipe.model
+        return instrument_pipeline(pipe, name)
+    
+    def _load_translation_pipeline(self, model_name):
+        return instrument_pipeline(self._load('translation', model_name), model_name)
+    
+    def _tokenizer(self, name):
+        """Return the tokenizer for a task, loading its model if needed"""
+        self.registry.get(name)
+        return self.tokenizers[name]
+    
+    def _encodings(self, name):
+        """Tokenization cache for a task's tokenizer"""
+        if name not in self.encodings:
+            self.encodings[name] = EncodingCache(self._tokenizer(name))
+        return self.encodings[name]
+    
+    @property
+    def summarizer(self):
+        return self.registry.get('summarization')
+    
+    @property
+    def qa_pipeline(self):
+        return self.registry.get('qa')
+    
+    @property
+    def translator(self):
+        return self.translation.pool.get("en", "fr")
+    
+    def _make_scheduler(self, name, batch_fn):
+        def run(inputs, **params):
+            return batch_fn(self.registry.get(name))(inputs, **params)
+        return BatchScheduler(run, max_batch_size=self.max_batch_size, max_wait_ms=self.max_wait_ms, name=name)
+    
+    def readiness(self):
+        """Return per-model load state"""
+        return self.registry.status()
+    
+    def scheduler_metrics(self):
+        """Return batch-size and queue-wait metrics for each model"""
+        return {name: scheduler.metrics() for name, scheduler in self.schedulers.items()}
+    
+    def cache_stats(self):
+        """Return result cache hit/miss counters"""
+        return self.result_cache.stats()
+    
+    def preprocessing_stats(self):
+        """Return tokenization cache hit/miss counters"""
+        return {name: cache.stats() for name, cache in self.encodings.items()}
+    
+    def translation_stats(self):
+        """Return which language pairs are loaded and their memory use"""
+        return self.translation.pool.stats()
     
     def summarize_text(self, text, max_length=150, min_length=50):
         """Generate a summary of the given text"""
         if not text:
             return ""
         
-        # Split text into chunks if it's too long
-        max_tokens = self.tokenizers['summarization'].model_max_length - 100  # Buffer for generation
-        tokenized = self.tokenizers['summarization'].encode(text)
-        
-        if len(tokenized) <= max_tokens:
-            summary = self.summarizer(text, max_length=max_length, min_length=min_length, do_sample=False)[0]['summary_text']
-            return summary
-        
-        # If text is too long, summarize in chunks and then summarize the combined summaries
-        chunks = self._split_text(text)
-        chunk_summaries = []
+        params = {'max_length': max_length, 'min_length': min_length}
+        return self.result_cache.get_or_compute(
+            MODEL_NAMES['summarization'], 'summarization', params, text,
+            lambda: self._summarize(text, max_length=max_length, min_length=min_length)
+        )
+    
+    def _summarize(self, text, max_length, min_length):
+        tokenizer = self._tokenizer('summarization')
+        encodings = self._encodings('summarization')
+        max_tokens = tokenizer.model_max_length - 100  # Buffer for generation
         
-        for chunk in chunks:
-            chunk_summary = self.summarizer(chunk, max_length=100, min_length=30, do_sample=False)[0]['summary_text']
-            chunk_summaries.append(chunk_summary)
+        if tokenizer.is_fast:
+            engine = HierarchicalSummarizer(tokenizer, self._summarize_batch, max_tokens, encodings=encodings)
+            return engine.summarize(text, max_length=max_length, min_length=min_length)
         
+        # Slow tokenizers have no offset mapping; fall back to word-based chunks
+        if encodings.length(text) <= max_tokens:
+            return self._summarize_batch([text], max_length=max_length, min_length=min_length)[0]
+        chunk_summaries = self._summarize_batch(self._split_text(text), max_length=100, min_length=30)
         combined_summary = " ".join(chunk_summaries)
-        
-        # If the combined summary is still too long, summarize it again
-        if len(self.tokenizers['summarization'].encode(combined_summary)) > max_tokens:
-            combined_summary = self.summarize_text(combined_summary, max_length=max_length, min_length=min_length)
-        
+        if encodings.length(combined_summary) > max_tokens:
+            combined_summary = self._summarize(combined_summary, max_length=max_length, min_length=min_length)
         return combined_summary
     
+    def _summarize_batch(self, texts, max_length, min_length):
+        """Summarize several texts; the scheduler runs them as one batched call"""
+        futures = [
+            self.schedulers['summarization'].submit(text, max_length=max_length, min_length=min_length, do_sample=False)
+            for text in texts
+        ]
+        return [future.result() for future in futures]
+    
+    def stream_summary(self, text, max_length=150, min_length=50, cancel_event=None):
+        """Yield the summary piece by piece as tokens are generated"""
+        self.registry.get('summarization')
+        return stream_generate(
+            self.models['summarization'], self.tokenizers['summarization'], text,
+            cancel_event=cancel_event, max_length=max_length, min_length=min_length, no_repeat_ngram_size=3
+        )
+    
+    def stream_translation(self, text, source_lang="en", target_lang="fr", cancel_event=None):
+        """Yield the translation piece by piece as tokens are generated"""
+        if not self.translation.supports(source_lang, target_lang):
+            return iter(["Translation for this language pair is not supported yet."])
+        pipe = self.translation.pool.get(source_lang, target_lang)
+        return stream_generate(pipe.model, pipe.tokenizer, text, cancel_event=cancel_event, max_length=512)
+    
     def _split_text(self, text, max_chunk_size=1000):
         """Split text into chunks of approximately equal size"""
         words = text.split()
@@ -81,8 +218,19 @@ class LLMService:
         
         return chunks
     
-    def answer_question(self, question, context=None):
-        """Answer a medical question using the QA model"""
+    def answer_question(self, question, context=None, passages=None):
+        """Answer a medical question using the QA model
+        
+        ``passages`` (e.g. retrieved records) are scored together in one
+        batched call and the highest-scoring answer is used.
+        """
+        if passages:
+            futures = [self.schedulers['qa'].submit((question, passage)) for passage in passages]
+            result = max((future.result() for future in futures), key=lambda r: r['score'])
+            if result['score'] < 0.1:
+                return "I don't have enough information to answer that question accurately. Please consult with a medical professional for specific medical advice."
+            return result['answer']
+        
         if not context:
             # Default medical context if none provided
             context = """
@@ -100,7 +248,7 @@ class LLMService:
             """
         
         # Use the QA pipeline to get an answer
-        result = self.qa_pipeline(question=question, context=context)
+        result = self.schedulers['qa']((question, context))
         
         # If confidence is low, provide a fallback response
         if result['score'] < 0.1:
@@ -110,12 +258,12 @@ class LLMService:
     
     def translate_text(self, text, source_lang="en", target_lang="fr"):
         """Translate text from source language to target language"""
-        # Currently using a simple T5 model that only supports English to French
-        # In a production system, you would use a more comprehensive model or an API
-        
-        if source_lang == "en" and target_lang == "fr":
-            result = self.translator(text)[0]['translation_text']
-            return result
+        if self.translation.supports(source_lang, target_lang):
+            return self.result_cache.get_or_compute(
+                self.translation.pool.models[(source_lang, target_lang)], 'translation',
+                {'source_lang': source_lang, 'target_lang': target_lang}, text,
+                lambda: self.translation.translate(text, source_lang, target_lang)
+            )
         
         # Fallback for unsupported language pairs
         return "Translation for this language pair is not supported yet."
@@ -0,0 +1,100 @@
+# migrations.py
+"""
+Ordered, idempotent schema migrations.
+
+db.create_all() only creates missing tables, so changes to existing tables
+(new indexes, columns) are listed here and applied once per database. Run
+them with ``flask --app Doctor_Patient_communication_system migrate``; the app also applies them on start.
+"""
+
+from sqlalchemy import inspect, text
+
+
+def add_column(table, column, ddl):
+    """Migration step adding a column unless create_all already made it"""
+    def step(conn):
+        if column not in {c['name'] for c in inspect(conn).get_columns(table)}:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+    return step
+
+
+def fts_index(fts, source, columns):
+    """Migration step creating an FTS5 external-content index over ``source``
+
+    Triggers keep the index in step with inserts, deletes and updates of the
+    indexed columns (so comment_count bumps do not reindex a discussion);
+    existing rows are indexed by a rebuild. Only SQLite has
+    FTS5, other databases skip the step and search falls back to LIKE.
+    """
+    cols = ', '.join(columns)
+    new_cols = ', '.join(f"new.{c}" for c in columns)
+    old_cols = ', '.join(f"old.{c}" for c in columns)
+    statements = [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{cols}, content='{source}', content_rowid='id', tokenize='porter unicode61')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {source} BEGIN "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {source} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {source} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols}); END",
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+    def step(conn):
+        if conn.dialect.name != 'sqlite':
+            return
+        for statement in statements:
+            conn.execute(text(statement))
+    return step
+
+
+# (migration id, SQL statements); append new migrations, never edit old ones
+MIGRATIONS = [
+    ('0001_query_indexes', [
+        "CREATE INDEX IF NOT EXISTS ix_medical_record_user_id_record_date ON medical_record (user_id, record_date)",
+        "CREATE INDEX IF NOT EXISTS ix_comment_discussion_id ON comment (discussion_id)",
+        "CREATE INDEX IF NOT EXISTS ix_discussion_date_posted ON discussion (date_posted)",
+    ]),
+    ('0002_discussion_comment_count', [
+        add_column('discussion', 'comment_count', "INTEGER NOT NULL DEFAULT 0"),
+        "UPDATE discussion SET comment_count = "
+        "(SELECT COUNT(*) FROM comment WHERE comment.discussion_id = discussion.id)",
+    ]),
+    ('0003_chat_history_user_timestamp', [
+        "CREATE INDEX IF NOT EXISTS ix_chat_history_user_id_timestamp ON chat_history (user_id, timestamp)",
+    ]),
+    # Column order matches the bm25 weights in search.py
+    ('0004_search_index', [
+        fts_index('medical_record_fts', 'medical_record', ('diagnosis', 'prescription', 'notes', 'summary')),
+        fts_index('discussion_fts', 'discussion', ('title', 'content')),
+        fts_index('comment_fts', 'comment', ('content',)),
+    ]),
+]
+
+
+def applied_migrations(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations (id VARCHAR(100) PRIMARY KEY, applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+    ))
+    return {row[0] for row in conn.execute(text("SELECT id FROM schema_migrations"))}
+
+
+def apply_migrations(engine, migrations=None):
+    """Apply every migration not yet recorded in schema_migrations; returns the ids applied"""
+    migrations = MIGRATIONS if migrations is None else migrations
+    applied = []
+    with engine.begin() as conn:
+        done = applied_migrations(conn)
+        for migration_id, statements in migrations:
+            if migration_id in done:
+                continue
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.execute(text(statement))
+            conn.execute(text("INSERT INTO schema_migrations (id) VALUES (:id)"), {'id': migration_id})
+            applied.append(migration_id)
+    return applied
@@ -0,0 +1,116 @@
+# model_registry.py
+import threading
+import time
+
+
+class ModelRegistry:
+    """Loads models on first use and tracks which ones are ready to serve"""
+
+    def __init__(self):
+        self._loaders = {}
+        self._models = {}
+        self._errors = {}
+        self._load_times = {}
+        self._locks = {}
+        self._registry_lock = threading.Lock()
+        self._warmup_thread = None
+
+    def register(self, name, loader):
+        """Register a zero-argument callable that builds the model called ``name``"""
+        with self._registry_lock:
+            self._loaders[name] = loader
+            self._locks[name] = threading.Lock()
+            self._models.pop(name, None)
+            self._errors.pop(name, None)
+
+    def names(self):
+        return list(self._loaders)
+
+    def get(self, name):
+        """Return the model, loading it on first use
+
+        Concurrent callers for the same model wait on a single load. A failed
+        load is remembered so later calls fail fast instead of retrying a
+        multi-second download on every request.
+        """
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        if name not in self._loaders:
+            raise KeyError(f"No model registered under '{name}'")
+
+        with self._locks[name]:
+            if name in self._models:
+                return self._models[name]
+            if name in self._errors:
+                raise RuntimeError(f"Model '{name}' failed to load: {self._errors[name]}")
+
+            started = time.perf_counter()
+            try:
+                model = self._loaders[name]()
+            except Exception as e:
+                self._errors[name] = str(e)
+                print(f"Error loading model '{name}': {str(e)}")
+                raise
+            self._load_times[name] = time.perf_counter() - started
+            self._models[name] = model
+            return model
+
+    def is_loaded(self, name):
+        return name in self._models
+
+    def available(self, name):
+        """True if the model is registered and has not failed to load"""
+        return name in self._loaders and name not in self._errors
+
+    def unload(self, name):
+        """Drop a loaded model so the next ``get`` reloads it"""
+        with self._locks[name]:
+            self._models.pop(name, None)
+            self._errors.pop(name, None)
+
+    def ready(self, names=None):
+        names = self.names() if names is None else names
+        return all(self.is_loaded(name) for name in names)
+
+    def warm_up(self, names=None, background=True):
+        """Load models ahead of the first request, optionally on a daemon thread"""
+        names = self.names() if names is None else list(names)
+
+        def load_all():
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception:
+                    # Already recorded in _errors; keep warming the rest
+                    pass
+
+        if not background:
+            load_all()
+            return None
+
+        if self._warmup_thread is None or not self._warmup_thread.is_alive():
+            self._warmup_thread = threading.Thread(target=load_all, name="model-warmup", daemon=True)
+            self._warmup_thread.start()
+        return self._warmup_thread
+
+    def status(self):
+        """Return per-model load state for the readiness endpoint"""
+        status = {}
+        for name in self.names():
+            if name in self._models:
+                state = "loaded"
+            elif name in self._errors:
+                state = "failed"
+            elif self._locks[name].locked():
+                state = "loading"
+            else:
+                state = "not_loaded"
+            entry = {"state": state}
+            if name in self._load_times:
+                entry["load_seconds"] = round(self._load_times[name], 3)
+            if name in self._errors:
+                entry["error"] = self._errors[name]
+            status[name] = entry
+        return status
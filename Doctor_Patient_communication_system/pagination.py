@@ -0,0 +1,100 @@
+# pagination.py
+"""
+Keyset (cursor) pagination helpers.
+
+Pages are fetched with ``WHERE (sort columns) < (last row's values)``
+instead of OFFSET, so every page costs the same index seek no matter how
+deep it is. Cursors are opaque URL-safe strings encoding those values.
+``StreamedPage`` serves a page straight off a server-side cursor for
+responses that may be long, so memory does not grow with the page.
+"""
+
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+
+def encode_cursor(*values):
+    """Encode the sort-key values of the last row on a page"""
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, types):
+    """Decode a cursor into values converted by ``types``; raises ValueError if malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise ValueError("Malformed cursor")
+    if not isinstance(payload, list) or len(payload) != len(types):
+        raise ValueError("Malformed cursor")
+    return tuple(convert(value) for convert, value in zip(types, payload))
+
+
+def keyset_page(query, columns, after=None, limit=20, descending=True):
+    """Return (rows, has_more) for the page of ``query`` after the ``after`` key values"""
+    if after is not None:
+        key = tuple_(*columns)
+        query = query.filter(key < after if descending else key > after)
+    order = [column.desc() if descending else column.asc() for column in columns]
+    rows = query.order_by(*order).limit(limit + 1).all()
+    return rows[:limit], len(rows) > limit
+
+
+def parse_datetime(value):
+    return datetime.fromisoformat(value)
+
+
+class StreamedPage:
+    """A keyset page of a select() read with yield_per as it is iterated
+
+    ``key(row)`` returns the row's values for ``columns``; ``next_cursor`` is
+    set once iteration has passed the last row of a page with more after it.
+    ``limit=None`` streams every remaining row.
+    """
+
+    def __init__(self, session, statement, columns, key, after=None, limit=None, descending=True, batch_size=500):
+        if after is not None:
+            sort_key = tuple_(*columns)
+            statement = statement.where(sort_key < after if descending else sort_key > after)
+        statement = statement.order_by(*[column.desc() if descending else column.asc() for column in columns])
+        if limit is not None:
+            statement = statement.limit(limit + 1)
+        self.session = session
+        self.statement = statement.execution_options(yield_per=batch_size)
+        self.key = key
+        self.limit = limit
+        self.has_more = False
+        self.next_cursor = None
+
+    def __iter__(self):
+        result = self.session.execute(self.statement)
+        last = None
+        count = 0
+        try:
+            for row in result:
+                if self.limit is not None and count == self.limit:
+                    self.has_more = True
+                    break
+                last = row
+                count += 1
+                yield row
+        finally:
+            result.close()
+        if self.has_more:
+            self.next_cursor = encode_cursor(*self.key(last))
+
+
+def stream_json_page(page, name, serialize, rows_per_chunk=100):
+    """Yield ``{name: [...], "next_cursor": ...}`` as JSON text, a chunk of rows at a time"""
+    parts = ['{' + json.dumps(name) + ': [']
+    for n, row in enumerate(page):
+        parts.append((', ' if n else '') + json.dumps(serialize(row)))
+        if len(parts) >= rows_per_chunk:
+            yield ''.join(parts)
+            parts = []
+    parts.append('], "next_cursor": ' + json.dumps(page.next_cursor) + '}')
+    yield ''.join(parts)
@@ -0,0 +1,196 @@
+# preprocessing.py
+"""
+Tokenize-once preprocessing shared by the inference paths.
+
+``EncodingCache`` keeps recent tokenizations (ids and offsets) so a text is
+tokenized once however many times its length is checked or it is chunked.
+``bucket_by_length`` groups batch inputs of similar length so each padded
+batch wastes little compute on padding. ``QAPreprocessor`` builds
+question-answering features from cached context encodings, splitting long
+contexts into overlapping windows (doc stride); several questions about the
+same record reuse one tokenization of it.
+"""
+
+import hashlib
+import os
+import threading
+import weakref
+from collections import OrderedDict
+
+
+class EncodingCache:
+    """LRU cache of ``tokenizer(text, add_special_tokens=False)`` results"""
+
+    def __init__(self, tokenizer, max_entries=None):
+        self.tokenizer = tokenizer
+        self.max_entries = max_entries or int(os.environ.get("ENCODING_CACHE_ENTRIES", 512))
+        self.with_offsets = bool(getattr(tokenizer, "is_fast", False))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(text):
+        return hashlib.sha1(text.encode("utf-8")).digest()
+
+    def encode(self, text):
+        """Dict with ``input_ids`` (and ``offset_mapping`` for fast tokenizers), no special tokens"""
+        return self.encode_batch([text])[0]
+
+    def encode_batch(self, texts):
+        keys = [self._key(text) for text in texts]
+        results = [None] * len(texts)
+        missing = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    results[i] = entry
+                    self.hits += 1
+                else:
+                    missing.setdefault(key, []).append(i)
+                    self.misses += 1
+
+        if missing:
+            # All misses in one tokenizer call (batched in Rust for fast tokenizers)
+            todo = [texts[indices[0]] for indices in missing.values()]
+            kwargs = {"return_offsets_mapping": True} if self.with_offsets else {}
+            encoded = self.tokenizer(todo, add_special_tokens=False, **kwargs)
+            with self._lock:
+                for n, (key, indices) in enumerate(missing.items()):
+                    entry = {"input_ids": encoded["input_ids"][n]}
+                    if self.with_offsets:
+                        entry["offset_mapping"] = encoded["offset_mapping"][n]
+                    for i in indices:
+                        results[i] = entry
+                    self._entries[key] = entry
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return results
+
+    def length(self, text):
+        return len(self.encode(text)["input_ids"])
+
+    def lengths(self, texts):
+        return [len(entry["input_ids"]) for entry in self.encode_batch(texts)]
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+def bucket_by_length(lengths, max_batch_size, max_padding_ratio=1.5):
+    """Group indices into batches of similar length
+
+    Indices are sorted by length and a new batch starts when the longest
+    input would exceed ``max_padding_ratio`` times the shortest, or the
+    batch is full.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    buckets = []
+    current = []
+    for i in order:
+        if current and (len(current) >= max_batch_size
+                        or lengths[i] > max(lengths[current[0]], 1) * max_padding_ratio):
+            buckets.append(current)
+            current = []
+        current.append(i)
+    if current:
+        buckets.append(current)
+    return buckets
+
+
+def bucketed(batch_fn, length_fn, max_batch_size=32, max_padding_ratio=1.5):
+    """Wrap a list-in/list-out batch function so each call runs one length bucket at a time"""
+    def run(inputs, **params):
+        if len(inputs) <= 1:
+            return batch_fn(inputs, **params)
+        results = [None] * len(inputs)
+        for bucket in bucket_by_length(length_fn(inputs), max_batch_size, max_padding_ratio):
+            outputs = batch_fn([inputs[i] for i in bucket], **params)
+            for i, output in zip(bucket, outputs):
+                results[i] = output
+        return results
+    return run
+
+
+def sliding_windows(num_tokens, window, stride):
+    """(start, end) token spans of at most ``window`` tokens, neighbours overlapping by ``stride``"""
+    if num_tokens <= window:
+        return [(0, num_tokens)]
+    step = max(1, window - stride)
+    spans = []
+    start = 0
+    while True:
+        end = min(start + window, num_tokens)
+        spans.append((start, end))
+        if end == num_tokens:
+            return spans
+        start += step
+
+
+class QAPreprocessor:
+    """Question-answering features built from cached encodings (fast tokenizers only)
+
+    Each feature is one window of the context with the question prepended,
+    in the model's own special-token layout, plus what is needed to map a
+    predicted token span back to characters of the context.
+    """
+
+    _instances = weakref.WeakKeyDictionary()
+    _instances_lock = threading.Lock()
+
+    def __init__(self, tokenizer, max_seq_len=None, doc_stride=None, max_entries=None):
+        self.tokenizer = tokenizer
+        self.max_seq_len = max_seq_len or int(os.environ.get("QA_MAX_SEQ_LEN", 384))
+        self.doc_stride = doc_stride or int(os.environ.get("QA_DOC_STRIDE", 128))
+        self.contexts = EncodingCache(tokenizer, max_entries)
+        self.questions = EncodingCache(tokenizer, max_entries)
+        self._lead = self._leading_specials()
+        self._pair_specials = tokenizer.num_special_tokens_to_add(pair=True)
+
+    @classmethod
+    def for_tokenizer(cls, tokenizer):
+        """One shared preprocessor (and cache) per tokenizer instance"""
+        with cls._instances_lock:
+            preprocessor = cls._instances.get(tokenizer)
+            if preprocessor is None:
+                preprocessor = cls._instances[tokenizer] = cls(tokenizer)
+            return preprocessor
+
+    def _leading_specials(self):
+        """Special tokens placed before the question plus between question and context"""
+        special = set(self.tokenizer.all_special_ids)
+        first, second = [i for i in range(1000) if i not in special][:2]
+        probe = self.tokenizer.build_inputs_with_special_tokens([first], [second])
+        return probe.index(second) - 1
+
+    def features(self, question, context):
+        question_ids = self.questions.encode(question)["input_ids"]
+        encoded = self.contexts.encode(context)
+        context_ids = encoded["input_ids"]
+        offsets = encoded["offset_mapping"]
+
+        # Very long questions are cut so at least half the sequence is context
+        question_ids = question_ids[:self.max_seq_len // 2]
+        window = self.max_seq_len - len(question_ids) - self._pair_specials
+        context_start = self._lead + len(question_ids)
+
+        features = []
+        for start, end in sliding_windows(len(context_ids), window, self.doc_stride):
+            window_ids = context_ids[start:end]
+            feature = {
+                "input_ids": self.tokenizer.build_inputs_with_special_tokens(question_ids, window_ids),
+                "context_start": context_start,
+                "context_end": context_start + len(window_ids),
+                "offsets": offsets[start:end],
+            }
+            if "token_type_ids" in self.tokenizer.model_input_names:
+                feature["token_type_ids"] = self.tokenizer.create_token_type_ids_from_sequences(question_ids, window_ids)
+            features.append(feature)
+        return features
+
+    def stats(self):
+        return {"contexts": self.contexts.stats(), "questions": self.questions.stats()}
@@ -0,0 +1,268 @@
+# record_io.py
+"""
+Bulk medical record import and export.
+
+Imports run in two passes. The first reads CSV or NDJSON from a stream a
+row at a time, decoding and validating every row and spooling the good ones
+to a temporary file, so an undecodable or malformed file fails before
+anything is written. The second inserts the spooled rows in chunks, one
+multi-row INSERT and one commit per chunk, so memory use and transaction
+size stay flat however big the file is. Bad rows are skipped and reported
+with their line numbers; if the database fails part way, ``ImportFailed``
+reports how many rows were already committed.
+
+Exports stream rows back out in the same formats from a server-side cursor,
+``batch_size`` rows at a time. An exported file can be imported again:
+patients are matched by ``patient_email`` or ``user_id``.
+"""
+
+import csv
+import io
+import json
+import tempfile
+from datetime import datetime
+
+from sqlalchemy import insert, or_, select
+
+FORMATS = ('csv', 'ndjson')
+EXPORT_FIELDS = ('id', 'user_id', 'patient_email', 'record_date', 'diagnosis', 'prescription', 'notes', 'summary')
+MAX_REPORTED_ERRORS = 100
+
+
+class RowError(ValueError):
+    """A row that cannot be imported"""
+
+
+class ImportFailed(Exception):
+    """An import stopped part way; ``result`` counts the rows already committed"""
+
+    def __init__(self, message, result):
+        super().__init__(message)
+        self.result = result
+
+
+def detect_format(filename=None, content_type=None):
+    """'csv' or 'ndjson' from a file name or Content-Type, else None"""
+    name = (filename or '').lower()
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    if name.endswith('.csv') or content_type in ('text/csv', 'application/csv'):
+        return 'csv'
+    if name.endswith(('.ndjson', '.jsonl')) or content_type in ('application/x-ndjson', 'application/jsonl'):
+        return 'ndjson'
+    return None
+
+
+def read_rows(stream, fmt):
+    """Yield (line number, dict or RowError) for each row of a text stream"""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        try:
+            for row in reader:
+                yield reader.line_num, row
+        except csv.Error as e:
+            yield reader.line_num, RowError(f"Malformed CSV: {e}")
+        return
+
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, RowError(f"Malformed JSON: {e}")
+            continue
+        if not isinstance(row, dict):
+            yield line_number, RowError("Expected a JSON object")
+            continue
+        yield line_number, row
+
+
+def _text(row, field):
+    value = row.get(field)
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def validate_row(row):
+    """Normalized column values for a raw row; raises RowError"""
+    diagnosis = _text(row, 'diagnosis')
+    if diagnosis is None:
+        raise RowError("diagnosis is required")
+
+    user_id = _text(row, 'user_id')
+    email = _text(row, 'patient_email')
+    if user_id is None and email is None:
+        raise RowError("user_id or patient_email is required")
+    if user_id is not None:
+        try:
+            user_id = int(user_id)
+        except ValueError:
+            raise RowError(f"Invalid user_id: {user_id}")
+
+    record_date = _text(row, 'record_date')
+    if record_date is not None:
+        try:
+            record_date = datetime.fromisoformat(record_date.replace('Z', '+00:00'))
+        except ValueError:
+            raise RowError(f"Invalid record_date: {record_date}")
+        if record_date.tzinfo is not None:
+            record_date = record_date.replace(tzinfo=None) - record_date.utcoffset()
+
+    return {
+        'user_id': user_id,
+        'patient_email': email,
+        'record_date': record_date or datetime.utcnow(),
+        'diagnosis': diagnosis,
+        'prescription': _text(row, 'prescription'),
+        'notes': _text(row, 'notes'),
+    }
+
+
+def _add_error(result, line_number, error):
+    result['error_count'] += 1
+    if len(result['errors']) < MAX_REPORTED_ERRORS:
+        result['errors'].append({'line': line_number, 'error': str(error)})
+
+
+def _resolve_patients(session, user_model, chunk):
+    """Map the chunk's user ids and emails to patient ids in one query"""
+    ids = {values['user_id'] for _, values in chunk if values['user_id'] is not None}
+    emails = {values['patient_email'] for _, values in chunk if values['user_id'] is None}
+    conditions = []
+    if ids:
+        conditions.append(user_model.id.in_(ids))
+    if emails:
+        conditions.append(user_model.email.in_(emails))
+    rows = session.execute(
+        select(user_model.id, user_model.email).where(or_(*conditions), user_model.is_doctor == False)
+    ).all()
+    return {row.id for row in rows}, {row.email: row.id for row in rows}
+
+
+def _insert_chunk(session, record_model, user_model, chunk, result, on_chunk):
+    patient_ids, by_email = _resolve_patients(session, user_model, chunk)
+    rows = []
+    for line_number, values in chunk:
+        user_id = values['user_id'] if values['user_id'] is not None else by_email.get(values['patient_email'])
+        if user_id not in patient_ids:
+            _add_error(result, line_number, RowError("Unknown patient"))
+            continue
+        rows.append({
+            'user_id': user_id,
+            'record_date': values['record_date'],
+            'diagnosis': values['diagnosis'],
+            'prescription': values['prescription'],
+            'notes': values['notes'],
+        })
+    if not rows:
+        return
+
+    ids = session.scalars(
+        insert(record_model).returning(record_model.id, sort_by_parameter_order=True), rows
+    ).all()
+    after_commit = on_chunk(session, list(zip(ids, rows))) if on_chunk is not None else None
+    session.commit()
+    result['inserted'] += len(ids)
+    if after_commit is not None:
+        after_commit()
+
+
+def _spool_rows(stream, fmt, result):
+    """First pass: validate every row, spooling the good ones; returns the spool file"""
+    spool = tempfile.TemporaryFile('w+', encoding='utf-8')
+    try:
+        for line_number, row in read_rows(stream, fmt):
+            if isinstance(row, RowError):
+                _add_error(result, line_number, row)
+                continue
+            try:
+                values = validate_row(row)
+            except RowError as e:
+                _add_error(result, line_number, e)
+                continue
+            values['record_date'] = values['record_date'].isoformat()
+            spool.write(json.dumps([line_number, values]) + "\n")
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+def _spooled_chunks(spool, chunk_size):
+    chunk = []
+    for line in spool:
+        line_number, values = json.loads(line)
+        values['record_date'] = datetime.fromisoformat(values['record_date'])
+        chunk.append((line_number, values))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def import_records(session, record_model, user_model, stream, fmt, chunk_size=1000, on_chunk=None):
+    """Import records from a CSV or NDJSON text stream; returns counts and the first errors
+
+    ``on_chunk(session, [(record_id, row), ...])`` runs after each chunk is
+    inserted and before it commits, so it can add rows in the same
+    transaction; it may return a callable to run once the commit is done.
+    Decoding errors (e.g. UnicodeDecodeError) propagate before any commit;
+    a database error after some chunks committed raises ``ImportFailed``.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format '{fmt}' (choose from {', '.join(FORMATS)})")
+    result = {'inserted': 0, 'error_count': 0, 'errors': []}
+    with _spool_rows(stream, fmt, result) as spool:
+        for chunk in _spooled_chunks(spool, chunk_size):
+            try:
+                _insert_chunk(session, record_model, user_model, chunk, result, on_chunk)
+            except Exception as e:
+                session.rollback()
+                raise ImportFailed(
+                    f"Import stopped at line {chunk[0][0]} after {result['inserted']} records were committed: {e}",
+                    result
+                ) from e
+    return result
+
+
+def export_statement(record_model, user_model, user_id=None):
+    """Records joined to their patient's email, oldest first"""
+    statement = select(
+        record_model.id, record_model.user_id, user_model.email.label('patient_email'),
+        record_model.record_date, record_model.diagnosis, record_model.prescription,
+        record_model.notes, record_model.summary
+    ).join(user_model, record_model.user_id == user_model.id).order_by(record_model.id)
+    if user_id is not None:
+        statement = statement.where(record_model.user_id == user_id)
+    return statement
+
+
+def _export_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def export_records(session, statement, fmt, batch_size=1000):
+    """Yield ``statement``'s rows as CSV or NDJSON text, one chunk per batch"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format '{fmt}' (choose from {', '.join(FORMATS)})")
+    result = session.execute(statement.execution_options(yield_per=batch_size))
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == 'csv' else None
+    if writer is not None:
+        writer.writerow(EXPORT_FIELDS)
+    for partition in result.partitions():
+        for row in partition:
+            values = row._mapping
+            if writer is not None:
+                writer.writerow([_export_value(values[field]) for field in EXPORT_FIELDS])
+            else:
+                buffer.write(json.dumps({field: _export_value(values[field]) for field in EXPORT_FIELDS}) + "\n")
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if writer is not None and buffer.tell():
+        yield buffer.getvalue()
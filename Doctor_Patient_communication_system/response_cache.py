@@ -0,0 +1,127 @@
+# response_cache.py
+"""
+Cached, conditional JSON responses for polled API routes.
+
+Each cached route names the tables it reads. Every table has a version
+counter in the database (see table_versions.py) that is bumped by any
+commit touching it, and a cached body is only served while the versions it
+was built from are current, in whichever worker process made the change.
+Responses carry an ETag over the body, so a poll whose If-None-Match still
+matches a current entry gets 304 without running the view.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, current_app, make_response, request
+from flask_login import current_user
+
+
+# Every table some cached route reads; only writes to these bump versions
+CACHED_TABLES = set()
+
+
+def by_role():
+    """Scope shared by every user of the same role"""
+    return 'doctor' if current_user.is_doctor else 'patient'
+
+
+def by_user():
+    """Scope private to the signed-in user"""
+    return f'user:{current_user.id}'
+
+
+class ResponseCache:
+    """LRU of (route, scope, query string) -> body, validated by ``TableVersions``"""
+
+    def __init__(self, versions, ttl=None, max_entries=None):
+        self.table_versions = versions
+        self.ttl = float(os.environ.get('API_CACHE_TTL', 30) if ttl is None else ttl)
+        self.max_entries = max_entries or int(os.environ.get('API_CACHE_SIZE', 1024))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def versions(self, tables):
+        return self.table_versions.get(tables)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _lookup(self, key, versions):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != versions or entry[1] < time.monotonic():
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def _store(self, key, versions, body, mimetype, etag):
+        with self._lock:
+            self._entries[key] = (versions, time.monotonic() + self.ttl, body, mimetype, etag)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _finish(self, response):
+        # Browsers must revalidate every poll; the ETag makes that cheap
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response.make_conditional(request)
+
+    def respond(self, view, args, kwargs, tables, scope):
+        if self.ttl <= 0:
+            return view(*args, **kwargs)
+        key = (request.endpoint, scope, request.query_string)
+        versions = self.versions(tables)
+
+        entry = self._lookup(key, versions)
+        if entry is not None:
+            _, _, body, mimetype, etag = entry
+            with self._lock:
+                if request.if_none_match.contains(etag):
+                    self.not_modified += 1
+                else:
+                    self.hits += 1
+            response = Response(body, mimetype=mimetype)
+            response.set_etag(etag)
+            return self._finish(response)
+
+        with self._lock:
+            self.misses += 1
+        response = make_response(view(*args, **kwargs))
+        if response.status_code != 200 or response.direct_passthrough:
+            return response
+        body = response.get_data()
+        etag = hashlib.sha1(body).hexdigest()
+        # Stored under the versions read before the view ran, so a commit
+        # landing mid-request makes this entry stale rather than wrong
+        self._store(key, versions, body, response.mimetype, etag)
+        response.set_etag(etag)
+        return self._finish(response)
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses,
+                    'not_modified': self.not_modified, 'ttl': self.ttl}
+
+
+def cached_response(*tables, scope=by_role):
+    """Serve a JSON view from the app's ResponseCache until one of ``tables`` changes"""
+    CACHED_TABLES.update(tables)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            cache = current_app.extensions.get('response_cache')
+            if cache is None:
+                return view(*args, **kwargs)
+            return cache.respond(view, args, kwargs, tables, scope())
+        return wrapper
+    return decorator
@@ -0,0 +1,185 @@
+# result_cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+def normalize_text(text):
+    """Normalize input so trivially different copies of a note share a cache entry"""
+    text = unicodedata.normalize("NFC", text)
+    return " ".join(text.split())
+
+
+def make_key(model, task, params, text):
+    """Content-addressed key over (model, task, generation params, normalized text)"""
+    payload = json.dumps(
+        {"model": model, "task": task, "params": params or {}, "text": normalize_text(text)},
+        sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MemoryBackend:
+    """In-process LRU store with per-entry expiry"""
+
+    def __init__(self, max_entries=1024, ttl_seconds=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, created_at = entry
+            if self.ttl_seconds is not None and time.time() - created_at > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """SQLite-backed LRU store, shared by every worker process on the host"""
+
+    def __init__(self, path, max_entries=10000, ttl_seconds=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS result_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_result_cache_last_access ON result_cache (last_access)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key):
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT value, created_at FROM result_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if self.ttl_seconds is not None and now - created_at > self.ttl_seconds:
+                conn.execute("DELETE FROM result_cache WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE result_cache SET last_access = ? WHERE key = ?", (now, key))
+            return value
+
+    def set(self, key, value):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO result_cache (key, value, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+            # Evict least recently used rows beyond the size bound
+            conn.execute(
+                "DELETE FROM result_cache WHERE key IN ("
+                "SELECT key FROM result_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM result_cache")
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM result_cache").fetchone()[0]
+
+
+class ResultCache:
+    """Caches model outputs keyed by a hash of the model, task, params and input text"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, model, task, params, text):
+        value = self.backend.get(make_key(model, task, params, text))
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, model, task, params, text, value):
+        self.backend.set(make_key(model, task, params, text), value)
+
+    def get_or_compute(self, model, task, params, text, compute):
+        """Return the cached result, or call ``compute()`` and store what it returns"""
+        value = self.get(model, task, params, text)
+        if value is None:
+            value = compute()
+            if value is not None:
+                self.set(model, task, params, text, value)
+        return value
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "backend": type(self.backend).__name__,
+                "entries": len(self.backend),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+            }
+
+
+def create_cache(backend=None, path=None, max_entries=None, ttl_seconds=None):
+    """Build a ResultCache from arguments, falling back to RESULT_CACHE_* environment variables"""
+    backend = backend or os.environ.get("RESULT_CACHE_BACKEND", "memory")
+    if max_entries is None:
+        max_entries = int(os.environ.get("RESULT_CACHE_MAX_ENTRIES", 1024))
+    if ttl_seconds is None and os.environ.get("RESULT_CACHE_TTL_SECONDS"):
+        ttl_seconds = float(os.environ["RESULT_CACHE_TTL_SECONDS"])
+
+    if backend == "sqlite":
+        path = path or os.environ.get("RESULT_CACHE_PATH", os.path.join("instance", "result_cache.db"))
+        return ResultCache(SQLiteBackend(path, max_entries=max_entries, ttl_seconds=ttl_seconds))
+    if backend == "memory":
+        return ResultCache(MemoryBackend(max_entries=max_entries, ttl_seconds=ttl_seconds))
+    raise ValueError(f"Unknown result cache backend: {backend}")
@@ -0,0 +1,412 @@
+# retrieval.py
+"""
+Retrieval stage for the medical chat.
+
+Medical records, discussions and comments are split into short passages,
+embedded once when they are written, and kept in a NumPy index that is
+persisted to disk. A chat query embeds only the question and searches the
+index (brute force, or IVF once the index is large) for the top-k passages
+the user may see, which then become the QA model's context.
+
+One process at a time is the index writer, holding an exclusive lock on
+``<index_path>.lock``: it applies changes and saves the index. Every other
+process serves searches from the last saved copy and reloads it when the
+writer saves a new one.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+import weakref
+
+try:
+    import fcntl
+except ImportError:  # Windows: no other processes share the index
+    fcntl = None
+
+import numpy as np
+
+from Doctor_Patient_communication_system.extensions import after_fork
+
+PUBLIC_OWNER = -1  # owner id for passages every user may read (forum posts)
+
+_services = weakref.WeakSet()
+
+
+class Embedder:
+    """Sentence embeddings from a Hugging Face encoder with mean pooling"""
+
+    def __init__(self, model_name="sentence-transformers/all-MiniLM-L6-v2", device="cpu", max_length=256):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        self._torch = torch
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = AutoModel.from_pretrained(model_name).to(device).eval()
+        self.device = device
+        self.max_length = max_length
+        self.dim = self.model.config.hidden_size
+
+    def encode(self, texts, batch_size=32):
+        """Return L2-normalized float32 embeddings, one row per text"""
+        torch = self._torch
+        rows = []
+        for start in range(0, len(texts), batch_size):
+            batch = self.tokenizer(texts[start:start + batch_size], padding=True, truncation=True,
+                                   max_length=self.max_length, return_tensors="pt").to(self.device)
+            with torch.no_grad():
+                hidden = self.model(**batch).last_hidden_state
+            mask = batch["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+            pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+            pooled = torch.nn.functional.normalize(pooled, dim=1)
+            rows.append(pooled.cpu().numpy().astype(np.float32))
+        if not rows:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.vstack(rows)
+
+
+def split_passages(text, words_per_passage=120, overlap=20):
+    """Split text into overlapping word windows"""
+    words = text.split()
+    if not words:
+        return []
+    step = max(1, words_per_passage - overlap)
+    passages = []
+    for start in range(0, len(words), step):
+        passages.append(" ".join(words[start:start + words_per_passage]))
+        if start + words_per_passage >= len(words):
+            break
+    return passages
+
+
+class VectorIndex:
+    """Incremental inner-product index over normalized vectors
+
+    Rows are appended into a capacity-doubling buffer and deleted rows are
+    only masked out, so updates never rebuild the index. Once the index
+    holds ``ivf_min_size`` rows, a k-means coarse quantizer (IVF) is trained
+    and searches only scan the ``nprobe`` closest lists.
+    """
+
+    def __init__(self, dim, ivf_min_size=4096, nprobe=8):
+        self.dim = dim
+        self.ivf_min_size = ivf_min_size
+        self.nprobe = nprobe
+        self._lock = threading.RLock()
+        self._size = 0
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+        self._owners = np.zeros(0, dtype=np.int64)
+        self._alive = np.zeros(0, dtype=bool)
+        self._lists = np.zeros(0, dtype=np.int32)
+        self._keys = []
+        self._texts = []
+        self._rows_by_doc = {}
+        self._centroids = None
+        self._trained_size = 0
+
+    def __len__(self):
+        return int(self._alive[:self._size].sum())
+
+    def _reserve(self, extra):
+        needed = self._size + extra
+        capacity = len(self._vectors)
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2, 1024)
+        self._vectors = np.resize(self._vectors, (capacity, self.dim))
+        self._owners = np.resize(self._owners, capacity)
+        self._alive = np.resize(self._alive, capacity)
+        self._alive[self._size:] = False
+        self._lists = np.resize(self._lists, capacity)
+
+    def upsert(self, doc_key, owner, passages, vectors):
+        """Replace every passage of a document with new passages and vectors"""
+        with self._lock:
+            self.remove(doc_key)
+            if not passages:
+                # Known but empty, so reconciling does not index it again
+                self._rows_by_doc[doc_key] = []
+                return
+            count = len(passages)
+            self._reserve(count)
+            rows = list(range(self._size, self._size + count))
+            self._vectors[self._size:self._size + count] = vectors
+            self._owners[self._size:self._size + count] = owner
+            self._alive[self._size:self._size + count] = True
+            if self._centroids is not None:
+                self._lists[self._size:self._size + count] = self._assign(vectors)
+            self._keys.extend([doc_key] * count)
+            self._texts.extend(passages)
+            self._rows_by_doc[doc_key] = rows
+            self._size += count
+
+            live = len(self)
+            if live >= self.ivf_min_size and live >= 2 * self._trained_size:
+                self._train_ivf()
+
+    def remove(self, doc_key):
+        with self._lock:
+            for row in self._rows_by_doc.pop(doc_key, []):
+                self._alive[row] = False
+
+    def doc_keys(self):
+        with self._lock:
+            return list(self._rows_by_doc)
+
+    def document(self, doc_key):
+        """(owner, passages) of an indexed document, or None"""
+        with self._lock:
+            rows = self._rows_by_doc.get(doc_key)
+            if rows is None:
+                return None
+            owner = int(self._owners[rows[0]]) if rows else None
+            return owner, [self._texts[row] for row in rows]
+
+    def _assign(self, vectors):
+        return np.argmax(vectors @ self._centroids.T, axis=1).astype(np.int32)
+
+    def _train_ivf(self, iterations=10, seed=0):
+        """Spherical k-means over the live rows, with about sqrt(N) lists"""
+        live_rows = np.flatnonzero(self._alive[:self._size])
+        data = self._vectors[live_rows]
+        nlist = max(1, int(np.sqrt(len(data))))
+        rng = np.random.default_rng(seed)
+        centroids = data[rng.choice(len(data), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(data @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = data[assignment == c]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    centroids[c] = centroid / max(np.linalg.norm(centroid), 1e-9)
+        self._centroids = centroids.astype(np.float32)
+        self._lists[:self._size] = self._assign(self._vectors[:self._size])
+        self._trained_size = len(data)
+
+    def search(self, query, k=5, owner=None):
+        """Return up to k (score, doc_key, passage) tuples
+
+        ``owner`` restricts results to public passages plus that owner's; None
+        searches everything.
+        """
+        with self._lock:
+            if self._size == 0:
+                return []
+            mask = self._alive[:self._size].copy()
+            owners = self._owners[:self._size]
+            if owner is not None:
+                mask &= (owners == PUBLIC_OWNER) | (owners == owner)
+            if self._centroids is not None:
+                probe = np.isin(self._lists[:self._size], np.argsort(-(self._centroids @ query))[:self.nprobe])
+                if owner is not None:
+                    # The lists are trained over everyone's rows, so probing could
+                    # miss all of one user's; scan their own rows exhaustively and
+                    # probe only the public ones
+                    probe |= owners == owner
+                mask &= probe
+
+            candidates = np.flatnonzero(mask)
+            if len(candidates) == 0:
+                return []
+            scores = self._vectors[candidates] @ query
+            top = min(k, len(candidates))
+            best = np.argpartition(-scores, top - 1)[:top]
+            best = best[np.argsort(-scores[best])]
+            return [(float(scores[i]), self._keys[candidates[i]], self._texts[candidates[i]]) for i in best]
+
+    def save(self, path):
+        """Write the index atomically as <path>.npz plus <path>.json"""
+        with self._lock:
+            live = np.flatnonzero(self._alive[:self._size])
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            tmp = f"{path}.tmp"
+            # Both files carry the same version, so a reader that catches them
+            # mid-replace sees a mismatch instead of loading a mixed index
+            version = uuid.uuid4().hex
+            with open(f"{tmp}.npz", "wb") as f:
+                np.savez(f, vectors=self._vectors[live], owners=self._owners[live], version=np.array(version))
+            with open(f"{tmp}.json", "w") as f:
+                json.dump({"dim": self.dim, "version": version, "keys": [self._keys[i] for i in live],
+                           "texts": [self._texts[i] for i in live]}, f)
+            os.replace(f"{tmp}.npz", f"{path}.npz")
+            os.replace(f"{tmp}.json", f"{path}.json")
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        with open(f"{path}.json") as f:
+            meta = json.load(f)
+        arrays = np.load(f"{path}.npz")
+        version = str(arrays["version"]) if "version" in arrays.files else None
+        if version != meta.get("version"):
+            raise ValueError("index files are from different saves")
+        index = cls(meta["dim"], **kwargs)
+        vectors, owners = arrays["vectors"], arrays["owners"]
+        # Group consecutive rows back into documents
+        start = 0
+        keys = meta["keys"]
+        while start < len(keys):
+            end = start
+            while end < len(keys) and keys[end] == keys[start]:
+                end += 1
+            index.upsert(keys[start], int(owners[start]), meta["texts"][start:end], vectors[start:end])
+            start = end
+        return index
+
+
+class RetrievalService:
+    """Holds the vector index, answers searches and, in the writer process, applies changes"""
+
+    def __init__(self, embedder_factory, index_path=None, ivf_min_size=4096, nprobe=8, save_interval=30):
+        self._embedder_factory = embedder_factory
+        self._embedder = None
+        self._embedder_lock = threading.Lock()
+        self.index_path = index_path
+        self.ivf_min_size = ivf_min_size
+        self.nprobe = nprobe
+        self.save_interval = save_interval
+        self._index = None
+        self._index_lock = threading.Lock()
+        self._loaded_version = None
+        self._lock_file = None
+        self._writer_pid = None
+        self._dirty = 0
+        self._saved_at = time.monotonic()
+        # Set once searches see the whole database: after the writer's first
+        # reconcile, or once a reader has loaded a saved index
+        self.ready = False
+        self.reconciled_at = None
+        _services.add(self)
+
+    def _reset_after_fork(self):
+        # A lock held by one of the parent's threads at fork time would never be released here
+        self._embedder_lock = threading.Lock()
+        self._index_lock = threading.Lock()
+        if self._index is not None:
+            self._index._lock = threading.RLock()
+        # The parent's file lock is its own; this process contends for the writer role anew
+        self._lock_file = None
+        self._writer_pid = None
+        self.ready = False
+
+    @property
+    def embedder(self):
+        if self._embedder is None:
+            with self._embedder_lock:
+                if self._embedder is None:
+                    self._embedder = self._embedder_factory()
+        return self._embedder
+
+    @property
+    def index(self):
+        if self._index is None:
+            with self._index_lock:
+                if self._index is None:
+                    self._index = self._load() or VectorIndex(self.embedder.dim, ivf_min_size=self.ivf_min_size,
+                                                              nprobe=self.nprobe)
+        return self._index
+
+    def _load(self):
+        if not self.index_path or not os.path.exists(f"{self.index_path}.json"):
+            return None
+        try:
+            index = VectorIndex.load(self.index_path, ivf_min_size=self.ivf_min_size, nprobe=self.nprobe)
+        except Exception as e:
+            print(f"Error loading retrieval index: {str(e)}")
+            return None
+        self._loaded_version = os.path.getmtime(f"{self.index_path}.json")
+        return index
+
+    @property
+    def is_writer(self):
+        return self._writer_pid == os.getpid()
+
+    def acquire_writer(self):
+        """Take the writer role if no other process holds it; True if this process is the writer"""
+        if self.is_writer:
+            return True
+        if self.index_path and fcntl is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.index_path)), exist_ok=True)
+            lock_file = open(f"{self.index_path}.lock", "a")
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return False
+            self._lock_file = lock_file
+        self._writer_pid = os.getpid()
+        # Start from the latest saved copy; the writer's reconcile brings it up to date
+        with self._index_lock:
+            self._index = None
+        self.ready = False
+        return True
+
+    def refresh(self):
+        """Reader: reload the index if the writer has saved a newer copy"""
+        if not self.index_path or not os.path.exists(f"{self.index_path}.json"):
+            return False
+        if os.path.getmtime(f"{self.index_path}.json") == self._loaded_version:
+            return False
+        index = self._load()
+        if index is None:
+            return False
+        with self._index_lock:
+            self._index = index
+        self.ready = True
+        return True
+
+    def document_ids(self):
+        """{kind: set of ids} of the indexed documents"""
+        ids = {}
+        for key in self.index.doc_keys():
+            kind, _, doc_id = key.partition(":")
+            ids.setdefault(kind, set()).add(int(doc_id))
+        return ids
+
+    def is_current(self, kind, doc_id, owner, text):
+        """Whether the index holds exactly this version of a document"""
+        return self.index.document(f"{kind}:{doc_id}") == (owner if text and text.split() else None,
+                                                              split_passages(text or ""))
+
+    def index_documents(self, documents):
+        """Embed and upsert (kind, id, owner, text) tuples in one batched encode"""
+        entries = []
+        for kind, doc_id, owner, text in documents:
+            passages = split_passages(text or "")
+            entries.append((f"{kind}:{doc_id}", owner, passages))
+
+        all_passages = [p for _, _, passages in entries for p in passages]
+        vectors = self.embedder.encode(all_passages) if all_passages else None
+        offset = 0
+        for doc_key, owner, passages in entries:
+            self.index.upsert(doc_key, owner, passages, vectors[offset:offset + len(passages)] if passages else None)
+            offset += len(passages)
+        self._dirty += len(entries)
+
+    def remove_document(self, kind, doc_id):
+        self.index.remove(f"{kind}:{doc_id}")
+        self._dirty += 1
+
+    def search(self, query, k=5, owner=None):
+        vector = self.embedder.encode([query])[0]
+        return self.index.search(vector, k=k, owner=owner)
+
+    def save(self, force=False):
+        """Writer: persist the index if it changed, at most every ``save_interval`` seconds unless forced"""
+        if not self.is_writer or not self.index_path or self._index is None or not self._dirty:
+            return False
+        if not force and time.monotonic() - self._saved_at < self.save_interval:
+            return False
+        self._index.save(self.index_path)
+        self._loaded_version = os.path.getmtime(f"{self.index_path}.json")
+        self._dirty = 0
+        self._saved_at = time.monotonic()
+        return True
+
+
+@after_fork
+def _reset_services():
+    for service in list(_services):
+        service._reset_after_fork()
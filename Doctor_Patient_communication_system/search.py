@@ -0,0 +1,146 @@
+# search.py
+"""
+Full-text search over medical records, discussions and comments.
+
+On SQLite the text lives in FTS5 external-content tables (created by
+migration 0004 and kept in sync by triggers on the source tables), ranked
+with bm25 and snippeted by FTS5 itself. Other databases fall back to a
+case-insensitive LIKE scan with recency ordering, which is correct but not
+indexed.
+
+bm25 scores from different FTS5 tables are not comparable (each depends on
+its own table's statistics and column weights), so hits are ranked within
+each kind and the kinds interleaved: first hit of every kind, then the
+second, and so on.
+
+Patients only ever see their own records; doctors see every record.
+Discussions and comments are visible to every signed-in user.
+"""
+
+import html
+import re
+from datetime import datetime
+
+from sqlalchemy import text
+
+KINDS = ('record', 'discussion', 'comment')
+
+# Private-use markers survive FTS5's snippet() and are swapped for <mark>
+# after HTML-escaping the user-written text around them
+_MARK_OPEN = '\ue000'
+_MARK_CLOSE = '\ue001'
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+# kind -> (fts table, source table, bm25 column weights, title SQL, date column, owner column)
+_SOURCES = {
+    'record': ('medical_record_fts', 'medical_record', '10.0, 5.0, 2.0, 3.0', 'src.diagnosis', 'src.record_date', 'src.user_id'),
+    'discussion': ('discussion_fts', 'discussion', '5.0, 1.0', 'src.title', 'src.date_posted', None),
+    'comment': ('comment_fts', 'comment', '1.0', "'Comment'", 'src.date_posted', None),
+}
+# kind -> (searched columns, column shown as the snippet) for the LIKE fallback
+_LIKE_COLUMNS = {
+    'record': (('diagnosis', 'prescription', 'notes', 'summary'), 'notes'),
+    'discussion': (('title', 'content'), 'content'),
+    'comment': (('content',), 'content'),
+}
+
+
+def fts_query(query):
+    """Turn free text into a safe FTS5 query: every word must match, the last one as a prefix"""
+    words = _TOKEN.findall(query)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words[:-1]] + [f'"{words[-1]}"*']
+    return ' '.join(terms)
+
+
+def highlight(snippet):
+    """HTML-escape a snippet and turn the match markers into <mark> tags"""
+    escaped = html.escape(snippet or '')
+    return escaped.replace(_MARK_OPEN, '<mark>').replace(_MARK_CLOSE, '</mark>')
+
+
+def _fts_statement(kind, restrict_owner):
+    fts, source, weights, title, date, owner = _SOURCES[kind]
+    where = f"{fts} MATCH :query"
+    if restrict_owner and owner:
+        where += f" AND {owner} = :owner"
+    return text(
+        f"SELECT src.id AS id, {title} AS title, {date} AS date, "
+        f"bm25({fts}, {weights}) AS rank, "
+        f"snippet({fts}, -1, '{_MARK_OPEN}', '{_MARK_CLOSE}', '…', 16) AS snippet "
+        f"{', src.discussion_id AS discussion_id' if kind == 'comment' else ''} "
+        f"FROM {fts} JOIN {source} AS src ON src.id = {fts}.rowid "
+        f"WHERE {where} ORDER BY rank, {date} DESC LIMIT :limit"
+    )
+
+
+def _like_statement(kind, restrict_owner, words):
+    _, source, _, title, date, owner = _SOURCES[kind]
+    columns, snippet_column = _LIKE_COLUMNS[kind]
+    clauses = []
+    for n in range(len(words)):
+        clauses.append('(' + ' OR '.join(
+            f"LOWER(COALESCE(src.{column}, '')) LIKE :word{n} ESCAPE '\\'" for column in columns
+        ) + ')')
+    if restrict_owner and owner:
+        clauses.append(f"{owner} = :owner")
+    return text(
+        f"SELECT src.id AS id, {title} AS title, {date} AS date, 0.0 AS rank, "
+        f"SUBSTR(COALESCE(src.{snippet_column}, ''), 1, 200) AS snippet "
+        f"{', src.discussion_id AS discussion_id' if kind == 'comment' else ''} "
+        f"FROM {source} AS src WHERE {' AND '.join(clauses)} ORDER BY {date} DESC LIMIT :limit"
+    )
+
+
+def like_pattern(word):
+    """A LIKE pattern matching ``word`` anywhere, with its wildcards escaped (use ESCAPE '\\')"""
+    escaped = word.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+def search(connection, query, user_id, is_doctor, kinds=KINDS, page=1, per_page=20):
+    """Return (results, has_more) for one page of hits across ``kinds``, best first within each kind
+
+    Each result is a dict with kind, id, title, date, rank, snippet (HTML
+    with <mark> around matches) and, for comments, discussion_id.
+    """
+    limit = page * per_page + 1
+    use_fts = connection.dialect.name == 'sqlite'
+    words = [word.lower() for word in _TOKEN.findall(query)]
+    match = fts_query(query)
+    if not match:
+        return [], False
+
+    rows = []
+    for kind in kinds:
+        restrict_owner = not is_doctor
+        if use_fts:
+            params = {'query': match, 'limit': limit, 'owner': user_id}
+            statement = _fts_statement(kind, restrict_owner)
+        else:
+            params = {f'word{n}': like_pattern(word) for n, word in enumerate(words)}
+            params.update({'limit': limit, 'owner': user_id})
+            statement = _like_statement(kind, restrict_owner, words)
+        for position, row in enumerate(connection.execute(statement, params).mappings()):
+            result = dict(row)
+            result['kind'] = kind
+            result['date'] = _as_datetime(result['date'])
+            result['snippet'] = highlight(result['snippet'])
+            rows.append((position, result))
+
+    # Each kind arrives best first (bm25, then newest; newest for LIKE), so
+    # interleave by position; the stable sort keeps ``kinds`` order per round
+    rows = [result for _, result in sorted(rows, key=lambda item: item[0])]
+    start = (page - 1) * per_page
+    return rows[start:start + per_page], len(rows) > start + per_page
+
+
+def _as_datetime(value):
+    # SQLite returns raw text for date columns selected through text()
+    if value is None or isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
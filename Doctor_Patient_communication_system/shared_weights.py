@@ -0,0 +1,119 @@
+# shared_weights.py
+"""
+Helpers for sharing model weights between forked gunicorn workers.
+
+Models loaded in the gunicorn master before forking are inherited by every
+worker. As long as nothing writes to those pages they stay shared
+copy-on-write, so N workers cost roughly one copy of the weights. Run
+``python -m Doctor_Patient_communication_system.shared_weights <master_pid>``
+to print the per-worker memory report.
+"""
+
+import gc
+import os
+import sys
+
+
+def freeze_model(model):
+    """Put a model in eval mode and stop autograd from touching its weights"""
+    if not hasattr(model, 'parameters'):
+        # ONNX Runtime models hold no torch parameters
+        return model
+    model.eval()
+    for param in model.parameters():
+        param.requires_grad_(False)
+    return model
+
+
+def freeze_heap():
+    """Move every live object into the permanent GC generation
+
+    Without this the first garbage collection in each worker writes to the
+    GC headers of every inherited object, un-sharing the pages they live on.
+    """
+    gc.collect()
+    gc.freeze()
+
+
+def mmap_load_kwargs():
+    """``from_pretrained`` options that read weights from mmapped safetensors files
+
+    Tensors are created directly over the memory-mapped file, so the weights
+    come from the page cache and are shared between processes even without
+    preloading in the master.
+    """
+    return {'use_safetensors': True, 'low_cpu_mem_usage': True}
+
+
+def env_flag(name, default='0'):
+    return os.environ.get(name, default).lower() in ('1', 'true', 'yes')
+
+
+def process_memory(pid):
+    """Return RSS/PSS/shared/private memory in KB for a process, from /proc"""
+    fields = {'Rss': 'rss_kb', 'Pss': 'pss_kb', 'Shared_Clean': 'shared_clean_kb',
+              'Shared_Dirty': 'shared_dirty_kb', 'Private_Clean': 'private_clean_kb',
+              'Private_Dirty': 'private_dirty_kb'}
+    usage = {value: 0 for value in fields.values()}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            key, _, rest = line.partition(':')
+            if key in fields:
+                usage[fields[key]] = int(rest.split()[0])
+    usage['shared_kb'] = usage.pop('shared_clean_kb') + usage.pop('shared_dirty_kb')
+    usage['private_kb'] = usage.pop('private_clean_kb') + usage.pop('private_dirty_kb')
+    return usage
+
+
+def child_pids(pid):
+    """Return the direct children of a process (the gunicorn workers of a master)"""
+    children = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # The command name may contain spaces, so parse after its closing paren
+        ppid = int(stat.rsplit(')', 1)[1].split()[1])
+        if ppid == pid:
+            children.append(int(entry))
+    return sorted(children)
+
+
+def worker_memory_report(master_pid):
+    """Memory usage of a gunicorn master and each of its workers"""
+    report = {'master': dict(pid=master_pid, **process_memory(master_pid)), 'workers': []}
+    for pid in child_pids(master_pid):
+        try:
+            report['workers'].append(dict(pid=pid, **process_memory(pid)))
+        except OSError:
+            continue
+    workers = report['workers']
+    report['total_worker_rss_kb'] = sum(w['rss_kb'] for w in workers)
+    report['total_worker_pss_kb'] = sum(w['pss_kb'] for w in workers)
+    return report
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1:
+        print("usage: python -m Doctor_Patient_communication_system.shared_weights <gunicorn_master_pid>")
+        return 2
+
+    report = worker_memory_report(int(argv[0]))
+    header = f"{'role':<8}{'pid':>8}{'rss MB':>10}{'pss MB':>10}{'shared MB':>11}{'private MB':>12}"
+    print(header)
+    rows = [('master', report['master'])] + [('worker', w) for w in report['workers']]
+    for role, usage in rows:
+        print(f"{role:<8}{usage['pid']:>8}{usage['rss_kb'] / 1024:>10.1f}{usage['pss_kb'] / 1024:>10.1f}"
+              f"{usage['shared_kb'] / 1024:>11.1f}{usage['private_kb'] / 1024:>12.1f}")
+    print(f"workers: {len(report['workers'])}, total RSS {report['total_worker_rss_kb'] / 1024:.1f} MB, "
+          f"total PSS {report['total_worker_pss_kb'] / 1024:.1f} MB")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
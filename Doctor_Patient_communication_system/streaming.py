@@ -0,0 +1,94 @@
+# streaming.py
+import json
+import threading
+
+from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+
+# Decoding settings every stream uses, whatever the caller passes
+STREAM_DECODING = {'num_beams': 1, 'do_sample': False}
+
+
+class CancelOnEvent(StoppingCriteria):
+    """Stops ``generate`` at the next decoding step once the event is set"""
+
+    def __init__(self, event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return self.event.is_set()
+
+
+def stream_generate(model, tokenizer, text, cancel_event=None, prefix="", timeout=300, **generate_kwargs):
+    """Yield decoded text pieces as ``model.generate`` produces tokens
+
+    Generation runs on a helper thread. If the consumer stops iterating
+    (e.g. the HTTP client disconnected and the response was closed), the
+    cancel event is set and generation stops after the current step.
+    Streaming needs greedy decoding, so ``num_beams`` is forced to 1.
+    An exception in ``generate`` ends the stream and is re-raised here.
+    """
+    cancel_event = cancel_event or threading.Event()
+    inputs = tokenizer(prefix + text, return_tensors="pt", truncation=True)
+    inputs = {key: value.to(model.device) for key, value in inputs.items()}
+
+    streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True, timeout=timeout)
+    generate_kwargs.update(
+        STREAM_DECODING,
+        streamer=streamer,
+        stopping_criteria=StoppingCriteriaList([CancelOnEvent(cancel_event)]),
+    )
+    errors = []
+
+    def generate():
+        try:
+            model.generate(**inputs, **generate_kwargs)
+        except Exception as e:
+            errors.append(e)
+            # Wake the consumer now rather than after the streamer's timeout
+            streamer.end()
+
+    thread = threading.Thread(target=generate, daemon=True)
+    thread.start()
+
+    try:
+        for piece in streamer:
+            if piece:
+                yield piece
+        if errors:
+            raise errors[0]
+    finally:
+        cancel_event.set()
+        thread.join()
+
+
+def sse_event(data, event=None):
+    """Format one server-sent event with a JSON payload"""
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
+
+
+def sse_stream(pieces, on_complete=None):
+    """Wrap a text-piece generator as server-sent events, ending with the full text
+
+    ``on_complete(text)`` is called once the generator finishes without error,
+    e.g. to cache the result; it is not called for failed or abandoned streams.
+    """
+    parts = []
+    try:
+        for piece in pieces:
+            parts.append(piece)
+            yield sse_event({'token': piece})
+    except Exception as e:
+        yield sse_event({'error': str(e)}, event='error')
+        return
+    finally:
+        # Propagate client disconnects to the generation thread
+        if hasattr(pieces, 'close'):
+            pieces.close()
+    text = "".join(parts).strip()
+    if on_complete is not None and text:
+        try:
+            on_complete(text)
+        except Exception as e:
+            print(f"Stream completion callback error: {str(e)}")
+    yield sse_event({'text': text}, event='done')
@@ -0,0 +1,77 @@
+# table_versions.py
+"""
+Per-table change counters shared by every worker process through the database.
+
+A commit that writes a table also increments that table's row in a small
+version table, inside the same transaction (``bump_versions``, called from
+the session's after_flush listener in app.py). Caches remember the versions
+they were filled under and treat an entry as stale once any of them moves,
+so a write in one gunicorn worker retires the cached copies in all of them.
+
+``TableVersions`` reads the counters at most every ``poll_interval`` seconds
+per process; a process's own commits expire its copy at once, so only
+writes made elsewhere are seen up to ``poll_interval`` late.
+"""
+
+import threading
+import time
+
+from sqlalchemy import update
+
+
+def bump_versions(connection, table, names):
+    """Increment the counters in ``table`` (columns name, version) for ``names``"""
+    names = sorted(names)
+    if not names:
+        return
+    dialect = connection.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        statement = insert(table).values([{'name': name, 'version': 1} for name in names])
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=[table.c.name], set_={'version': table.c.version + 1}))
+        return
+    # Elsewhere: update existing counters, then create the missing ones
+    for name in names:
+        result = connection.execute(update(table).where(table.c.name == name).values(version=table.c.version + 1))
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(name=name, version=1))
+
+
+class TableVersions:
+    """This process's view of the shared counters, refreshed by ``read_fn() -> {name: version}``"""
+
+    def __init__(self, read_fn, poll_interval=1.0):
+        self.read_fn = read_fn
+        self.poll_interval = poll_interval
+        self._versions = {}
+        self._read_at = None
+        # Bumped by expire() so a poll racing a local commit does not count as fresh
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.polls = 0
+
+    def get(self, names):
+        """Current versions of ``names`` as a tuple, polling the database if due"""
+        now = time.monotonic()
+        with self._lock:
+            due = self._read_at is None or now - self._read_at >= self.poll_interval
+            generation = self._generation
+        if due:
+            versions = self.read_fn()
+            with self._lock:
+                self._versions = versions
+                self.polls += 1
+                if generation == self._generation:
+                    self._read_at = now
+        with self._lock:
+            return tuple(self._versions.get(name, 0) for name in names)
+
+    def expire(self):
+        """Re-read on the next lookup, e.g. after this process committed a write"""
+        with self._lock:
+            self._generation += 1
+            self._read_at = None
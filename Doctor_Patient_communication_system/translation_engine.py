@@ -0,0 +1,222 @@
+# translation_engine.py
+"""
+Translation across many language pairs with a bounded set of resident models.
+
+Each (source, target) pair is served by its own small MarianMT checkpoint.
+Models are loaded on first use into a pool that keeps their combined weight
+size under a memory budget, unloading the least recently used pair when a
+new one needs room. Input is split into sentences so a long handout becomes
+one padded batch of short sequences instead of a single sequence that
+overruns the model's context.
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from Doctor_Patient_communication_system.inference_scheduler import BatchScheduler
+
+# Helsinki-NLP opus-mt checkpoints for the languages offered in the UI
+LANGUAGE_PAIR_MODELS = {
+    ('en', 'fr'): "Helsinki-NLP/opus-mt-en-fr",
+    ('en', 'es'): "Helsinki-NLP/opus-mt-en-es",
+    ('en', 'de'): "Helsinki-NLP/opus-mt-en-de",
+    ('en', 'zh'): "Helsinki-NLP/opus-mt-en-zh",
+    ('en', 'hi'): "Helsinki-NLP/opus-mt-en-hi",
+    ('fr', 'en'): "Helsinki-NLP/opus-mt-fr-en",
+    ('es', 'en'): "Helsinki-NLP/opus-mt-es-en",
+    ('de', 'en'): "Helsinki-NLP/opus-mt-de-en",
+    ('zh', 'en'): "Helsinki-NLP/opus-mt-zh-en",
+    ('hi', 'en'): "Helsinki-NLP/opus-mt-hi-en",
+}
+
+# Used when a model exposes no parameters to measure (e.g. ONNX Runtime),
+# and as the expected size of a pair that has never been loaded
+DEFAULT_MODEL_BYTES = 300 * 1024 * 1024
+
+_PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+_SENTENCE_END = re.compile(r'(?<=[.!?;:])\s+')
+
+
+def parse_pair(value):
+    """'en-fr' -> ('en', 'fr')"""
+    source, _, target = value.strip().partition('-')
+    if not source or not target:
+        raise ValueError(f"Invalid language pair '{value}', expected e.g. en-fr")
+    return source, target
+
+
+def model_memory(pipe):
+    """Bytes held by a pipeline's weights"""
+    model = getattr(pipe, 'model', pipe)
+    if not hasattr(model, 'parameters'):
+        return DEFAULT_MODEL_BYTES
+    size = sum(p.numel() * p.element_size() for p in model.parameters())
+    size += sum(b.numel() * b.element_size() for b in model.buffers())
+    return size or DEFAULT_MODEL_BYTES
+
+
+def split_sentences(text, max_chars=400):
+    """Split text into paragraphs of sentences, breaking overlong sentences on word boundaries"""
+    paragraphs = []
+    for paragraph in _PARAGRAPH_BREAK.split(text.strip()):
+        sentences = []
+        for sentence in _SENTENCE_END.split(" ".join(paragraph.split())):
+            if not sentence:
+                continue
+            while len(sentence) > max_chars:
+                cut = sentence.rfind(" ", 0, max_chars)
+                cut = cut if cut > 0 else max_chars
+                sentences.append(sentence[:cut])
+                sentence = sentence[cut:].lstrip()
+            if sentence:
+                sentences.append(sentence)
+        if sentences:
+            paragraphs.append(sentences)
+    return paragraphs
+
+
+class TranslationModelPool:
+    """Per-language-pair models loaded on demand under a memory budget
+
+    ``loader(model_name)`` returns a translation pipeline. Before a pair is
+    loaded its expected size (as measured last time, else
+    ``DEFAULT_MODEL_BYTES``) is reserved and least recently used pairs are
+    unloaded until that fits in ``memory_budget`` bytes, so the old and new
+    weights are never resident together past the budget. The pair being
+    loaded is always kept, even if it alone exceeds the budget.
+    """
+
+    def __init__(self, loader, memory_budget=1024 * 1024 * 1024, models=None):
+        self.loader = loader
+        self.memory_budget = memory_budget
+        self.models = dict(LANGUAGE_PAIR_MODELS if models is None else models)
+
+        self._pipes = OrderedDict()
+        self._sizes = {}
+        self._reserved = {}
+        self._known_sizes = {}
+        self._lock = threading.Lock()
+        self._load_locks = {pair: threading.Lock() for pair in self.models}
+        self._errors = {}
+
+        self.loads = 0
+        self.evictions = 0
+        self.load_seconds = 0.0
+
+    def supports(self, source, target):
+        return (source, target) in self.models
+
+    def pairs(self):
+        return sorted(self.models)
+
+    def get(self, source, target):
+        """Return the pipeline for a language pair, loading it (and unloading others) if needed"""
+        pair = (source, target)
+        if pair not in self.models:
+            raise KeyError(f"No translation model for {source}->{target}")
+
+        with self._lock:
+            if pair in self._pipes:
+                self._pipes.move_to_end(pair)
+                return self._pipes[pair]
+
+        with self._load_locks[pair]:
+            with self._lock:
+                if pair in self._pipes:
+                    self._pipes.move_to_end(pair)
+                    return self._pipes[pair]
+                if pair in self._errors:
+                    raise RuntimeError(f"Translation model {self.models[pair]} failed to load: {self._errors[pair]}")
+                self._reserved[pair] = self._known_sizes.get(pair, DEFAULT_MODEL_BYTES)
+                self._evict(keep=pair)
+
+            started = time.perf_counter()
+            try:
+                pipe = self.loader(self.models[pair])
+            except Exception as e:
+                with self._lock:
+                    self._reserved.pop(pair, None)
+                    self._errors[pair] = str(e)
+                print(f"Error loading translation model {self.models[pair]}: {str(e)}")
+                raise
+            size = model_memory(pipe)
+
+            with self._lock:
+                self.loads += 1
+                self.load_seconds += time.perf_counter() - started
+                del self._reserved[pair]
+                self._pipes[pair] = pipe
+                self._sizes[pair] = size
+                self._known_sizes[pair] = size
+                # The estimate may have been low
+                self._evict(keep=pair)
+            return pipe
+
+    def _evict(self, keep):
+        # Callers still running a batch on an evicted model keep their own
+        # reference; the weights are freed once that batch finishes
+        while sum(self._sizes.values()) + sum(self._reserved.values()) > self.memory_budget:
+            victim = next((pair for pair in self._pipes if pair != keep), None)
+            if victim is None:
+                return
+            del self._pipes[victim]
+            del self._sizes[victim]
+            self.evictions += 1
+
+    def unload(self, source, target):
+        with self._lock:
+            self._pipes.pop((source, target), None)
+            self._sizes.pop((source, target), None)
+            self._errors.pop((source, target), None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "loaded": [f"{source}-{target}" for source, target in self._pipes],
+                "resident_bytes": sum(self._sizes.values()),
+                "reserved_bytes": sum(self._reserved.values()),
+                "memory_budget": self.memory_budget,
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "load_seconds": round(self.load_seconds, 3),
+                "failed": {f"{source}-{target}": error for (source, target), error in self._errors.items()},
+            }
+
+
+class TranslationEngine:
+    """Sentence-level batched translation over a TranslationModelPool
+
+    Sentences from every concurrent request for the same pair share the
+    scheduler's batches, so a long document and several short messages are
+    translated in the same forward passes.
+    """
+
+    def __init__(self, pool, max_batch_size=16, max_wait_ms=10, max_chars=400):
+        self.pool = pool
+        self.max_chars = max_chars
+        self.scheduler = BatchScheduler(self._run_batch, max_batch_size=max_batch_size,
+                                        max_wait_ms=max_wait_ms, name="translation")
+
+    def _run_batch(self, sentences, source_lang, target_lang, **params):
+        pipe = self.pool.get(source_lang, target_lang)
+        outputs = pipe(sentences, batch_size=len(sentences), **params)
+        return [output["translation_text"] for output in outputs]
+
+    def supports(self, source, target):
+        return self.pool.supports(source, target)
+
+    def translate(self, text, source_lang="en", target_lang="fr"):
+        """Translate text, keeping its paragraph breaks"""
+        if not self.supports(source_lang, target_lang):
+            raise KeyError(f"No translation model for {source_lang}->{target_lang}")
+        paragraphs = split_sentences(text, self.max_chars)
+        futures = [
+            [self.scheduler.submit(sentence, source_lang=source_lang, target_lang=target_lang) for sentence in sentences]
+            for sentences in paragraphs
+        ]
+        return "\n\n".join(" ".join(future.result() for future in paragraph) for paragraph in futures)
+
+    def stats(self):
+        return dict(self.pool.stats(), scheduler=self.scheduler.metrics())
@@ -0,0 +1,342 @@
+# tts_store.py
+"""
+Content-addressed store for synthesized speech.
+
+Audio is saved as ``<sha256 of backend/language/text>.<ext>``, so the same
+text in the same language is synthesized once and then served as a static
+file. Synthesis runs on a background job queue; a ``<key>.pending`` marker
+lets every worker process see (and not duplicate) work in progress, and a
+``<key>.failed`` marker records the last error. Markers of queued and
+running jobs are touched every quarter of ``pending_timeout`` so a long
+queue or a slow engine is not mistaken for a crashed worker. The directory is kept under
+``max_bytes`` by evicting the least recently used files, both after writes
+and from a periodic sweeper thread.
+"""
+
+import os
+import re
+import threading
+import time
+import uuid
+import wave
+
+from Doctor_Patient_communication_system.job_queue import JobQueue
+from Doctor_Patient_communication_system.result_cache import make_key
+
+try:
+    import gtts
+    GTTS_AVAILABLE = True
+except ImportError:
+    GTTS_AVAILABLE = False
+
+try:
+    import pyttsx3
+    PYTTSX3_AVAILABLE = True
+except ImportError:
+    PYTTSX3_AVAILABLE = False
+
+KEY_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+AUDIO_EXTENSIONS = ('.mp3', '.wav')
+
+
+class GTTSBackend:
+    """Google Translate's text-to-speech service (needs network access)"""
+    name = "gtts"
+    extension = "mp3"
+
+    def available(self):
+        return GTTS_AVAILABLE
+
+    def synthesize(self, text, language, path):
+        gtts.gTTS(text=text, lang=language, slow=False).save(path)
+
+
+class OfflineBackend:
+    """Local speech engine via pyttsx3 (espeak/SAPI/NSSpeech); no network needed"""
+    name = "offline"
+    extension = "wav"
+
+    def __init__(self):
+        # pyttsx3 engines are not thread-safe
+        self._lock = threading.Lock()
+
+    def available(self):
+        return PYTTSX3_AVAILABLE
+
+    def synthesize(self, text, language, path):
+        with self._lock:
+            engine = pyttsx3.init()
+            for voice in engine.getProperty('voices'):
+                languages = [str(lang).lower() for lang in (getattr(voice, 'languages', None) or [])]
+                if any(language in lang for lang in languages) or language in voice.id.lower():
+                    engine.setProperty('voice', voice.id)
+                    break
+            engine.save_to_file(text, path)
+            engine.runAndWait()
+
+
+class StubBackend:
+    """Writes a short silent WAV; stands in for a real engine in tests and development"""
+    name = "stub"
+    extension = "wav"
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+
+    def available(self):
+        return True
+
+    def synthesize(self, text, language, path):
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        with wave.open(path, 'wb') as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(8000)
+            f.writeframes(b'\x00\x00' * 800)
+
+
+BACKENDS = {
+    'gtts': GTTSBackend,
+    'offline': OfflineBackend,
+    'stub': StubBackend,
+}
+
+
+def create_backend(name='gtts'):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown text-to-speech backend '{name}' (choose from {', '.join(BACKENDS)})")
+    return BACKENDS[name]()
+
+
+class AudioStore:
+    """Deduplicated, size-bounded audio files with asynchronous synthesis"""
+
+    def __init__(self, directory, backend, max_bytes=512 * 1024 * 1024, sweep_interval=300,
+                 pending_timeout=120, max_workers=2, max_attempts=2):
+        self.directory = directory
+        self.backend = backend
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self.pending_timeout = pending_timeout
+        os.makedirs(directory, exist_ok=True)
+
+        self.jobs = JobQueue(self._run_job, max_workers=max_workers, max_attempts=max_attempts,
+                             retry_backoff=1.0, on_failure=self._job_failed, name="tts")
+        self._lock = threading.Lock()
+        self._requests = {}
+        self._total_bytes = None
+        self._sweeper = None
+        self._heartbeat = None
+        self._stop = threading.Event()
+
+        self.hits = 0
+        self.misses = 0
+        self.evicted_files = 0
+        self.evicted_bytes = 0
+
+    def key(self, text, language):
+        return make_key(self.backend.name, 'tts', {'language': language}, text)
+
+    def filename(self, key):
+        return f"{key}.{self.backend.extension}"
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _marker_age(self, name):
+        try:
+            return time.time() - os.path.getmtime(self._path(name))
+        except OSError:
+            return None
+
+    def lookup(self, key):
+        """Filename of the stored audio for ``key`` (marking it recently used), or None"""
+        path = self._path(self.filename(key))
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return self.filename(key)
+
+    def request(self, text, language):
+        """Return (key, status) for speech of ``text``, queueing synthesis if needed"""
+        self._start_sweeper()
+        key = self.key(text, language)
+        if self.lookup(key):
+            with self._lock:
+                self.hits += 1
+            return key, 'done'
+        with self._lock:
+            self.misses += 1
+            if key in self._requests:
+                return key, 'pending'
+        if not self._claim(key):
+            return key, 'pending'
+        with self._lock:
+            self._requests[key] = (text, language)
+        self._start_heartbeat()
+        self._remove(f"{key}.failed")
+        self.jobs.submit(key)
+        return key, 'pending'
+
+    def _claim(self, key):
+        """Create the pending marker; False if another process is already synthesizing"""
+        marker = self._path(f"{key}.pending")
+        age = self._marker_age(f"{key}.pending")
+        if age is not None and age > self.pending_timeout:
+            self._remove(f"{key}.pending")
+        try:
+            os.close(os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            return False
+        return True
+
+    def _touch(self, key):
+        """Refresh the pending marker of a job this process still owns"""
+        try:
+            os.utime(self._path(f"{key}.pending"))
+        except FileNotFoundError:
+            pass
+
+    def status(self, key):
+        """('done', filename), ('pending', None), ('failed', error) or (None, None) if unknown"""
+        name = self.lookup(key)
+        if name:
+            return 'done', name
+        with self._lock:
+            if key in self._requests:
+                return 'pending', None
+        age = self._marker_age(f"{key}.pending")
+        if age is not None and age <= self.pending_timeout:
+            return 'pending', None
+        try:
+            with open(self._path(f"{key}.failed"), encoding='utf-8') as f:
+                return 'failed', f.read()
+        except OSError:
+            return None, None
+
+    def _run_job(self, key, attempt):
+        with self._lock:
+            text, language = self._requests[key]
+        self._touch(key)
+        final = self._path(self.filename(key))
+        tmp = f"{final}.{uuid.uuid4().hex}.tmp"
+        try:
+            self.backend.synthesize(text, language, tmp)
+            os.replace(tmp, final)
+        except Exception:
+            self._remove(os.path.basename(tmp))
+            raise
+        self._remove(f"{key}.pending")
+        with self._lock:
+            self._requests.pop(key, None)
+            if self._total_bytes is not None:
+                self._total_bytes += os.path.getsize(final)
+            over_budget = self._total_bytes is None or self._total_bytes > self.max_bytes
+        if over_budget:
+            self.evict()
+
+    def _job_failed(self, key, error):
+        with open(self._path(f"{key}.failed"), 'w', encoding='utf-8') as f:
+            f.write(str(error))
+        self._remove(f"{key}.pending")
+        with self._lock:
+            self._requests.pop(key, None)
+
+    def _remove(self, name):
+        try:
+            os.remove(self._path(name))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def evict(self):
+        """Delete least recently used audio until under ``max_bytes``; also clears stale markers"""
+        now = time.time()
+        files = []
+        for entry in os.scandir(self.directory):
+            if not entry.is_file():
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            # Leftovers from crashed writers and old failures
+            if entry.name.endswith(('.tmp', '.pending', '.failed')):
+                if now - stat.st_mtime > max(self.pending_timeout, 3600):
+                    self._remove(entry.name)
+                continue
+            if entry.name.endswith(AUDIO_EXTENSIONS):
+                files.append((stat.st_mtime, stat.st_size, entry.name))
+
+        total = sum(size for _, size, _ in files)
+        removed = freed = 0
+        for _, size, name in sorted(files):
+            if total - freed <= self.max_bytes:
+                break
+            if self._remove(name):
+                removed += 1
+            freed += size
+        with self._lock:
+            self._total_bytes = total - freed
+            self.evicted_files += removed
+            self.evicted_bytes += freed
+        return removed, freed
+
+    def _start_sweeper(self):
+        if self._sweeper is not None or not self.sweep_interval:
+            return
+        with self._lock:
+            if self._sweeper is not None:
+                return
+            self._sweeper = threading.Thread(target=self._sweep, name="tts-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def _start_heartbeat(self):
+        if self._heartbeat is not None:
+            return
+        with self._lock:
+            if self._heartbeat is not None:
+                return
+            self._heartbeat = threading.Thread(target=self._beat, name="tts-heartbeat", daemon=True)
+        self._heartbeat.start()
+
+    def _beat(self):
+        while not self._stop.wait(self.pending_timeout / 4):
+            with self._lock:
+                keys = list(self._requests)
+            for key in keys:
+                try:
+                    self._touch(key)
+                except OSError as e:
+                    print(f"Audio store heartbeat error: {str(e)}")
+
+    def _sweep(self):
+        while True:
+            try:
+                self.evict()
+            except Exception as e:
+                print(f"Audio store sweep error: {str(e)}")
+            if self._stop.wait(self.sweep_interval):
+                return
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": self.backend.name,
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "pending": len(self._requests),
+                "evicted_files": self.evicted_files,
+                "evicted_bytes": self.evicted_bytes,
+                "jobs": self.jobs.stats(),
+            }
+
+    def close(self):
+        self._stop.set()
+        self.jobs.shutdown(wait=False)
@@ -4,10 +4,7 @@ Routes and views for the flask application.
 
 from datetime import datetime
 from flask import render_template
-from Doctor_Patient_communication_system import app
 
-@app.route('/')
-@app.route('/home')
 def home():
     """Renders the home page."""
     return render_template(
@@ -16,7 +13,6 @@ def home():
         year=datetime.now().year,
     )
 
-@app.route('/contact')
 def contact():
     """Renders the contact page."""
     return render_template(
@@ -26,7 +22,6 @@ def contact():
         message='Your contact page.'
     )
 
-@app.route('/about')
 def about():
     """Renders the about page."""
     return render_template(
@@ -35,3 +30,9 @@ def about():
         year=datetime.now().year,
         message='Your application description page.'
     )
+
+def init_app(app):
+    """Add the pages to the app ('/' itself is the index route in app.py)"""
+    app.add_url_rule('/home', 'home', home)
+    app.add_url_rule('/contact', 'contact', contact)
+    app.add_url_rule('/about', 'about', about)
@@ -0,0 +1,180 @@
+# write_behind.py
+import atexit
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """Queues rows in memory and writes them in bulk off the request path
+
+    Rows are handed to ``flush_fn(rows)`` (a list of dicts, e.g. for one
+    executemany INSERT) once ``max_rows`` are queued or the oldest row has
+    waited ``max_delay`` seconds. Whatever is still queued is flushed when
+    the process exits, and rows appended after that are written at once.
+
+    A flush that fails with an error ``retryable(exc)`` accepts (a locked or
+    unreachable database) puts its rows back, and the background thread
+    waits ``retry_delay`` seconds, doubling per consecutive failure up to
+    ``max_retry_delay``, before trying again. Any other
+    failure is bisected to find the rows that cannot be written; those are
+    handed to ``dead_letter(rows, exc)`` if given and dropped, so one bad
+    row never blocks the rest. Past ``max_pending`` queued rows the oldest
+    are dropped (and counted) rather than growing without bound.
+    """
+
+    def __init__(self, flush_fn, max_rows=200, max_delay=1.0, max_pending=100000, name="write-behind",
+                 retryable=None, dead_letter=None, retry_delay=0.5, max_retry_delay=30.0):
+        self.flush_fn = flush_fn
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.name = name
+        self.retryable = retryable or (lambda exc: False)
+        self.dead_letter = dead_letter
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+
+        self._rows = []
+        self._oldest = None
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        # Backoff after retryable failures: the current delay and when it ends
+        self._backoff = 0.0
+        self._retry_at = None
+
+        self.flushed_rows = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.dropped_rows = 0
+        self.dead_rows = 0
+
+        atexit.register(self.close)
+
+    def append(self, row):
+        with self._cond:
+            closed = self._closed
+            if not closed:
+                self._enqueue(row)
+        if closed:
+            # No thread is left to flush it, so write it on the caller's thread
+            with self._flush_lock:
+                self._write([row])
+
+    def _enqueue(self, row):
+        """Queue ``row``; called with ``_cond`` held"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+        if not self._rows:
+            self._oldest = time.monotonic()
+        self._rows.append(row)
+        self._trim()
+        if len(self._rows) >= self.max_rows:
+            self._cond.notify()
+
+    def _trim(self):
+        """Drop the oldest rows past ``max_pending``; called with ``_cond`` held"""
+        overflow = len(self._rows) - self.max_pending
+        if overflow > 0:
+            del self._rows[:overflow]
+            self.dropped_rows += overflow
+            logger.warning("%s: over %d queued rows, dropped the oldest %d", self.name, self.max_pending, overflow)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed:
+                    now = time.monotonic()
+                    if self._retry_at is not None and now < self._retry_at:
+                        self._cond.wait(self._retry_at - now)
+                        continue
+                    if self._rows and (len(self._rows) >= self.max_rows
+                                       or now - self._oldest >= self.max_delay):
+                        break
+                    timeout = self.max_delay if not self._rows else max(0.0, self._oldest + self.max_delay - now)
+                    self._cond.wait(timeout)
+                if self._closed:
+                    return
+            self.flush()
+
+    def flush(self):
+        """Write every queued row now; returns the number of rows written"""
+        with self._flush_lock:
+            with self._cond:
+                rows, self._rows = self._rows, []
+                self._oldest = None
+            if not rows:
+                return 0
+            return self._write(rows)
+
+    def _write(self, rows):
+        """Write ``rows``, requeueing or bisecting on failure; returns the number written"""
+        try:
+            self.flush_fn(rows)
+        except Exception as e:
+            with self._cond:
+                self.failed_flushes += 1
+            # After close() nothing would retry them, so they are bisected instead
+            if self.retryable(e) and not self._closed:
+                with self._cond:
+                    self._backoff = min(max(self._backoff * 2, self.retry_delay), self.max_retry_delay)
+                    self._retry_at = time.monotonic() + self._backoff
+                    self._rows = rows + self._rows
+                    self._oldest = time.monotonic()
+                    self._trim()
+                logger.warning("%s: flush of %d rows failed, retrying in %.1fs: %s",
+                               self.name, len(rows), self._backoff, e)
+                return 0
+            if len(rows) > 1:
+                middle = len(rows) // 2
+                return self._write(rows[:middle]) + self._write(rows[middle:])
+            self._discard(rows, e)
+            return 0
+        with self._cond:
+            self.flushes += 1
+            self.flushed_rows += len(rows)
+            self._backoff = 0.0
+            self._retry_at = None
+        return len(rows)
+
+    def _discard(self, rows, exc):
+        """Give up on rows that cannot be written"""
+        logger.error("%s: dropping %d row(s) that failed to write: %s", self.name, len(rows), exc)
+        with self._cond:
+            self.dead_rows += len(rows)
+        if self.dead_letter is not None:
+            try:
+                self.dead_letter(rows, exc)
+            except Exception:
+                logger.exception("%s: dead-letter handler failed", self.name)
+
+    def close(self):
+        """Stop the background thread and flush what is left"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def pending(self):
+        with self._cond:
+            return len(self._rows)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "pending": len(self._rows),
+                "flushes": self.flushes,
+                "flushed_rows": self.flushed_rows,
+                "failed_flushes": self.failed_flushes,
+                "dropped_rows": self.dropped_rows,
+                "dead_rows": self.dead_rows,
+            }
@@ -1,49 +1,238 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session
+from flask import Blueprint, Response, current_app, render_template, request, jsonify, redirect, url_for, session, stream_template, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import joinedload
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.local import LocalProxy
+import io
 import os
-from datetime import datetime
-import uuid
+import weakref
+from datetime import datetime, timedelta
+import atexit
+import time
+import click
+
+from Doctor_Patient_communication_system.auth import HasherBusy, PasswordHasher, UserCache
+from Doctor_Patient_communication_system.chat_archive import archive_chat_history
+from Doctor_Patient_communication_system.database import configure_database, engine_options
+from Doctor_Patient_communication_system.extensions import LazyExtension, after_fork, in_app_context
+from Doctor_Patient_communication_system.inference_scheduler import (
+    BatchScheduler, summarization_batch_fn, cached_qa_batch_fn
+)
+from Doctor_Patient_communication_system.instrumentation import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY as metrics_registry, instrument_app, instrument_pipeline
+)
+from Doctor_Patient_communication_system.job_queue import JobQueue, PeriodicTask
+from Doctor_Patient_communication_system.migrations import apply_migrations
+from Doctor_Patient_communication_system.model_registry import ModelRegistry
+from Doctor_Patient_communication_system.pagination import StreamedPage, encode_cursor, decode_cursor, keyset_page, parse_datetime
+from Doctor_Patient_communication_system.preprocessing import bucketed
+from Doctor_Patient_communication_system.record_io import (
+    FORMATS as RECORD_FORMATS, ImportFailed, detect_format, export_records, export_statement, import_records
+)
+from Doctor_Patient_communication_system.response_cache import CACHED_TABLES, ResponseCache
+from Doctor_Patient_communication_system.result_cache import create_cache
+from Doctor_Patient_communication_system.retrieval import Embedder, RetrievalService, PUBLIC_OWNER
+from Doctor_Patient_communication_system.search import KINDS as SEARCH_KINDS, search
+from Doctor_Patient_communication_system.shared_weights import freeze_model, env_flag
+from Doctor_Patient_communication_system.table_versions import TableVersions, bump_versions
+from Doctor_Patient_communication_system.translation_engine import TranslationEngine, TranslationModelPool, parse_pair
+from Doctor_Patient_communication_system.tts_store import AudioStore, KEY_PATTERN, create_backend
+from Doctor_Patient_communication_system.write_behind import WriteBehindBuffer
 
 # Conditionally import AI-related libraries with proper error handling
 try:
-    from transformers import pipeline
+    from Doctor_Patient_communication_system.inference_backend import load_pipeline
+    from Doctor_Patient_communication_system.streaming import STREAM_DECODING, stream_generate, sse_stream, sse_event
     TRANSFORMERS_AVAILABLE = True
 except ImportError:
     TRANSFORMERS_AVAILABLE = False
 
-try:
-    import gtts
-    GTTS_AVAILABLE = True
-except ImportError:
-    GTTS_AVAILABLE = False
+# Bound to each app by create_app(); engines connect on first use
+db = SQLAlchemy()
+login_manager = LoginManager()
+login_manager.login_view = 'main.login'
 
-app = Flask(__name__)
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-key-change-in-production')
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///medical_app.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# The app's pages, forms and JSON endpoints; create_app() registers them
+main = Blueprint('main', __name__, cli_group=None)
 
-# Ensure static directories exist
-os.makedirs(os.path.join('static', 'audio'), exist_ok=True)
+def load_config(app, overrides=None):
+    """Read the settings from the environment, then apply ``overrides``"""
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-key-change-in-production')
+    configure_database(app)
+    app.config['INFERENCE_MAX_BATCH_SIZE'] = int(os.environ.get('INFERENCE_MAX_BATCH_SIZE', 8))
+    app.config['INFERENCE_MAX_WAIT_MS'] = float(os.environ.get('INFERENCE_MAX_WAIT_MS', 10))
+    app.config['INFERENCE_BACKEND'] = os.environ.get('INFERENCE_BACKEND', 'torch')
+    app.config['MODEL_EXPORT_DIR'] = os.environ.get('MODEL_EXPORT_DIR', os.path.join('models', 'exported'))
+    app.config['MODEL_MMAP_WEIGHTS'] = env_flag('MODEL_MMAP_WEIGHTS')
+    app.config['MODEL_WARMUP'] = env_flag('MODEL_WARMUP')
+    app.config['PRELOAD_MODELS'] = env_flag('PRELOAD_MODELS')
+    app.config['RESULT_CACHE_BACKEND'] = os.environ.get('RESULT_CACHE_BACKEND', 'memory')
+    app.config['SUMMARY_JOB_WORKERS'] = int(os.environ.get('SUMMARY_JOB_WORKERS', 2))
+    app.config['SUMMARY_JOB_MAX_ATTEMPTS'] = int(os.environ.get('SUMMARY_JOB_MAX_ATTEMPTS', 3))
+    app.config['SUMMARY_JOB_STALE_SECONDS'] = int(os.environ.get('SUMMARY_JOB_STALE_SECONDS', 1800))
+    app.config['SUMMARY_JOB_SWEEP_SECONDS'] = int(os.environ.get('SUMMARY_JOB_SWEEP_SECONDS', 60))
+    app.config['SUMMARY_JOB_SWEEP_LIMIT'] = int(os.environ.get('SUMMARY_JOB_SWEEP_LIMIT', 256))
+    app.config['EMBEDDING_MODEL'] = os.environ.get('EMBEDDING_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')
+    app.config['RETRIEVAL_INDEX_PATH'] = os.environ.get('RETRIEVAL_INDEX_PATH', os.path.join('instance', 'retrieval_index'))
+    app.config['RETRIEVAL_TOP_K'] = int(os.environ.get('RETRIEVAL_TOP_K', 3))
+    app.config['RETRIEVAL_SYNC_SECONDS'] = float(os.environ.get('RETRIEVAL_SYNC_SECONDS', 5))
+    app.config['RETRIEVAL_SAVE_SECONDS'] = float(os.environ.get('RETRIEVAL_SAVE_SECONDS', 30))
+    app.config['RETRIEVAL_RECONCILE_SECONDS'] = float(os.environ.get('RETRIEVAL_RECONCILE_SECONDS', 600))
+    app.config['DISCUSSIONS_PER_PAGE'] = int(os.environ.get('DISCUSSIONS_PER_PAGE', 20))
+    app.config['COMMENTS_PER_PAGE'] = int(os.environ.get('COMMENTS_PER_PAGE', 50))
+    app.config['RECORDS_PER_PAGE'] = int(os.environ.get('RECORDS_PER_PAGE', 200))
+    app.config['SEARCH_RESULTS_PER_PAGE'] = int(os.environ.get('SEARCH_RESULTS_PER_PAGE', 20))
+    app.config['CHAT_HISTORY_FLUSH_ROWS'] = int(os.environ.get('CHAT_HISTORY_FLUSH_ROWS', 200))
+    app.config['CHAT_HISTORY_FLUSH_SECONDS'] = float(os.environ.get('CHAT_HISTORY_FLUSH_SECONDS', 1.0))
+    app.config['CHAT_HISTORY_MAX_PENDING'] = int(os.environ.get('CHAT_HISTORY_MAX_PENDING', 100000))
+    app.config['CHAT_ARCHIVE_DIR'] = os.environ.get('CHAT_ARCHIVE_DIR', os.path.join('instance', 'chat_archive'))
+    app.config['CHAT_ARCHIVE_AFTER_DAYS'] = int(os.environ.get('CHAT_ARCHIVE_AFTER_DAYS', 90))
+    app.config['TRANSLATION_MEMORY_MB'] = int(os.environ.get('TRANSLATION_MEMORY_MB', 1024))
+    app.config['TRANSLATION_MAX_BATCH_SIZE'] = int(os.environ.get('TRANSLATION_MAX_BATCH_SIZE', 16))
+    app.config['TRANSLATION_PRELOAD_PAIRS'] = os.environ.get('TRANSLATION_PRELOAD_PAIRS', 'en-fr')
+    app.config['PROFILING_ENABLED'] = env_flag('PROFILING_ENABLED')
+    app.config['PROFILING_INTERVAL'] = float(os.environ.get('PROFILING_INTERVAL', 0.005))
+    app.config['PROFILE_DIR'] = os.environ.get('PROFILE_DIR')
+    app.config['TTS_BACKEND'] = os.environ.get('TTS_BACKEND', 'gtts')
+    app.config['TTS_CACHE_MAX_MB'] = int(os.environ.get('TTS_CACHE_MAX_MB', 512))
+    app.config['TTS_SWEEP_SECONDS'] = int(os.environ.get('TTS_SWEEP_SECONDS', 300))
+    app.config['TTS_WORKERS'] = int(os.environ.get('TTS_WORKERS', 2))
+    app.config['USER_CACHE_TTL'] = float(os.environ.get('USER_CACHE_TTL', 60))
+    app.config['API_CACHE_TTL'] = float(os.environ.get('API_CACHE_TTL', 30))
+    app.config['CACHE_VERSION_POLL_SECONDS'] = float(os.environ.get('CACHE_VERSION_POLL_SECONDS', 1.0))
+    app.config['IMPORT_CHUNK_SIZE'] = int(os.environ.get('IMPORT_CHUNK_SIZE', 1000))
+    app.config['IMPORT_SUMMARY_BATCH_SIZE'] = int(os.environ.get('IMPORT_SUMMARY_BATCH_SIZE', 32))
+    app.config['EXPORT_BATCH_SIZE'] = int(os.environ.get('EXPORT_BATCH_SIZE', 1000))
+    app.config['PASSWORD_HASH_ITERATIONS'] = int(os.environ.get('PASSWORD_HASH_ITERATIONS', 600000))
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    
+    if overrides:
+        app.config.update(overrides)
+        # Engine options depend on the database, so follow an overridden URI
+        if 'SQLALCHEMY_DATABASE_URI' in overrides and 'SQLALCHEMY_ENGINE_OPTIONS' not in overrides:
+            app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
 
-# Initialize SQLAlchemy with app (proper Flask 2.x setup)
-db = SQLAlchemy(app)
-login_manager = LoginManager(app)
-login_manager.login_view = 'login'
+# Each app keeps its services in app.extensions; these module-level names
+# resolve to the current app's, so request code and the session listeners
+# below use them like plain objects. Optional services are None when their
+# models are unavailable; test for them with _available().
+def _service(name):
+    return LocalProxy(lambda: current_app.extensions[name])
 
-# Initialize AI models only if transformers is available
-summarizer = None
-translator = None
-qa_model = None
+def _available(name):
+    """Whether the current app has the optional ``name`` service"""
+    return current_app.extensions.get(name) is not None
 
-if TRANSFORMERS_AVAILABLE:
-    try:
-        summarizer = pipeline("summarization", model="facebook/bart-large-cnn")
-        translator = pipeline("translation_en_to_fr", model="t5-small")
-        qa_model = pipeline("question-answering", model="deepset/roberta-base-squad2")
-    except Exception as e:
-        print(f"Error loading AI models: {str(e)}")
+def _built(name):
+    """The current app's ``name`` service if this process has built it, else None"""
+    service = current_app.extensions.get(name)
+    if isinstance(service, LazyExtension):
+        return service.get() if service.loaded else None
+    return service
+
+_apps = weakref.WeakSet()
+
+# Connections opened before a fork (e.g. by a preloading gunicorn master)
+# must not be shared with the workers; each worker opens its own
+@after_fork
+def _reset_database_pools():
+    for app in list(_apps):
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+
+# AI models are registered per app and loaded on first use, so non-AI
+# routes are served immediately after process start
+model_registry = _service('model_registry')
+
+SUMMARY_MODEL = "facebook/bart-large-cnn"
+QA_MODEL = "deepset/roberta-base-squad2"
+SUMMARY_PARAMS = {'max_length': 100, 'min_length': 30, 'do_sample': False}
+
+# Pipelines load through the same torch/int8/onnx backend factory as LLMService
+def load_model_pipeline(app, task, model_name, label=None):
+    pipe = load_pipeline(task, model_name, backend=app.config['INFERENCE_BACKEND'],
+                         export_dir=app.config['MODEL_EXPORT_DIR'], mmap_weights=app.config['MODEL_MMAP_WEIGHTS'])
+    return instrument_pipeline(pipe, label or task)
+
+def register_models(app, registry):
+    if TRANSFORMERS_AVAILABLE:
+        registry.register('summarization', lambda: load_model_pipeline(app, 'summarization', SUMMARY_MODEL))
+        registry.register('qa', lambda: load_model_pipeline(app, 'qa', QA_MODEL))
+
+# Batch concurrent requests into single pipeline calls
+def make_scheduler(app, name, batch_fn):
+    registry = app.extensions['model_registry']
+    if not registry.available(name):
+        return None
+
+    def run(inputs, **params):
+        return batch_fn(registry.get(name))(inputs, **params)
+
+    return BatchScheduler(
+        run,
+        max_batch_size=app.config['INFERENCE_MAX_BATCH_SIZE'],
+        max_wait_ms=app.config['INFERENCE_MAX_WAIT_MS'],
+        name=name
+    )
+
+summarize_scheduler = _service('summarize_scheduler')
+qa_scheduler = _service('qa_scheduler')
+
+# One small model per language pair, loaded on demand and unloaded
+# least-recently-used to stay within TRANSLATION_MEMORY_MB
+translation_engine = _service('translation_engine')
+
+# Repeat summaries/translations of the same text are served from this cache
+result_cache = _service('result_cache')
+
+def summarize_cached(text):
+    return result_cache.get_or_compute(
+        SUMMARY_MODEL, 'summarization', SUMMARY_PARAMS, text,
+        lambda: summarize_scheduler(text, **SUMMARY_PARAMS)
+    )
+
+def init_models(app):
+    """Register the app's models, schedulers, translation engine and result cache"""
+    services = app.extensions
+    services['model_registry'] = registry = ModelRegistry()
+    register_models(app, registry)
+    
+    # Summaries are run in similar-length buckets to limit padding; QA reuses
+    # cached context encodings and splits long contexts into doc-stride windows
+    services['summarize_scheduler'] = make_scheduler(app, 'summarization', lambda pipe: bucketed(
+        summarization_batch_fn(pipe), lambda texts: [len(text.split()) for text in texts],
+        app.config['INFERENCE_MAX_BATCH_SIZE']
+    ))
+    services['qa_scheduler'] = make_scheduler(app, 'qa', cached_qa_batch_fn)
+    
+    services['translation_engine'] = None
+    if TRANSFORMERS_AVAILABLE:
+        services['translation_engine'] = TranslationEngine(
+            TranslationModelPool(
+                lambda model_name: load_model_pipeline(app, 'translation', model_name, label=model_name),
+                memory_budget=app.config['TRANSLATION_MEMORY_MB'] * 1024 * 1024
+            ),
+            max_batch_size=app.config['TRANSLATION_MAX_BATCH_SIZE'],
+            max_wait_ms=app.config['INFERENCE_MAX_WAIT_MS']
+        )
+    services['result_cache'] = create_cache(app.config['RESULT_CACHE_BACKEND'])
+    
+    # Under gunicorn --preload, load models in the master so forked workers share
+    # the weights copy-on-write; otherwise optionally warm up in the background
+    if app.config['PRELOAD_MODELS']:
+        registry.warm_up(background=False)
+        for name in registry.names():
+            if registry.is_loaded(name):
+                freeze_model(registry.get(name).model)
+        if services['translation_engine'] is not None:
+            for pair in app.config['TRANSLATION_PRELOAD_PAIRS'].split(','):
+                if pair.strip():
+                    freeze_model(services['translation_engine'].pool.get(*parse_pair(pair)).model)
+    elif app.config['MODEL_WARMUP']:
+        registry.warm_up(background=True)
 
 # Database Models
 class User(UserMixin, db.Model):
@@ -56,6 +245,7 @@ class User(UserMixin, db.Model):
     discussions = db.relationship('Discussion', backref='author', lazy=True)
 
 class MedicalRecord(db.Model):
+    __table_args__ = (db.Index('ix_medical_record_user_id_record_date', 'user_id', 'record_date'),)
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     record_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
@@ -68,8 +258,10 @@ class Discussion(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     content = db.Column(db.Text, nullable=False)
-    date_posted = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    date_posted = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    # Denormalized; kept in step by the Comment insert/delete hooks below
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     comments = db.relationship('Comment', backref='discussion', lazy=True, cascade='all, delete-orphan')
 
 class Comment(db.Model):
@@ -77,26 +269,370 @@ class Comment(db.Model):
     content = db.Column(db.Text, nullable=False)
     date_posted = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    discussion_id = db.Column(db.Integer, db.ForeignKey('discussion.id'), nullable=False)
+    discussion_id = db.Column(db.Integer, db.ForeignKey('discussion.id'), nullable=False, index=True)
     author = db.relationship('User', backref='comments')
 
+def _adjust_comment_count(connection, discussion_id, delta):
+    discussion = Discussion.__table__
+    connection.execute(
+        discussion.update()
+        .where(discussion.c.id == discussion_id)
+        .values(comment_count=discussion.c.comment_count + delta)
+    )
+
+@event.listens_for(Comment, 'after_insert')
+def _comment_inserted(mapper, connection, comment):
+    _adjust_comment_count(connection, comment.discussion_id, 1)
+
+@event.listens_for(Comment, 'after_delete')
+def _comment_deleted(mapper, connection, comment):
+    _adjust_comment_count(connection, comment.discussion_id, -1)
+
 class ChatHistory(db.Model):
+    __table_args__ = (db.Index('ix_chat_history_user_id_timestamp', 'user_id', 'timestamp'),)
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     message = db.Column(db.Text, nullable=False)
     response = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
+# Chat history is written behind the request: rows are queued in memory and
+# bulk-inserted on a size/time threshold, and flushed on shutdown. Only
+# operational errors (a locked or unreachable database) are retried; rows
+# failing otherwise are isolated and dropped by the buffer
+def _insert_chat_history(rows):
+    try:
+        db.session.execute(db.insert(ChatHistory), rows)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+# Services that own threads are lazy extensions (see init_services): built on
+# first use in each process, so a forked worker never inherits the master's
+# dead threads
+chat_history_buffer = _service('chat_history_buffer')
+
+class SummaryJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    record_id = db.Column(db.Integer, db.ForeignKey('medical_record.id'), nullable=False, unique=True)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    record = db.relationship('MedicalRecord', backref=db.backref('summary_job', uselist=False))
+
+# Background summarization jobs. Every worker process may queue any job, so
+# a job only runs after an atomic claim moves it from pending to running; a
+# job left running longer than SUMMARY_JOB_STALE_SECONDS belonged to a
+# process that died and may be claimed again.
+def _claimable():
+    stale = datetime.utcnow() - timedelta(seconds=current_app.config['SUMMARY_JOB_STALE_SECONDS'])
+    return db.and_(
+        db.or_(SummaryJob.status == 'pending',
+               db.and_(SummaryJob.status == 'running', SummaryJob.updated_at < stale)),
+        SummaryJob.attempts < current_app.config['SUMMARY_JOB_MAX_ATTEMPTS']
+    )
+
+def claim_summary_jobs(job_ids):
+    """Mark the claimable jobs among ``job_ids`` running; returns the ids this process won"""
+    claimed = db.session.scalars(
+        db.update(SummaryJob)
+        .where(SummaryJob.id.in_(job_ids), _claimable())
+        .values(status='running', attempts=SummaryJob.attempts + 1, updated_at=datetime.utcnow())
+        .returning(SummaryJob.id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.session.commit()
+    return claimed
+
+def run_summary_job(job_id, attempt):
+    # Done, failed, or being run by another process
+    if not claim_summary_jobs([job_id]):
+        return
+    job = db.session.get(SummaryJob, job_id)
+    
+    try:
+        summary = summarize_cached(job.record.notes)
+    except Exception as e:
+        job.status = 'pending'
+        job.last_error = str(e)
+        db.session.commit()
+        raise
+    
+    job.record.summary = summary
+    job.status = 'done'
+    job.last_error = None
+    db.session.commit()
+
+def fail_summary_job(job_id, error):
+    job = db.session.get(SummaryJob, job_id)
+    if job is not None:
+        job.status = 'failed'
+        job.last_error = str(error)
+        db.session.commit()
+
+summary_jobs = _service('summary_jobs')
+
+# Imported records are summarized in groups: one job per group, whose notes
+# are queued on the summarization scheduler together and batched there
+def run_summary_batch(job_ids, attempt):
+    claimed = claim_summary_jobs(job_ids)
+    if not claimed:
+        return
+    jobs = SummaryJob.query.options(joinedload(SummaryJob.record)).filter(SummaryJob.id.in_(claimed)).all()
+    
+    pending = {}
+    for job in jobs:
+        cached = result_cache.get(SUMMARY_MODEL, 'summarization', SUMMARY_PARAMS, job.record.notes)
+        pending[job.id] = cached if cached is not None else summarize_scheduler.submit(job.record.notes, **SUMMARY_PARAMS)
+    
+    error = None
+    for job in jobs:
+        try:
+            summary = pending[job.id]
+            if not isinstance(summary, str):
+                summary = summary.result()
+                result_cache.set(SUMMARY_MODEL, 'summarization', SUMMARY_PARAMS, job.record.notes, summary)
+        except Exception as e:
+            job.status = 'pending'
+            job.last_error = str(e)
+            error = e
+            continue
+        job.record.summary = summary
+        job.status = 'done'
+        job.last_error = None
+    db.session.commit()
+    
+    # Retried as a group; jobs already done are skipped
+    if error is not None:
+        raise error
+
+def fail_summary_batch(job_ids, error):
+    SummaryJob.query.filter(SummaryJob.id.in_(job_ids), SummaryJob.status != 'done').update(
+        {'status': 'failed', 'last_error': str(error)}, synchronize_session=False
+    )
+    db.session.commit()
+
+summary_batches = _service('summary_batches')
+
+def submit_summary_batches(job_ids):
+    size = current_app.config['IMPORT_SUMMARY_BATCH_SIZE']
+    for start in range(0, len(job_ids), size):
+        summary_batches.submit(tuple(job_ids[start:start + size]))
+
+def requeue_pending_summary_jobs(limit=None):
+    """Queue pending jobs, and running ones whose process went away, in batches"""
+    stale = datetime.utcnow() - timedelta(seconds=current_app.config['SUMMARY_JOB_STALE_SECONDS'])
+    # Jobs a dead process was on when it ran out of attempts are not retried
+    SummaryJob.query.filter(
+        SummaryJob.status.in_(['pending', 'running']), SummaryJob.updated_at < stale,
+        SummaryJob.attempts >= current_app.config['SUMMARY_JOB_MAX_ATTEMPTS']
+    ).update({'status': 'failed', 'last_error': db.func.coalesce(SummaryJob.last_error, 'Abandoned')},
+             synchronize_session=False)
+    db.session.commit()
+    
+    query = db.session.query(SummaryJob.id).filter(_claimable()).order_by(SummaryJob.id)
+    if limit:
+        query = query.limit(limit)
+    job_ids = [job_id for job_id, in query]
+    submit_summary_batches(job_ids)
+    return len(job_ids)
+
+def sweep_summary_jobs():
+    """Pick up pending and abandoned jobs while this process's summary queues are idle"""
+    if summary_jobs.queue_depth() or summary_batches.queue_depth():
+        return 0
+    return requeue_pending_summary_jobs(limit=current_app.config['SUMMARY_JOB_SWEEP_LIMIT'])
+
+# Each worker process sweeps once it serves its first request, so jobs from
+# imports, restarts and crashed workers run under gunicorn too
+@main.before_app_request
+def _start_summary_sweeper():
+    if current_app.config['SUMMARY_JOB_SWEEP_SECONDS'] > 0 and _available('summarize_scheduler') \
+            and model_registry.available('summarization'):
+        current_app.extensions['summary_sweeper'].get()
+
+# Retrieval index over records and forum posts. Commits queue the documents
+# they touched in retrieval_change, in the same transaction; the one process
+# holding the index's writer lock drains that queue into the index and saves
+# it, and every other process reloads the saved copy
+retrieval = _service('retrieval')
+retrieval_sync = _service('retrieval_sync')
+
+class RetrievalChange(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)
+    doc_id = db.Column(db.Integer, nullable=False)
+
+RETRIEVAL_MODELS = {'record': MedicalRecord, 'discussion': Discussion, 'comment': Comment}
+
+def retrieval_document(obj):
+    """(kind, id, owner, text) for an indexed model instance, or None"""
+    if isinstance(obj, MedicalRecord):
+        fields = [('Diagnosis', obj.diagnosis), ('Prescription', obj.prescription),
+                  ('Notes', obj.notes), ('Summary', obj.summary)]
+        text = "\n".join(f"{label}: {value}" for label, value in fields if value)
+        return ('record', obj.id, obj.user_id, text)
+    if isinstance(obj, Discussion):
+        return ('discussion', obj.id, PUBLIC_OWNER, f"{obj.title}. {obj.content}")
+    if isinstance(obj, Comment):
+        return ('comment', obj.id, PUBLIC_OWNER, obj.content)
+    return None
+
+def queue_retrieval_changes(connection, changes):
+    """Record (kind, id) pairs whose index entries must be rebuilt or dropped"""
+    if changes:
+        connection.execute(db.insert(RetrievalChange.__table__),
+                           [{'kind': kind, 'doc_id': doc_id} for kind, doc_id in changes])
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_retrieval_changes(session, flush_context):
+    if not _available('retrieval'):
+        return
+    changes = {retrieval_document(obj)[:2] for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+               if isinstance(obj, tuple(RETRIEVAL_MODELS.values()))}
+    if changes:
+        queue_retrieval_changes(session.connection(), changes)
+        session.info['retrieval_changed'] = True
+
+@event.listens_for(db.session, 'after_commit')
+def _wake_retrieval_sync(session):
+    if session.info.pop('retrieval_changed', None) and _built('retrieval_sync') is not None:
+        retrieval_sync.wake()
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_retrieval_changes(session):
+    session.info.pop('retrieval_changed', None)
+
+def _index_rows(kind, ids, batch_size=256):
+    """Reindex the given rows of one kind, dropping the ones that no longer exist"""
+    model = RETRIEVAL_MODELS[kind]
+    ids = sorted(ids)
+    for start in range(0, len(ids), batch_size):
+        chunk = ids[start:start + batch_size]
+        documents = [retrieval_document(obj) for obj in model.query.filter(model.id.in_(chunk))]
+        for doc_id in set(chunk) - {document[1] for document in documents}:
+            retrieval.remove_document(kind, doc_id)
+        if documents:
+            retrieval.index_documents(documents)
+
+def _drain_retrieval_changes(batch_size=256):
+    while True:
+        changes = RetrievalChange.query.order_by(RetrievalChange.id).limit(batch_size).all()
+        if not changes:
+            return
+        by_kind = {}
+        for change in changes:
+            by_kind.setdefault(change.kind, set()).add(change.doc_id)
+        for kind, ids in by_kind.items():
+            _index_rows(kind, ids)
+        RetrievalChange.query.filter(RetrievalChange.id.in_([change.id for change in changes])).delete(
+            synchronize_session=False)
+        db.session.commit()
+
+def _reconcile_retrieval_index(check_content, batch_size=256):
+    """Bring the index in line with the database by set difference of ids
+
+    With ``check_content`` every row is also compared with its indexed
+    passages, which catches edits whose queued change a previous writer
+    applied but never saved.
+    """
+    indexed = retrieval.document_ids()
+    for kind, model in RETRIEVAL_MODELS.items():
+        have = indexed.get(kind, set())
+        if check_content:
+            ids, stale = set(), set()
+            for obj in model.query.order_by(model.id).yield_per(batch_size):
+                ids.add(obj.id)
+                if obj.id in have and not retrieval.is_current(*retrieval_document(obj)):
+                    stale.add(obj.id)
+        else:
+            ids, stale = set(db.session.scalars(db.select(model.id))), set()
+        for doc_id in have - ids:
+            retrieval.remove_document(kind, doc_id)
+        _index_rows(kind, (ids - have) | stale, batch_size)
+
+def sync_retrieval_index():
+    """One pass of the background sync: the writer applies queued changes, readers reload"""
+    now = time.monotonic()
+    if not retrieval.acquire_writer():
+        retrieval.refresh()
+        return
+    if not retrieval.ready:
+        # Newly the writer: catch up from whatever the last writer saved
+        _drain_retrieval_changes()
+        _reconcile_retrieval_index(check_content=True)
+        retrieval.save(force=True)
+        retrieval.ready = True
+        retrieval.reconciled_at = now
+    elif now - retrieval.reconciled_at >= current_app.config['RETRIEVAL_RECONCILE_SECONDS']:
+        _reconcile_retrieval_index(check_content=False)
+        retrieval.reconciled_at = now
+    _drain_retrieval_changes()
+    retrieval.save()
+
+def ensure_retrieval_sync():
+    """Start this process's background index sync if it is not running"""
+    return current_app.extensions['retrieval_sync'].get()
+
+# Commits queue changes whether or not this process drains them, so every
+# worker starts the sync on its first request; otherwise the queue only
+# grows until someone asks the chatbot a question
+@main.before_app_request
+def _start_retrieval_sync():
+    if _available('retrieval'):
+        ensure_retrieval_sync()
+
+# Cached users (load_user merges a cached snapshot instead of querying) and
+# API responses are validated against per-table versions kept in the
+# database: a flush writing a cached table bumps its version in the same
+# transaction, so the commit retires cached copies in every worker process
+user_cache = _service('user_cache')
+password_hasher = _service('password_hasher')
+response_cache = _service('response_cache')
+table_versions = _service('table_versions')
+
+class CacheVersion(db.Model):
+    name = db.Column(db.String(100), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+def _read_table_versions():
+    return dict(db.session.execute(db.select(CacheVersion.name, CacheVersion.version)).all())
+
+def bump_table_versions(session, tables):
+    """Bump the shared versions of cached ``tables`` within the session's transaction"""
+    tables = set(tables) & (CACHED_TABLES | {User.__table__.name})
+    if tables:
+        bump_versions(session.connection(), CacheVersion.__table__, tables)
+        session.info['tables_written'] = True
+
+@event.listens_for(db.session, 'after_flush')
+def _bump_written_tables(session, flush_context):
+    bump_table_versions(session, {obj.__table__.name for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+                                  if hasattr(obj, '__table__')})
+
+@event.listens_for(db.session, 'after_commit')
+def _expire_table_versions(session):
+    # This process sees its own writes at once; others within a poll interval
+    if session.info.pop('tables_written', None):
+        table_versions.expire()
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_written_tables(session):
+    session.info.pop('tables_written', None)
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return user_cache.get(int(user_id))
 
 # Routes
-@app.route('/')
+@main.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/register', methods=['GET', 'POST'])
+@main.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         username = request.form.get('username')
@@ -108,42 +644,59 @@ def register():
         if user:
             return "Email already registered."
         
+        try:
+            hashed = password_hasher.hash(password)
+        except HasherBusy:
+            return "Too many sign-ins at once, please try again in a moment.", 503, {'Retry-After': '1'}
+        
         new_user = User(
             username=username,
             email=email,
-            password=generate_password_hash(password, method='sha256'),
+            password=hashed,
             is_doctor=is_doctor
         )
         
         db.session.add(new_user)
         db.session.commit()
         
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     
     return render_template('register.html')
 
-@app.route('/login', methods=['GET', 'POST'])
+@main.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         email = request.form.get('email')
         password = request.form.get('password')
         
         user = User.query.filter_by(email=email).first()
-        if not user or not check_password_hash(user.password, password):
+        try:
+            valid = user is not None and bool(password) and password_hasher.verify(user.password, password)
+        except HasherBusy:
+            return "Too many sign-ins at once, please try again in a moment.", 503, {'Retry-After': '1'}
+        if not valid:
             return "Please check your login details and try again."
         
+        # Upgrade hashes made with an older method or work factor while we have the password
+        if password_hasher.needs_rehash(user.password):
+            try:
+                user.password = password_hasher.hash(password)
+                db.session.commit()
+            except HasherBusy:
+                pass
+        
         login_user(user)
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     
     return render_template('login.html')
 
-@app.route('/logout')
+@main.route('/logout')
 @login_required
 def logout():
     logout_user()
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
 
-@app.route('/dashboard')
+@main.route('/dashboard')
 @login_required
 def dashboard():
     if current_user.is_doctor:
@@ -151,10 +704,10 @@ def dashboard():
     return render_template('patient_dashboard.html')
 
 # Medical Report Summarizer
-@app.route('/summarize', methods=['POST'])
+@main.route('/summarize', methods=['POST'])
 @login_required
 def summarize_report():
-    if not TRANSFORMERS_AVAILABLE or summarizer is None:
+    if not _available('summarize_scheduler') or not model_registry.available('summarization'):
         return jsonify({'error': 'Summarization functionality is not available'}), 503
     
     report_text = request.form.get('report_text')
@@ -162,7 +715,7 @@ def summarize_report():
         return jsonify({'error': 'No text provided'}), 400
     
     try:
-        summary = summarizer(report_text, max_length=100, min_length=30, do_sample=False)[0]['summary_text']
+        summary = summarize_cached(report_text)
         
         if 'record_id' in request.form:
             record_id = request.form.get('record_id')
@@ -175,11 +728,58 @@ def summarize_report():
     except Exception as e:
         return jsonify({'error': f'Summarization error: {str(e)}'}), 500
 
+# Streaming variants: server-sent events with one event per generated piece.
+# Closing the connection stops generation at the next decoding step.
+def _stream_response(get_pipe, text, cache_key, **generate_kwargs):
+    # Streams decode greedily with their own limits, so their output is cached
+    # under those generate kwargs, apart from the batch routes' beam search
+    model, task, params = cache_key
+    cache_key = (model, task, {**params, **generate_kwargs, **STREAM_DECODING})
+    cached = result_cache.get(*cache_key, text)
+    if cached is not None:
+        events = iter([sse_event({'token': cached}), sse_event({'text': cached}, event='done')])
+    else:
+        pipe = get_pipe()
+        # Completed streams are cached like the non-streaming routes' results
+        events = sse_stream(stream_generate(pipe.model, pipe.tokenizer, text, **generate_kwargs),
+                            on_complete=lambda output: result_cache.set(*cache_key, text, output))
+    return Response(stream_with_context(events), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@main.route('/summarize/stream', methods=['POST'])
+@login_required
+def summarize_report_stream():
+    if not TRANSFORMERS_AVAILABLE or not model_registry.available('summarization'):
+        return jsonify({'error': 'Summarization functionality is not available'}), 503
+    
+    report_text = request.form.get('report_text')
+    if not report_text:
+        return jsonify({'error': 'No text provided'}), 400
+    
+    try:
+        return _stream_response(
+            lambda: model_registry.get('summarization'), report_text, (SUMMARY_MODEL, 'summarization', SUMMARY_PARAMS),
+            max_length=SUMMARY_PARAMS['max_length'], min_length=SUMMARY_PARAMS['min_length'], no_repeat_ngram_size=3
+        )
+    except Exception as e:
+        return jsonify({'error': f'Summarization error: {str(e)}'}), 500
+
 # AI Chatbot
-@app.route('/chat', methods=['POST'])
+def _keyword_contexts(query, k):
+    """Texts of the top-k full-text search hits this user may read"""
+    results, _ = search(db.session.connection(), query, current_user.id, current_user.is_doctor,
+                        kinds=SEARCH_KINDS, page=1, per_page=k)
+    contexts = []
+    for result in results:
+        obj = db.session.get(RETRIEVAL_MODELS[result['kind']], result['id'])
+        if obj is not None:
+            contexts.append(retrieval_document(obj)[3])
+    return contexts
+
+@main.route('/chat', methods=['POST'])
 @login_required
 def chat():
-    if not TRANSFORMERS_AVAILABLE or qa_model is None:
+    if not _available('qa_scheduler') or not model_registry.available('qa'):
         return jsonify({'error': 'Chat functionality is not available'}), 503
     
     query = request.form.get('query')
@@ -188,30 +788,58 @@ def chat():
     
     context = "I am a medical AI assistant. I can help with general medical questions, but always consult a doctor for specific medical advice."
     
+    # Use the top-k passages this user may read as QA context; until this
+    # process has a complete index, take the top full-text matches instead
+    contexts = []
+    if _available('retrieval'):
+        try:
+            ensure_retrieval_sync()
+            k = current_app.config['RETRIEVAL_TOP_K']
+            if retrieval.ready:
+                owner = None if current_user.is_doctor else current_user.id
+                contexts = [passage for _, _, passage in retrieval.search(query, k=k, owner=owner)]
+            else:
+                contexts = _keyword_contexts(query, k)
+        except Exception as e:
+            print(f"Retrieval error: {str(e)}")
+    contexts = contexts or [context]
+    
     try:
-        answer = qa_model(question=query, context=context)['answer']
+        # All candidate passages go to the scheduler together and are scored in one batch
+        futures = [qa_scheduler.submit((query, passage)) for passage in contexts]
+        answer = max((future.result() for future in futures), key=lambda result: result['score'])['answer']
         
-        # Save chat history
-        chat_entry = ChatHistory(
-            user_id=current_user.id,
-            message=query,
-            response=answer
-        )
-        db.session.add(chat_entry)
-        db.session.commit()
+        # Save chat history (written behind the response)
+        chat_history_buffer.append({
+            'user_id': current_user.id,
+            'message': query,
+            'response': answer,
+            'timestamp': datetime.utcnow()
+        })
         
         return jsonify({'response': answer})
     except Exception as e:
         return jsonify({'error': f'Chat error: {str(e)}'}), 500
 
 # Discussion Forum
-@app.route('/discussions')
+@main.route('/discussions')
 @login_required
 def discussions():
-    all_discussions = Discussion.query.order_by(Discussion.date_posted.desc()).all()
-    return render_template('discussions.html', discussions=all_discussions)
+    # Newest first, paginated on (date_posted, id) with the author joined in
+    try:
+        after = decode_cursor(request.args['cursor'], (parse_datetime, int)) if request.args.get('cursor') else None
+    except ValueError:
+        return "Invalid cursor", 400
+    
+    query = Discussion.query.options(joinedload(Discussion.author))
+    page, has_more = keyset_page(
+        query, [Discussion.date_posted, Discussion.id], after=after,
+        limit=current_app.config['DISCUSSIONS_PER_PAGE']
+    )
+    next_cursor = encode_cursor(page[-1].date_posted, page[-1].id) if has_more else None
+    return render_template('discussions.html', discussions=page, next_cursor=next_cursor, is_first_page=after is None)
 
-@app.route('/discussion/new', methods=['GET', 'POST'])
+@main.route('/discussion/new', methods=['GET', 'POST'])
 @login_required
 def new_discussion():
     if request.method == 'POST':
@@ -225,17 +853,31 @@ def new_discussion():
         db.session.add(discussion)
         db.session.commit()
         
-        return redirect(url_for('discussions'))
+        return redirect(url_for('main.discussions'))
     
     return render_template('create_discussion.html')
 
-@app.route('/discussion/<int:discussion_id>')
+@main.route('/discussion/<int:discussion_id>')
 @login_required
 def view_discussion(discussion_id):
-    discussion = Discussion.query.get_or_404(discussion_id)
-    return render_template('view_discussion.html', discussion=discussion)
+    discussion = Discussion.query.options(joinedload(Discussion.author)).get_or_404(discussion_id)
+    
+    # Oldest first, paginated on comment id with authors joined in
+    try:
+        after = decode_cursor(request.args['cursor'], (int,)) if request.args.get('cursor') else None
+    except ValueError:
+        return "Invalid cursor", 400
+    
+    query = Comment.query.options(joinedload(Comment.author)).filter(Comment.discussion_id == discussion_id)
+    comments, has_more = keyset_page(
+        query, [Comment.id], after=after,
+        limit=current_app.config['COMMENTS_PER_PAGE'], descending=False
+    )
+    next_cursor = encode_cursor(comments[-1].id) if has_more else None
+    return render_template('view_discussion.html', discussion=discussion, comments=comments,
+                           next_cursor=next_cursor, is_first_page=after is None)
 
-@app.route('/discussion/<int:discussion_id>/comment', methods=['POST'])
+@main.route('/discussion/<int:discussion_id>/comment', methods=['POST'])
 @login_required
 def add_comment(discussion_id):
     content = request.form.get('content')
@@ -250,20 +892,54 @@ def add_comment(discussion_id):
     db.session.add(comment)
     db.session.commit()
     
-    return redirect(url_for('view_discussion', discussion_id=discussion_id))
+    return redirect(url_for('main.view_discussion', discussion_id=discussion_id))
+
+# Search over records, discussions and comments
+@main.route('/search')
+@login_required
+def search_page():
+    query = request.args.get('q', '').strip()
+    kind = request.args.get('type', 'all')
+    if kind != 'all' and kind not in SEARCH_KINDS:
+        return "Invalid search type", 400
+    page = request.args.get('page', 1, type=int)
+    if page < 1:
+        return "Invalid page", 400
+    
+    results, has_more = [], False
+    if query:
+        results, has_more = search(
+            db.session.connection(), query, current_user.id, current_user.is_doctor,
+            kinds=SEARCH_KINDS if kind == 'all' else (kind,),
+            page=page, per_page=current_app.config['SEARCH_RESULTS_PER_PAGE']
+        )
+    return render_template('search.html', query=query, kind=kind, results=results, page=page, has_more=has_more)
 
 # Medical History Tracker
-@app.route('/medical_history')
+@main.route('/medical_history')
 @login_required
 def medical_history():
-    if current_user.is_doctor:
-        records = MedicalRecord.query.join(User).all()
-    else:
-        records = MedicalRecord.query.filter_by(user_id=current_user.id).all()
+    # Newest first, paginated on (record_date, id); the table is rendered
+    # while rows stream off the cursor, without the notes/summary text
+    try:
+        after = decode_cursor(request.args['cursor'], (parse_datetime, int)) if request.args.get('cursor') else None
+    except ValueError:
+        return "Invalid cursor", 400
     
-    return render_template('medical_history.html', records=records)
+    statement = db.select(
+        MedicalRecord.id, MedicalRecord.user_id, MedicalRecord.record_date, MedicalRecord.diagnosis,
+        MedicalRecord.summary.isnot(None).label('has_summary'), User.username.label('patient_name')
+    ).join(User, MedicalRecord.user_id == User.id)
+    if not current_user.is_doctor:
+        statement = statement.where(MedicalRecord.user_id == current_user.id)
+    
+    records = StreamedPage(
+        db.session, statement, [MedicalRecord.record_date, MedicalRecord.id],
+        key=lambda row: (row.record_date, row.id), after=after, limit=current_app.config['RECORDS_PER_PAGE']
+    )
+    return stream_template('medical_history.html', records=records, is_first_page=after is None)
 
-@app.route('/add_record', methods=['GET', 'POST'])
+@main.route('/add_record', methods=['GET', 'POST'])
 @login_required
 def add_record():
     if not current_user.is_doctor:
@@ -281,56 +957,207 @@ def add_record():
         # Validate user exists
         patient = User.query.get_or_404(user_id)
         
-        # Auto-summarize the notes if summarizer is available
-        summary = None
-        if notes and TRANSFORMERS_AVAILABLE and summarizer is not None:
-            try:
-                summary = summarizer(notes, max_length=100, min_length=30, do_sample=False)[0]['summary_text']
-            except Exception as e:
-                print(f"Summarization error: {str(e)}")
-        
         record = MedicalRecord(
             user_id=user_id,
             diagnosis=diagnosis,
             prescription=prescription,
-            notes=notes,
-            summary=summary
+            notes=notes
         )
-        
         db.session.add(record)
+        
+        # Summarize the notes in the background if summarizer is available;
+        # the record is saved now with its summary pending
+        job = None
+        if notes and _available('summarize_scheduler') and model_registry.available('summarization'):
+            job = SummaryJob(record=record)
+            db.session.add(job)
+        
         db.session.commit()
         
-        return redirect(url_for('medical_history'))
+        if job is not None:
+            summary_jobs.submit(job.id)
+        
+        return redirect(url_for('main.medical_history'))
     
     patients = User.query.filter_by(is_doctor=False).all()
     return render_template('add_record.html', patients=patients)
 
-# Language Translation
-@app.route('/translate', methods=['POST'])
+# Bulk import/export of medical records (CSV or NDJSON, streamed both ways)
+def import_medical_records(stream, fmt, summarize=True):
+    """Import records from a text stream; notes get summary jobs, run now if ``summarize``"""
+    queue_summaries = _available('summarize_scheduler') and model_registry.available('summarization')
+    
+    def on_chunk(session, inserted):
+        # Bulk inserts bypass the ORM flush events, so retire cached responses
+        # and queue the index updates here
+        bump_table_versions(session, {MedicalRecord.__table__.name})
+        if _available('retrieval'):
+            queue_retrieval_changes(session.connection(), [('record', record_id) for record_id, _ in inserted])
+        record_ids = [record_id for record_id, row in inserted if row['notes']]
+        if not queue_summaries or not record_ids:
+            return None
+        job_ids = session.scalars(
+            db.insert(SummaryJob).returning(SummaryJob.id, sort_by_parameter_order=True),
+            [{'record_id': record_id} for record_id in record_ids]
+        ).all()
+        
+        def committed():
+            result['summaries_queued'] += len(job_ids)
+            if summarize:
+                submit_summary_batches(job_ids)
+        return committed
+    
+    result = {'summaries_queued': 0}
+    try:
+        result.update(import_records(db.session, MedicalRecord, User, stream, fmt,
+                                     chunk_size=current_app.config['IMPORT_CHUNK_SIZE'], on_chunk=on_chunk))
+    except ImportFailed as e:
+        e.result['summaries_queued'] = result['summaries_queued']
+        raise
+    finally:
+        # Bulk inserts bypass the ORM flush events, so wake the index sync here
+        if _built('retrieval_sync') is not None:
+            retrieval_sync.wake()
+    return result
+
+@main.route('/records/import', methods=['POST'])
 @login_required
-def translate_text():
-    if not TRANSFORMERS_AVAILABLE or translator is None:
-        return jsonify({'error': 'Translation functionality is not available'}), 503
+def import_records_upload():
+    if not current_user.is_doctor:
+        return jsonify({'error': 'Only doctors can import medical records'}), 403
+    
+    # Either a multipart upload or the raw request body, read as it arrives
+    upload = request.files.get('file')
+    if upload is not None:
+        stream = upload.stream
+        fmt = request.args.get('format') or detect_format(upload.filename, upload.mimetype)
+    else:
+        stream = request.stream
+        fmt = request.args.get('format') or detect_format(content_type=request.content_type)
+    if fmt not in RECORD_FORMATS:
+        return jsonify({'error': 'Format must be csv or ndjson'}), 400
+    
+    try:
+        result = import_medical_records(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''), fmt)
+    except UnicodeDecodeError:
+        # Raised while validating, before anything was committed
+        return jsonify({'error': 'File must be UTF-8 encoded', 'inserted': 0}), 400
+    except ImportFailed as e:
+        return jsonify(dict(e.result, error=str(e))), 500
+    return jsonify(result)
+
+@main.route('/records/export')
+@login_required
+def export_records_download():
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in RECORD_FORMATS:
+        return jsonify({'error': 'Format must be csv or ndjson'}), 400
+    
+    # Doctors may export everything or one patient; patients only their own records
+    user_id = request.args.get('user_id', type=int)
+    if not current_user.is_doctor:
+        if user_id not in (None, current_user.id):
+            return jsonify({'error': 'Unauthorized access'}), 403
+        user_id = current_user.id
+    
+    chunks = export_records(db.session, export_statement(MedicalRecord, User, user_id), fmt,
+                            batch_size=current_app.config['EXPORT_BATCH_SIZE'])
+    return Response(stream_with_context(chunks),
+                    mimetype='text/csv' if fmt == 'csv' else 'application/x-ndjson',
+                    headers={'Content-Disposition': f'attachment; filename=medical_records.{fmt}'})
+
+@main.route('/medical_record/<int:record_id>/summary_status')
+@login_required
+def summary_status(record_id):
+    record = MedicalRecord.query.get_or_404(record_id)
+    
+    if not current_user.is_doctor and record.user_id != current_user.id:
+        return jsonify({'error': 'Unauthorized access'}), 403
+    
+    job = record.summary_job
+    return jsonify({
+        'record_id': record.id,
+        'status': job.status if job else ('done' if record.summary else 'none'),
+        'attempts': job.attempts if job else 0,
+        'error': job.last_error if job else None,
+        'summary': record.summary
+    })
+
+# Language Translation
+def _translation_request():
+    """(text, source_lang, target_lang, error response) from the posted form"""
+    if not _available('translation_engine'):
+        return None, None, None, (jsonify({'error': 'Translation functionality is not available'}), 503)
     
     text = request.form.get('text')
     if not text:
-        return jsonify({'error': 'No text provided'}), 400
+        return None, None, None, (jsonify({'error': 'No text provided'}), 400)
     
+    source_lang = request.form.get('source_lang', 'en')
     target_lang = request.form.get('target_lang', 'fr')  # Default to French
+    if not translation_engine.supports(source_lang, target_lang):
+        return None, None, None, (jsonify({'error': f'Translation from {source_lang} to {target_lang} is not supported'}), 400)
+    return text, source_lang, target_lang, None
+
+@main.route('/translate', methods=['POST'])
+@login_required
+def translate_text():
+    text, source_lang, target_lang, error = _translation_request()
+    if error:
+        return error
     
     try:
-        # This is a simplified example - in production, you'd want to handle multiple languages
-        translated = translator(text)[0]['translation_text']
+        translated = result_cache.get_or_compute(
+            translation_engine.pool.models[(source_lang, target_lang)], 'translation',
+            {'source_lang': source_lang, 'target_lang': target_lang}, text,
+            lambda: translation_engine.translate(text, source_lang, target_lang)
+        )
         
         return jsonify({'translated_text': translated})
     except Exception as e:
         return jsonify({'error': f'Translation error: {str(e)}'}), 500
 
+@main.route('/translate/stream', methods=['POST'])
+@login_required
+def translate_text_stream():
+    text, source_lang, target_lang, error = _translation_request()
+    if error:
+        return error
+    
+    try:
+        return _stream_response(
+            lambda: translation_engine.pool.get(source_lang, target_lang), text,
+            (translation_engine.pool.models[(source_lang, target_lang)], 'translation',
+             {'source_lang': source_lang, 'target_lang': target_lang}),
+            max_length=512
+        )
+    except Exception as e:
+        return jsonify({'error': f'Translation error: {str(e)}'}), 500
+
 # Text-to-Speech
-@app.route('/text_to_speech', methods=['POST'])
+# Speech is synthesized once per (text, language) in the background and then
+# served as a static file from the content-addressed audio store
+audio_store = _service('audio_store')
+
+def _speech_response(key, status, detail=None):
+    if status == 'done':
+        return jsonify({
+            'job_id': key,
+            'status': status,
+            'audio_url': url_for('static', filename=f'audio/{detail}')
+        })
+    if status == 'failed':
+        return jsonify({'job_id': key, 'status': status, 'error': f'Text-to-speech error: {detail}'}), 500
+    return jsonify({
+        'job_id': key,
+        'status': status,
+        'status_url': url_for('main.text_to_speech_status', job_id=key)
+    }), 202
+
+@main.route('/text_to_speech', methods=['POST'])
 @login_required
 def text_to_speech():
-    if not GTTS_AVAILABLE:
+    if not audio_store.backend.available():
         return jsonify({'error': 'Text-to-speech functionality is not available'}), 503
     
     text = request.form.get('text')
@@ -340,20 +1167,247 @@ def text_to_speech():
     language = request.form.get('language', 'en')
     
     try:
-        tts = gtts.gTTS(text=text, lang=language, slow=False)
-        
-        # Generate a unique filename
-        filename = f"speech_{uuid.uuid4()}.mp3"
-        file_path = os.path.join('static', 'audio', filename)
-        
-        # Save the audio file
-        tts.save(file_path)
-        
-        return jsonify({'audio_url': url_for('static', filename=f'audio/{filename}')})
+        key, status = audio_store.request(text, language)
+        return _speech_response(key, status, audio_store.filename(key))
     except Exception as e:
         return jsonify({'error': f'Text-to-speech error: {str(e)}'}), 500
 
+@main.route('/text_to_speech/<job_id>')
+@login_required
+def text_to_speech_status(job_id):
+    if not KEY_PATTERN.match(job_id):
+        return jsonify({'error': 'Invalid job id'}), 400
+    status, detail = audio_store.status(job_id)
+    if status is None:
+        return jsonify({'error': 'Unknown text-to-speech job'}), 404
+    return _speech_response(job_id, status, detail)
+
+# Inference scheduler metrics
+@main.route('/inference/metrics')
+@login_required
+def inference_metrics():
+    return jsonify({
+        'schedulers': [s.metrics() for s in _schedulers()],
+        'translation': translation_engine.pool.stats() if _available('translation_engine') else None,
+        'result_cache': result_cache.stats(),
+        'summary_jobs': summary_jobs.stats(),
+        'summary_batches': summary_batches.stats(),
+        'text_to_speech': audio_store.stats()
+    })
+
+def _schedulers():
+    services = current_app.extensions
+    schedulers = [services['summarize_scheduler'], services['qa_scheduler']]
+    if services['translation_engine'] is not None:
+        schedulers.append(services['translation_engine'].scheduler)
+    return [scheduler for scheduler in schedulers if scheduler is not None]
+
+# Prometheus metrics: request/SQL/model-stage histograms from instrumentation.py
+# plus queue depths and model state read at scrape time. Lazy services are
+# only read once this process has built them; a scrape must not start them.
+metrics_registry.gauge('inference_queue_depth', 'Requests waiting in each batch scheduler', lambda: {
+    (s.name,): s.queue_depth() for s in _schedulers()
+}, ('scheduler',))
+
+def _background_depths():
+    queues = (
+        ('summary_jobs', 'summary_jobs', lambda jobs: jobs.queue_depth()),
+        ('summary_batches', 'summary_batches', lambda jobs: jobs.queue_depth()),
+        ('chat_history', 'chat_history_buffer', lambda buffer: buffer.pending()),
+        ('text_to_speech', 'audio_store', lambda store: store.jobs.queue_depth()),
+    )
+    depths = {}
+    for label, name, read in queues:
+        service = _built(name)
+        if service is not None:
+            depths[(label,)] = read(service)
+    return depths
+
+metrics_registry.gauge('background_queue_depth', 'Work queued for background threads',
+                       _background_depths, ('queue',))
+metrics_registry.gauge('model_loaded', 'Whether each model is loaded in this process', lambda: {
+    (name,): int(model_registry.is_loaded(name)) for name in model_registry.names()
+}, ('model',))
+metrics_registry.gauge('translation_models_resident_bytes', 'Weights held by the translation model pool',
+                       lambda: translation_engine.pool.stats()['resident_bytes'] if _available('translation_engine') else None)
+metrics_registry.gauge('user_cache_lookups', 'Session user lookups served from cache or database', lambda: {
+    ('hit',): user_cache.hits,
+    ('miss',): user_cache.misses,
+}, ('result',))
+metrics_registry.gauge('api_response_cache_requests', 'Cached API responses served, revalidated or rebuilt', lambda: {
+    ('hit',): response_cache.hits,
+    ('not_modified',): response_cache.not_modified,
+    ('miss',): response_cache.misses,
+}, ('result',))
+def _password_hash_operations():
+    hasher = _built('password_hasher')
+    if hasher is None:
+        return {}
+    return {('completed',): hasher.completed, ('rejected',): hasher.rejected}
+
+metrics_registry.gauge('password_hash_operations', 'Password hash operations completed or rejected as busy',
+                       _password_hash_operations, ('outcome',))
+
+@main.route('/metrics')
+def metrics():
+    return Response(metrics_registry.render(), mimetype=METRICS_CONTENT_TYPE)
+
+# Readiness probe: 200 once the requested (default: all) models are loaded
+@main.route('/ready')
+def ready():
+    requested = request.args.get('models')
+    names = [name.strip() for name in requested.split(',')] if requested else model_registry.names()
+    unknown = [name for name in names if name not in model_registry.names()]
+    if unknown:
+        return jsonify({'error': f'Unknown models: {", ".join(unknown)}'}), 400
+    
+    is_ready = model_registry.ready(names)
+    return jsonify({'ready': is_ready, 'models': model_registry.status()}), 200 if is_ready else 503
+
+@main.cli.command('migrate')
+def migrate_command():
+    """Create missing tables and apply pending schema migrations"""
+    db.create_all()
+    applied = apply_migrations(db.engine)
+    print(f"Applied migrations: {', '.join(applied) if applied else 'none'}")
+
+@main.cli.command('archive-chat')
+@click.option('--days', type=int, default=None, help='Archive chat history older than this many days')
+def archive_chat_command(days):
+    """Move old chat history into compressed monthly archive files"""
+    days = current_app.config['CHAT_ARCHIVE_AFTER_DAYS'] if days is None else days
+    chat_history_buffer.flush()
+    moved = archive_chat_history(
+        db.session, ChatHistory, datetime.utcnow() - timedelta(days=days), current_app.config['CHAT_ARCHIVE_DIR']
+    )
+    print(f"Archived {moved} chat history rows older than {days} days")
+
+@main.cli.command('import-records')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(RECORD_FORMATS), default=None, help='Defaults to the file extension')
+@click.option('--summarize/--no-summarize', default=False,
+              help='Run the summaries before exiting instead of leaving them for the app')
+def import_records_command(path, fmt, summarize):
+    """Bulk-import medical records from a CSV or NDJSON file"""
+    fmt = fmt or detect_format(path)
+    if fmt is None:
+        raise click.UsageError('Cannot tell the format from the file name, pass --format')
+    try:
+        with open(path, encoding='utf-8-sig', newline='') as f:
+            result = import_medical_records(f, fmt, summarize=summarize)
+    except UnicodeDecodeError:
+        raise click.ClickException('File must be UTF-8 encoded; nothing was imported')
+    except ImportFailed as e:
+        if summarize:
+            summary_batches.shutdown(wait=True)
+        raise click.ClickException(str(e))
+    print(f"Imported {result['inserted']} records, skipped {result['error_count']} rows")
+    for error in result['errors']:
+        print(f"  line {error['line']}: {error['error']}")
+    if summarize:
+        summary_batches.shutdown(wait=True)
+    elif result['summaries_queued']:
+        print(f"{result['summaries_queued']} summaries are pending; the app's workers pick them up "
+              f"within SUMMARY_JOB_SWEEP_SECONDS, or run `flask summarize-pending`")
+
+@main.cli.command('summarize-pending')
+def summarize_pending_command():
+    """Run pending and abandoned summary jobs, then exit"""
+    if not _available('summarize_scheduler') or not model_registry.available('summarization'):
+        raise click.ClickException('Summarization functionality is not available')
+    queued = requeue_pending_summary_jobs()
+    summary_batches.shutdown(wait=True)
+    print(f"Ran {queued} pending summary jobs")
+
+@main.cli.command('export-records')
+@click.option('--format', 'fmt', type=click.Choice(RECORD_FORMATS), default='ndjson')
+@click.option('--user-id', type=int, default=None, help='Only this patient\'s records')
+@click.option('--output', type=click.File('w', encoding='utf-8'), default='-')
+def export_records_command(fmt, user_id, output):
+    """Stream medical records to a CSV or NDJSON file"""
+    statement = export_statement(MedicalRecord, User, user_id)
+    for chunk in export_records(db.session, statement, fmt, batch_size=current_app.config['EXPORT_BATCH_SIZE']):
+        output.write(chunk)
+
+# Application assembly, called by create_app()
+def init_services(app):
+    """Build the app's services into app.extensions; those owning threads lazily"""
+    init_models(app)
+    services = app.extensions
+    
+    LazyExtension('chat_history_buffer', lambda: WriteBehindBuffer(
+        in_app_context(app, _insert_chat_history),
+        max_rows=app.config['CHAT_HISTORY_FLUSH_ROWS'],
+        max_delay=app.config['CHAT_HISTORY_FLUSH_SECONDS'],
+        max_pending=app.config['CHAT_HISTORY_MAX_PENDING'],
+        name='chat-history',
+        retryable=lambda exc: isinstance(exc, OperationalError)
+    )).init_app(app)
+    LazyExtension('summary_jobs', lambda: JobQueue(
+        in_app_context(app, run_summary_job),
+        max_workers=app.config['SUMMARY_JOB_WORKERS'],
+        max_attempts=app.config['SUMMARY_JOB_MAX_ATTEMPTS'],
+        on_failure=in_app_context(app, fail_summary_job),
+        name='summaries'
+    )).init_app(app)
+    LazyExtension('summary_batches', lambda: JobQueue(
+        in_app_context(app, run_summary_batch),
+        max_workers=1,
+        max_attempts=app.config['SUMMARY_JOB_MAX_ATTEMPTS'],
+        on_failure=in_app_context(app, fail_summary_batch),
+        name='summary-batches'
+    )).init_app(app)
+    LazyExtension('summary_sweeper', lambda: PeriodicTask(
+        in_app_context(app, sweep_summary_jobs),
+        app.config['SUMMARY_JOB_SWEEP_SECONDS'],
+        name='summary-sweeper'
+    )).init_app(app)
+    
+    services['retrieval'] = None
+    if TRANSFORMERS_AVAILABLE:
+        services['retrieval'] = RetrievalService(
+            lambda: Embedder(app.config['EMBEDDING_MODEL']),
+            index_path=app.config['RETRIEVAL_INDEX_PATH'],
+            save_interval=app.config['RETRIEVAL_SAVE_SECONDS']
+        )
+        atexit.register(services['retrieval'].save, force=True)
+    LazyExtension('retrieval_sync', lambda: PeriodicTask(
+        in_app_context(app, sync_retrieval_index),
+        app.config['RETRIEVAL_SYNC_SECONDS'],
+        name='retrieval-sync'
+    )).init_app(app)
+    
+    services['table_versions'] = TableVersions(in_app_context(app, _read_table_versions),
+                                               poll_interval=app.config['CACHE_VERSION_POLL_SECONDS'])
+    services['user_cache'] = UserCache(db.session, User, services['table_versions'], ttl=app.config['USER_CACHE_TTL'])
+    LazyExtension('password_hasher', lambda: PasswordHasher(
+        iterations=app.config['PASSWORD_HASH_ITERATIONS'],
+        max_workers=app.config['PASSWORD_HASH_WORKERS']
+    )).init_app(app)
+    services['response_cache'] = ResponseCache(services['table_versions'], ttl=app.config['API_CACHE_TTL'])
+    
+    LazyExtension('audio_store', lambda: AudioStore(
+        os.path.join(app.static_folder, 'audio'),
+        create_backend(app.config['TTS_BACKEND']),
+        max_bytes=app.config['TTS_CACHE_MAX_MB'] * 1024 * 1024,
+        sweep_interval=app.config['TTS_SWEEP_SECONDS'],
+        max_workers=app.config['TTS_WORKERS']
+    )).init_app(app)
+
+def init_app(app):
+    """Bind the database and login manager, build the services and add the main routes"""
+    # Ensure static directories exist
+    os.makedirs(os.path.join(app.static_folder, 'audio'), exist_ok=True)
+    
+    db.init_app(app)
+    login_manager.init_app(app)
+    init_services(app)
+    app.register_blueprint(main)
+    
+    # Per-request latency/SQL metrics, exposed on /metrics
+    instrument_app(app)
+    _apps.add(app)
+
 if __name__ == '__main__':
-    with app.app_context():
-        db.create_all()
-    app.run(debug=True)
\ No newline at end of file
+    import runserver
+    runserver.main(debug=True)
@@ -0,0 +1,115 @@
+# db_write_benchmark.py
+"""
+Concurrent write throughput against SQLite, default settings vs. the tuned
+connection setup in Doctor_Patient_communication_system/database.py.
+
+Each worker process opens its own engine (like a gunicorn worker) and does
+one small insert + commit per "chat message":
+
+    python benchmarks/db_write_benchmark.py --workers 4 --commits 500
+    DATABASE_URL=postgresql://localhost/bench python benchmarks/db_write_benchmark.py
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+import Doctor_Patient_communication_system.database as database
+
+
+def _create_engine(url, tuned):
+    if tuned:
+        os.environ['SQLITE_TUNING'] = '1'
+        return create_engine(url, **database.engine_options(url))
+    # Baseline: the old hard-coded setup, i.e. rollback journal and driver defaults
+    os.environ['SQLITE_TUNING'] = '0'
+    return create_engine(url)
+
+
+def _worker(url, tuned, commits, results):
+    engine = _create_engine(url, tuned)
+    ok = locked = 0
+    started = time.perf_counter()
+    for i in range(commits):
+        try:
+            with engine.begin() as conn:
+                conn.execute(
+                    text("INSERT INTO bench_chat (user_id, message, response) VALUES (:u, :m, :r)"),
+                    {'u': os.getpid(), 'm': f"message {i}", 'r': "response " * 20}
+                )
+            ok += 1
+        except OperationalError as e:
+            if 'locked' not in str(e):
+                raise
+            locked += 1
+    results.put({'ok': ok, 'locked': locked, 'seconds': time.perf_counter() - started})
+    engine.dispose()
+
+
+def run(url, tuned, workers, commits):
+    engine = _create_engine(url, tuned)
+    with engine.begin() as conn:
+        if url.startswith('sqlite') and not tuned:
+            # journal_mode=WAL persists in the file; reset it for the baseline
+            conn.execute(text("PRAGMA journal_mode=DELETE"))
+        conn.execute(text("DROP TABLE IF EXISTS bench_chat"))
+        conn.execute(text(
+            "CREATE TABLE bench_chat (id INTEGER PRIMARY KEY, user_id INTEGER, message TEXT, response TEXT)"
+        ))
+    engine.dispose()
+
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=_worker, args=(url, tuned, commits, results)) for _ in range(workers)]
+    started = time.perf_counter()
+    for process in processes:
+        process.start()
+    outcomes = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - started
+
+    committed = sum(o['ok'] for o in outcomes)
+    return {
+        'mode': 'tuned' if tuned else 'default',
+        'workers': workers,
+        'commits_attempted': workers * commits,
+        'commits_ok': committed,
+        'database_locked_errors': sum(o['locked'] for o in outcomes),
+        'seconds': round(elapsed, 3),
+        'commits_per_second': round(committed / elapsed, 1) if elapsed else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--commits', type=int, default=500)
+    parser.add_argument('--output', help="write results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    url = os.environ.get('DATABASE_URL')
+    if not url:
+        url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='db-bench-'), 'bench.db')
+
+    reports = []
+    for tuned in (False, True):
+        reports.append(run(url, tuned, args.workers, args.commits))
+        print(json.dumps(reports[-1]))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(reports, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,144 @@
+# llm_benchmark.py
+"""
+Micro-benchmarks of LLMService methods across input lengths.
+
+Every call goes through the public method (scheduler, chunking, cache
+lookup) with the result cache cleared first, so it measures real inference
+rather than cache hits:
+
+    python benchmarks/llm_benchmark.py --models stub
+    python benchmarks/llm_benchmark.py --models tiny --lengths 64,512 --repeat 5 --output llm.json
+    python benchmarks/llm_benchmark.py --models real --methods summarize_text
+
+See stand_ins.py for the model kinds.
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import resource
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stand_ins import KINDS, install_in_service
+
+METHODS = ('summarize_text', 'answer_question', 'translate_text')
+
+_SENTENCES = [
+    "Patient presents with intermittent chest pain radiating to the left arm.",
+    "Blood pressure was elevated at 150 over 95 on two separate readings.",
+    "Prescribed lisinopril 10 mg once daily and advised a low sodium diet.",
+    "ECG showed normal sinus rhythm without acute ST segment changes.",
+    "Follow up in two weeks with repeat labs including a lipid panel.",
+    "Family history is significant for type 2 diabetes and hypertension.",
+    "The patient reports improved sleep and reduced headaches since last visit.",
+    "Advised to stop smoking and referred to a cessation program.",
+]
+
+
+def make_text(words):
+    """Deterministic clinical-note-like text of roughly ``words`` words"""
+    out = []
+    i = 0
+    while sum(len(s.split()) for s in out) < words:
+        out.append(_SENTENCES[i % len(_SENTENCES)])
+        i += 1
+    return " ".join(out)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100.0 * len(ordered)) - 1)]
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024, 1)
+
+
+def _call(service, method, text):
+    if method == 'summarize_text':
+        return service.summarize_text(text)
+    if method == 'answer_question':
+        return service.answer_question("What medication was prescribed?", context=text)
+    return service.translate_text(text, "en", "fr")
+
+
+def bench_method(service, method, words, repeat, warmup):
+    text = make_text(words)
+    for _ in range(warmup):
+        service.result_cache.clear()
+        _call(service, method, text)
+    timings = []
+    for _ in range(repeat):
+        service.result_cache.clear()
+        started = time.perf_counter()
+        _call(service, method, text)
+        timings.append((time.perf_counter() - started) * 1000.0)
+    return {
+        'method': method,
+        'input_words': words,
+        'repeat': repeat,
+        'mean_ms': round(statistics.mean(timings), 3),
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'min_ms': round(min(timings), 3),
+        'words_per_second': round(words / (statistics.mean(timings) / 1000.0), 1),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--models', choices=KINDS, default='stub')
+    parser.add_argument('--methods', default=','.join(METHODS))
+    parser.add_argument('--lengths', default='64,256,1024,4096', help="input lengths in words")
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--output', help="write results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    methods = [m.strip() for m in args.methods.split(',') if m.strip()]
+    unknown = [m for m in methods if m not in METHODS]
+    if unknown:
+        parser.error(f"unknown methods: {', '.join(unknown)}")
+    lengths = [int(n) for n in args.lengths.split(',')]
+
+    from Doctor_Patient_communication_system.llm_service import LLMService
+    service = install_in_service(LLMService(), args.models)
+
+    started = time.perf_counter()
+    service.load_models()
+    load_seconds = time.perf_counter() - started
+
+    results = []
+    for method in methods:
+        for words in lengths:
+            results.append(bench_method(service, method, words, args.repeat, args.warmup))
+            print(json.dumps(results[-1]))
+
+    report = {
+        'benchmark': 'llm_service',
+        'models': args.models,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'load_seconds': round(load_seconds, 3),
+        'results': results,
+        'schedulers': service.scheduler_metrics(),
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,239 @@
+# load_test.py
+"""
+HTTP load test of the AI endpoints with a concurrency sweep.
+
+Starts the Flask app in a child process (threaded Werkzeug server, a
+throwaway SQLite database and a benchmark user), then for each endpoint and
+concurrency level sends ``--requests`` requests from that many client
+threads over keep-alive connections and records latency percentiles,
+throughput, errors and the server's peak RSS:
+
+    python benchmarks/load_test.py --models stub
+    python benchmarks/load_test.py --models tiny --concurrency 1,8,32 --requests 400 --output load.json
+    python benchmarks/load_test.py --endpoints summarize --words 1024 --repeat-inputs
+
+Request bodies are unique by default so the result cache is bypassed; pass
+--repeat-inputs to measure the cached path instead. See stand_ins.py for
+the model kinds.
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_benchmark import make_text, percentile
+from stand_ins import KINDS
+
+BENCH_EMAIL = 'bench@example.com'
+BENCH_PASSWORD = 'bench-password'
+
+ENDPOINTS = {
+    'summarize': ('/summarize', lambda text: {'report_text': text}),
+    'chat': ('/chat', lambda text: {'query': "What medication was prescribed? " + text}),
+    'translate': ('/translate', lambda text: {'text': text, 'target_lang': 'fr'}),
+}
+
+
+def serve(port, kind):
+    """Child process: run the app with stand-in models until killed"""
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='load-test-'), 'bench.db')
+    from werkzeug.serving import make_server
+    from werkzeug.security import generate_password_hash
+    from stand_ins import install_in_app
+    from Doctor_Patient_communication_system import create_app
+    import app as app_module
+
+    flask_app = install_in_app(create_app(), kind)
+    with flask_app.app_context():
+        app_module.db.create_all()
+        app_module.db.session.add(app_module.User(
+            username='bench', email=BENCH_EMAIL, password=generate_password_hash(BENCH_PASSWORD)
+        ))
+        app_module.db.session.commit()
+        app_module.model_registry.warm_up(background=False)
+    # Per-request access logging would dominate the server's own timings
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    make_server('127.0.0.1', port, flask_app, threaded=True).serve_forever()
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_port(port, process, timeout=300):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("Server did not start in time")
+
+
+def peak_rss_mb(pid):
+    """High-water RSS of a process since it started (Linux only)"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+class Client:
+    """One keep-alive connection logged in as the benchmark user"""
+
+    def __init__(self, port):
+        self.conn = http.client.HTTPConnection('127.0.0.1', port, timeout=300)
+        self.cookie = None
+        status, _ = self.post('/login', {'email': BENCH_EMAIL, 'password': BENCH_PASSWORD})
+        if status not in (200, 302) or not self.cookie:
+            raise RuntimeError(f"Login failed with status {status}")
+
+    def post(self, path, form):
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+        if self.cookie:
+            headers['Cookie'] = self.cookie
+        self.conn.request('POST', path, body=urlencode(form), headers=headers)
+        response = self.conn.getresponse()
+        body = response.read()
+        set_cookie = response.getheader('Set-Cookie')
+        if set_cookie:
+            self.cookie = set_cookie.split(';', 1)[0]
+        return response.status, body
+
+    def close(self):
+        self.conn.close()
+
+
+def run_level(port, endpoint, concurrency, requests, words, repeat_inputs, server_pid):
+    path, make_form = ENDPOINTS[endpoint]
+    base_text = make_text(words)
+    clients = [Client(port) for _ in range(concurrency)]
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def worker(client):
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            text = base_text if repeat_inputs else f"{base_text} Visit {i}."
+            started = time.perf_counter()
+            try:
+                status, body = client.post(path, make_form(text))
+                ok = status == 200
+            except Exception as e:
+                status, body, ok = None, str(e).encode(), False
+            elapsed = (time.perf_counter() - started) * 1000.0
+            with lock:
+                latencies.append(elapsed)
+                if not ok:
+                    errors.append(f"{status}: {body[:200].decode(errors='replace')}")
+
+    threads = [threading.Thread(target=worker, args=(client,)) for client in clients]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    for client in clients:
+        client.close()
+
+    return {
+        'endpoint': endpoint,
+        'concurrency': concurrency,
+        'requests': requests,
+        'input_words': words,
+        'errors': len(errors),
+        'first_error': errors[0] if errors else None,
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'max_ms': round(max(latencies), 2),
+        'throughput_rps': round(requests / elapsed, 2) if elapsed else None,
+        'server_peak_rss_mb': peak_rss_mb(server_pid),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--models', choices=KINDS, default='stub')
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS))
+    parser.add_argument('--concurrency', default='1,4,16')
+    parser.add_argument('--requests', type=int, default=200, help="requests per endpoint and concurrency level")
+    parser.add_argument('--words', type=int, default=256, help="input length in words")
+    parser.add_argument('--repeat-inputs', action='store_true', help="send identical bodies (result cache hits)")
+    parser.add_argument('--output', help="write results as JSON to this file")
+    parser.add_argument('--serve', type=int, metavar='PORT', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        serve(args.serve, args.models)
+        return 0
+
+    endpoints = [e.strip() for e in args.endpoints.split(',') if e.strip()]
+    unknown = [e for e in endpoints if e not in ENDPOINTS]
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(unknown)}")
+    levels = [int(n) for n in args.concurrency.split(',')]
+
+    port = _free_port()
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--models', args.models, '--serve', str(port)],
+        cwd=root
+    )
+    results = []
+    try:
+        _wait_for_port(port, server)
+        for endpoint in endpoints:
+            for concurrency in levels:
+                results.append(run_level(port, endpoint, concurrency, args.requests, args.words,
+                                         args.repeat_inputs, server.pid))
+                print(json.dumps(results[-1]))
+        server_rss = peak_rss_mb(server.pid)
+    finally:
+        server.terminate()
+        server.wait()
+
+    report = {
+        'benchmark': 'http_load',
+        'models': args.models,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'server_peak_rss_mb': server_rss,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
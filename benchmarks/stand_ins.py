@@ -0,0 +1,175 @@
+# stand_ins.py
+"""
+Small models for benchmarking without the production checkpoints.
+
+    stub   numpy stand-ins with the pipelines' call signatures and outputs.
+           Each call does a padded per-batch matmul stack sized to the input,
+           so batching, scheduling and text handling are exercised and
+           timings scale with input length. No transformers, no downloads.
+    tiny   randomly initialised tiny Hugging Face checkpoints run through the
+           real transformers pipelines. Downloaded once into the HF cache;
+           set HF_HUB_OFFLINE=1 on CI after the first run.
+    real   the production models, unchanged.
+"""
+
+import numpy as np
+
+from Doctor_Patient_communication_system.inference_scheduler import summarization_batch_fn, cached_qa_batch_fn
+from Doctor_Patient_communication_system.translation_engine import (
+    LANGUAGE_PAIR_MODELS, TranslationEngine, TranslationModelPool
+)
+
+KINDS = ('stub', 'tiny', 'real')
+
+TINY_MODELS = {
+    'summarization': "sshleifer/bart-tiny-random",
+    'qa': "hf-internal-testing/tiny-random-RobertaForQuestionAnswering",
+    'translation': "hf-internal-testing/tiny-random-MarianMTModel",
+}
+
+
+class StubTokenizer:
+    """Whitespace tokenizer; slow (no offsets), like the fallback path in LLMService"""
+    is_fast = False
+    model_max_length = 1024
+
+    def encode(self, text, **kwargs):
+        return text.split()
+
+    def __call__(self, texts, **kwargs):
+        if isinstance(texts, str):
+            return {"input_ids": self.encode(texts)}
+        return {"input_ids": [self.encode(text) for text in texts]}
+
+
+class _StubModel:
+    """Padded batch forward pass: ``layers`` dense layers over every token"""
+
+    def __init__(self, hidden=256, layers=2, seed=0):
+        rng = np.random.default_rng(seed)
+        self.weights = [rng.standard_normal((hidden, hidden)).astype(np.float32) / np.sqrt(hidden)
+                        for _ in range(layers)]
+        self.hidden = hidden
+
+    def forward(self, lengths):
+        states = np.ones((len(lengths), max(lengths), self.hidden), dtype=np.float32)
+        for weight in self.weights:
+            states = np.tanh(states @ weight)
+        return states
+
+
+class _StubPipeline:
+    def __init__(self, seed):
+        self.tokenizer = StubTokenizer()
+        self.model = _StubModel(seed=seed)
+
+    def _run(self, texts):
+        lengths = [min(len(self.tokenizer.encode(text)), self.tokenizer.model_max_length) or 1 for text in texts]
+        self.model.forward(lengths)
+
+
+class StubSummarizationPipeline(_StubPipeline):
+    def __init__(self):
+        super().__init__(seed=1)
+
+    def __call__(self, texts, batch_size=None, max_length=100, min_length=0, **kwargs):
+        texts = [texts] if isinstance(texts, str) else list(texts)
+        self._run(texts)
+        return [{"summary_text": " ".join(text.split()[:max_length])} for text in texts]
+
+
+class StubTranslationPipeline(_StubPipeline):
+    def __init__(self):
+        super().__init__(seed=2)
+
+    def __call__(self, texts, batch_size=None, **kwargs):
+        texts = [texts] if isinstance(texts, str) else list(texts)
+        self._run(texts)
+        return [{"translation_text": text} for text in texts]
+
+
+class StubQAPipeline(_StubPipeline):
+    def __init__(self):
+        super().__init__(seed=3)
+
+    def __call__(self, question, context, batch_size=None, **kwargs):
+        single = isinstance(question, str)
+        questions, contexts = ([question], [context]) if single else (question, context)
+        self._run([q + " " + c for q, c in zip(questions, contexts)])
+        outputs = []
+        for context_text in contexts:
+            words = context_text.split()
+            outputs.append({"answer": " ".join(words[:5]), "score": 0.5, "start": 0, "end": 0})
+        return outputs[0] if single else outputs
+
+
+def pipeline_loaders(kind):
+    """Zero-argument loaders for summarization/qa and a one-argument loader for translation"""
+    if kind == 'stub':
+        return {
+            'summarization': StubSummarizationPipeline,
+            'qa': StubQAPipeline,
+            'translation': lambda model_name: StubTranslationPipeline(),
+        }
+    if kind == 'tiny':
+        from transformers import pipeline
+        return {
+            'summarization': lambda: pipeline("summarization", model=TINY_MODELS['summarization']),
+            'qa': lambda: pipeline("question-answering", model=TINY_MODELS['qa']),
+            'translation': lambda model_name: pipeline("translation", model=model_name),
+        }
+    raise ValueError(f"No stand-in models of kind '{kind}' (choose from {', '.join(KINDS)})")
+
+
+def _translation_pool(kind, loader, memory_budget):
+    models = dict(LANGUAGE_PAIR_MODELS)
+    if kind == 'tiny':
+        models = {pair: TINY_MODELS['translation'] for pair in models}
+    return TranslationModelPool(loader, memory_budget=memory_budget, models=models)
+
+
+def install_in_service(service, kind):
+    """Swap an LLMService's models for stand-ins (no-op for 'real')"""
+    if kind == 'real':
+        return service
+    loaders = pipeline_loaders(kind)
+
+    def service_loader(name):
+        def load():
+            pipe = loaders[name]()
+            service.models[name] = pipe.model
+            service.tokenizers[name] = pipe.tokenizer
+            return pipe
+        return load
+
+    for name in ('summarization', 'qa'):
+        service.registry.register(name, service_loader(name))
+    service.translation.pool = _translation_pool(kind, loaders['translation'], service.translation.pool.memory_budget)
+    return service
+
+
+def install_in_app(flask_app, kind):
+    """Swap a Flask app's models for stand-ins (no-op for 'real')"""
+    import app as app_module
+
+    if kind == 'real':
+        return flask_app
+    services = flask_app.extensions
+    loaders = pipeline_loaders(kind)
+    for name in ('summarization', 'qa'):
+        services['model_registry'].register(name, loaders[name])
+    # Existing schedulers look models up per batch and pick up the stand-ins;
+    # they are only missing when transformers is not installed
+    if services['summarize_scheduler'] is None:
+        services['summarize_scheduler'] = app_module.make_scheduler(flask_app, 'summarization', summarization_batch_fn)
+    if services['qa_scheduler'] is None:
+        services['qa_scheduler'] = app_module.make_scheduler(flask_app, 'qa', cached_qa_batch_fn)
+    config = flask_app.config
+    services['translation_engine'] = TranslationEngine(
+        _translation_pool(kind, loaders['translation'], config['TRANSLATION_MEMORY_MB'] * 1024 * 1024),
+        max_batch_size=config['TRANSLATION_MAX_BATCH_SIZE'],
+        max_wait_ms=config['INFERENCE_MAX_WAIT_MS']
+    )
+    # Retrieval would download the embedding model; chat falls back to its default context
+    services['retrieval'] = None
+    return flask_app
@@ -0,0 +1,67 @@
+# gunicorn.conf.py
+"""
+Gunicorn settings for serving the app built by
+``Doctor_Patient_communication_system.create_app()``.
+
+Set PRELOAD_MODELS=1 to build the app and load every model once in the
+master, frozen and in eval mode, before workers are forked. Workers then share the weight pages
+copy-on-write instead of each holding their own copy. Set
+MODEL_MMAP_WEIGHTS=1 to read model weights from mmapped safetensors
+files. Check the savings with:
+
+    python -m Doctor_Patient_communication_system.shared_weights <master_pid>
+"""
+
+import os
+
+from Doctor_Patient_communication_system.shared_weights import env_flag
+
+wsgi_app = 'Doctor_Patient_communication_system:create_app()'
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+preload_app = env_flag('PRELOAD_MODELS')
+
+
+def when_ready(server):
+    if preload_app:
+        # Last step before forking: keep the GC from dirtying inherited pages
+        from Doctor_Patient_communication_system.shared_weights import freeze_heap
+        freeze_heap()
+
+
+def post_fork(server, worker):
+    # Nothing with threads or sockets crosses the fork: the app's after_fork
+    # hooks reset database pools, batch schedulers and index locks, and
+    # services the master built (job queues, hash pool, chat buffer) are
+    # rebuilt on first use in the worker.
+    #
+    # Split CPU cores between workers instead of every worker using all of them.
+    torch_threads = os.environ.get('TORCH_THREADS_PER_WORKER')
+    if torch_threads:
+        try:
+            import torch
+            torch.set_num_threads(int(torch_threads))
+        except ImportError:
+            pass
+
+
+def worker_exit(server, worker):
+    # Flush chat history still buffered in this worker before it goes away
+    buffer = worker.wsgi.extensions.get('chat_history_buffer') if worker.wsgi else None
+    if buffer is not None and buffer.loaded:
+        buffer.close()
+
+
+def post_worker_init(worker):
+    from Doctor_Patient_communication_system.shared_weights import process_memory
+    try:
+        usage = process_memory(worker.pid)
+    except OSError:
+        return
+    worker.log.info(
+        "Worker %s ready: rss=%.1fMB pss=%.1fMB shared=%.1fMB private=%.1fMB",
+        worker.pid, usage['rss_kb'] / 1024, usage['pss_kb'] / 1024,
+        usage['shared_kb'] / 1024, usage['private_kb'] / 1024
+    )
@@ -3,12 +3,23 @@ This script runs the Doctor_Patient_communication_system application using a dev
 """
 
 from os import environ
-from Doctor_Patient_communication_system import app
+from Doctor_Patient_communication_system import create_app
+from app import apply_migrations, db, requeue_pending_summary_jobs
 
-if __name__ == '__main__':
+
+def main(debug=False):
     HOST = environ.get('SERVER_HOST', 'localhost')
     try:
         PORT = int(environ.get('SERVER_PORT', '5555'))
     except ValueError:
         PORT = 5555
-    app.run(HOST, PORT)
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        apply_migrations(db.engine)
+        requeue_pending_summary_jobs()
+    app.run(HOST, PORT, debug=debug)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+# conftest.py
+"""
+Shared fixtures: a fresh, migrated app on a temporary SQLite database per
+test, with a cheap password hash and the stub text-to-speech backend.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Doctor_Patient_communication_system import create_app  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+    application = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}",
+        'PASSWORD_HASH_ITERATIONS': 1000,
+        'TTS_BACKEND': 'stub',
+        'RETRIEVAL_INDEX_PATH': str(tmp_path / 'retrieval_index'),
+        'CHAT_ARCHIVE_DIR': str(tmp_path / 'chat_archive'),
+    })
+    from app import apply_migrations, db
+    with application.app_context():
+        db.create_all()
+        apply_migrations(db.engine)
+    yield application
+    with application.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def login(client):
+    """Register (if needed) and sign in a user; returns the signed-in client"""
+    def login(email='patient@example.com', password='secret', is_doctor=False):
+        form = {'username': email.split('@')[0], 'email': email, 'password': password}
+        if is_doctor:
+            form['is_doctor'] = 'on'
+        client.post('/register', data=form)
+        client.post('/login', data={'email': email, 'password': password})
+        return client
+    return login
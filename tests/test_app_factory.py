@@ -0,0 +1,48 @@
+# test_app_factory.py
+"""create_app() builds independent apps whose lazy services stay unbuilt until used."""
+
+import app as core
+from Doctor_Patient_communication_system import create_app
+
+
+def test_each_call_builds_a_new_app(app, tmp_path):
+    other = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'other.db'}"})
+    assert other is not app
+    assert other.extensions['response_cache'] is not app.extensions['response_cache']
+    assert other.extensions['summary_jobs'] is not app.extensions['summary_jobs']
+    assert other.config['SQLALCHEMY_DATABASE_URI'] != app.config['SQLALCHEMY_DATABASE_URI']
+
+
+def test_config_overrides_environment(app):
+    assert app.config['TESTING'] is True
+    assert app.config['PASSWORD_HASH_ITERATIONS'] == 1000
+    assert 'main.login' in app.view_functions
+    assert any(name.startswith('api.') for name in app.view_functions)
+
+
+def test_apps_use_their_own_database(app, tmp_path):
+    other = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'other.db'}"})
+    with other.app_context():
+        core.db.create_all()
+        core.db.session.add(core.User(username='other', email='other@example.com', password='x'))
+        core.db.session.commit()
+    with app.app_context():
+        assert core.User.query.count() == 0
+    with other.app_context():
+        assert core.User.query.count() == 1
+
+
+def test_metrics_scrape_does_not_build_lazy_services(client, app):
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    for name in ('summary_jobs', 'summary_batches', 'chat_history_buffer', 'audio_store', 'password_hasher'):
+        assert not app.extensions[name].loaded
+
+
+def test_pages_render_for_patients_and_doctors(app, login):
+    for email, is_doctor in (('patient@example.com', False), ('doctor@example.com', True)):
+        client = login(email, is_doctor=is_doctor)
+        for path in ('/dashboard', '/medical_history', '/discussions', '/search?q=flu'):
+            assert client.get(path).status_code == 200, path
+        client.get('/logout')
+    assert app.extensions['password_hasher'].loaded
@@ -0,0 +1,105 @@
+# test_cache_invalidation.py
+"""Cached users and API responses are retired by writes from any process sharing the database."""
+
+import io
+
+import pytest
+
+from app import db, CacheVersion, Discussion, User
+from Doctor_Patient_communication_system import create_app
+
+
+@pytest.fixture
+def other_app(app):
+    """A second app on the same database, standing in for another worker process"""
+    other = create_app({key: app.config[key] for key in (
+        'TESTING', 'SQLALCHEMY_DATABASE_URI', 'PASSWORD_HASH_ITERATIONS', 'TTS_BACKEND',
+        'RETRIEVAL_INDEX_PATH', 'CHAT_ARCHIVE_DIR')})
+    for application in (app, other):
+        application.extensions['table_versions'].poll_interval = 0
+    yield other
+    with other.app_context():
+        db.engine.dispose()
+
+
+def _versions(app):
+    with app.app_context():
+        return dict(db.session.execute(db.select(CacheVersion.name, CacheVersion.version)).all())
+
+
+def _titles(client):
+    response = client.get('/api/recent_discussions')
+    assert response.status_code == 200
+    return [item['title'] for item in response.get_json()['discussions']]
+
+
+def test_a_write_in_another_process_retires_cached_responses(app, other_app, login):
+    client = login('doctor@example.com', is_doctor=True)
+    assert _titles(client) == []
+    assert _titles(client) == []
+    assert app.extensions['response_cache'].hits == 1
+
+    with other_app.app_context():
+        user = User.query.filter_by(email='doctor@example.com').one()
+        db.session.add(Discussion(title='Seasonal flu', content='Symptoms?', user_id=user.id))
+        db.session.commit()
+
+    assert _titles(client) == ['Seasonal flu']
+
+
+def test_etag_revalidation_sees_remote_writes(app, other_app, login):
+    client = login('doctor@example.com', is_doctor=True)
+    etag = client.get('/api/recent_discussions').headers['ETag']
+    assert client.get('/api/recent_discussions', headers={'If-None-Match': etag}).status_code == 304
+
+    with other_app.app_context():
+        user = User.query.filter_by(email='doctor@example.com').one()
+        db.session.add(Discussion(title='Allergies', content='Pollen', user_id=user.id))
+        db.session.commit()
+
+    assert client.get('/api/recent_discussions', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_a_user_changed_elsewhere_is_reloaded(app, other_app, login):
+    login('patient@example.com')
+    with app.app_context():
+        user_id = User.query.filter_by(email='patient@example.com').one().id
+        cache = app.extensions['user_cache']
+        assert cache.get(user_id).username == 'patient'
+        assert cache.get(user_id).username == 'patient'
+        hits = cache.hits
+
+    with other_app.app_context():
+        db.session.get(User, user_id).username = 'renamed'
+        db.session.commit()
+
+    with app.app_context():
+        assert cache.get(user_id).username == 'renamed'
+        assert cache.hits == hits
+
+
+def test_only_committed_writes_to_cached_tables_bump_versions(app):
+    with app.app_context():
+        user = User(username='someone', email='someone@example.com', password='x')
+        db.session.add(user)
+        db.session.commit()
+        before = _versions(app)
+        assert before.get('user', 0) >= 1
+
+        db.session.add(Discussion(title='Draft', content='never saved', user_id=user.id))
+        db.session.flush()
+        db.session.rollback()
+    assert _versions(app) == before
+
+
+def test_bulk_imports_bump_the_record_version(app):
+    with app.app_context():
+        db.session.add(User(username='pat', email='pat@example.com', password='x'))
+        db.session.commit()
+    before = _versions(app).get('medical_record', 0)
+
+    from app import import_medical_records
+    csv = "patient_email,record_date,diagnosis,prescription,notes\npat@example.com,2024-01-02,Flu,,\n"
+    with app.app_context():
+        assert import_medical_records(io.StringIO(csv), 'csv', summarize=False)['inserted'] == 1
+    assert _versions(app)['medical_record'] == before + 1
@@ -0,0 +1,40 @@
+# test_hierarchical_summarizer.py
+"""Map-reduce summarization ends in a model summary even when the reduce levels run out."""
+
+import re
+
+from Doctor_Patient_communication_system.hierarchical_summarizer import HierarchicalSummarizer
+
+
+class WordTokenizer:
+    """One token per whitespace-separated word"""
+
+    def __call__(self, text, add_special_tokens=False, return_offsets_mapping=False):
+        if isinstance(text, list):
+            return {'input_ids': [item.split() for item in text]}
+        return {'offset_mapping': [match.span() for match in re.finditer(r'\S+', text)]}
+
+
+def test_summaries_that_never_fit_get_a_final_pass():
+    calls = []
+
+    def summarize_batch(texts, max_length, min_length):
+        calls.append((len(texts), max_length))
+        # Chunk summaries as long as their input, so reducing never shrinks them
+        return [" ".join(["word"] * min(len(text.split()), 10)) for text in texts]
+
+    engine = HierarchicalSummarizer(WordTokenizer(), summarize_batch, max_tokens=10, overlap_tokens=0, max_levels=2)
+    text = " ".join(f"Sentence {i} goes on and on and on here." for i in range(20))
+    summary = engine.summarize(text, max_length=7, min_length=3)
+
+    assert calls[-1] == (1, 7)
+    assert summary == " ".join(["word"] * 10)
+
+
+def test_summaries_that_fit_are_returned_joined():
+    def summarize_batch(texts, max_length, min_length):
+        return ["short." for _ in texts]
+
+    engine = HierarchicalSummarizer(WordTokenizer(), summarize_batch, max_tokens=10, overlap_tokens=0)
+    text = " ".join(f"Sentence {i} is a bit long." for i in range(4))
+    assert engine.summarize(text, max_length=7, min_length=3) == "short. short. short. short."
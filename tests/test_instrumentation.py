@@ -0,0 +1,55 @@
+# test_instrumentation.py
+"""Request metrics and the profiler are finished at teardown, failed requests included."""
+
+import os
+
+import pytest
+
+from Doctor_Patient_communication_system.instrumentation import REGISTRY
+
+
+def _latency_count(endpoint, status):
+    prefix = f'http_request_duration_seconds_count{{method="GET",endpoint="{endpoint}",status="{status}"}} '
+    for line in REGISTRY.render().splitlines():
+        if line.startswith(prefix):
+            return int(line[len(prefix):])
+    return 0
+
+
+@pytest.fixture
+def failing_app(app, tmp_path):
+    app.config['PROFILING_ENABLED'] = True
+
+    def explode():
+        raise RuntimeError("boom")
+
+    app.add_url_rule('/explode', 'explode', explode)
+    app.config['PROFILE_DIR'] = str(tmp_path / 'profiles')
+    return app
+
+
+def test_unhandled_exceptions_are_recorded_as_500(failing_app):
+    failing_app.config['PROPAGATE_EXCEPTIONS'] = True
+    before = _latency_count('explode', 500)
+    with pytest.raises(RuntimeError):
+        failing_app.test_client().get('/explode')
+    assert _latency_count('explode', 500) == before + 1
+
+    failing_app.config['PROPAGATE_EXCEPTIONS'] = False
+    assert failing_app.test_client().get('/explode').status_code == 500
+    assert _latency_count('explode', 500) == before + 2
+
+
+def test_profiler_is_stopped_when_the_request_fails(failing_app):
+    failing_app.config['PROPAGATE_EXCEPTIONS'] = True
+    with pytest.raises(RuntimeError):
+        failing_app.test_client().get('/explode?profile=1')
+    profiles = os.listdir(failing_app.config['PROFILE_DIR'])
+    assert len(profiles) == 1 and '-explode-' in profiles[0]
+
+
+def test_profiled_responses_name_their_profile(failing_app):
+    response = failing_app.test_client().get('/about?profile=1')
+    assert response.status_code == 200
+    assert response.headers['X-Profile'] in os.listdir(failing_app.config['PROFILE_DIR'])
+    assert _latency_count('about', 200) >= 1
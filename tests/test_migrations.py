@@ -0,0 +1,76 @@
+# test_migrations.py
+"""Schema migrations upgrade a baseline database once and are no-ops afterwards."""
+
+from sqlalchemy import create_engine, inspect, text
+
+from Doctor_Patient_communication_system.migrations import MIGRATIONS, apply_migrations
+
+# The tables as the app created them before any migration existed
+BASELINE_SCHEMA = [
+    "CREATE TABLE user (id INTEGER PRIMARY KEY, username VARCHAR(80), email VARCHAR(120), "
+    "password VARCHAR(200), is_doctor BOOLEAN)",
+    "CREATE TABLE medical_record (id INTEGER PRIMARY KEY, user_id INTEGER, record_date DATETIME, "
+    "diagnosis TEXT, prescription TEXT, notes TEXT, summary TEXT)",
+    "CREATE TABLE discussion (id INTEGER PRIMARY KEY, title VARCHAR(200), content TEXT, "
+    "date_posted DATETIME, user_id INTEGER)",
+    "CREATE TABLE comment (id INTEGER PRIMARY KEY, content TEXT, date_posted DATETIME, "
+    "user_id INTEGER, discussion_id INTEGER)",
+    "CREATE TABLE chat_history (id INTEGER PRIMARY KEY, user_id INTEGER, message TEXT, "
+    "response TEXT, timestamp DATETIME)",
+]
+
+
+def _baseline_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'baseline.db'}")
+    with engine.begin() as conn:
+        for statement in BASELINE_SCHEMA:
+            conn.execute(text(statement))
+        conn.execute(text("INSERT INTO discussion (id, title, content) VALUES (1, 'Fever', 'three days'), (2, 'Rash', 'itchy')"))
+        conn.execute(text("INSERT INTO comment (content, discussion_id) VALUES ('a', 1), ('b', 1), ('c', 2)"))
+        conn.execute(text("INSERT INTO medical_record (id, user_id, diagnosis) VALUES (1, 1, 'chronic migraine')"))
+    return engine
+
+
+def test_migrations_upgrade_a_baseline_database_once(tmp_path):
+    engine = _baseline_engine(tmp_path)
+    assert apply_migrations(engine) == [migration_id for migration_id, _ in MIGRATIONS]
+    assert apply_migrations(engine) == []
+
+    with engine.connect() as conn:
+        recorded = {row[0] for row in conn.execute(text("SELECT id FROM schema_migrations"))}
+        assert recorded == {migration_id for migration_id, _ in MIGRATIONS}
+        counts = dict(conn.execute(text("SELECT id, comment_count FROM discussion")).all())
+        assert counts == {1: 2, 2: 1}
+        # Existing rows were indexed by the rebuild
+        hits = conn.execute(text("SELECT rowid FROM medical_record_fts WHERE medical_record_fts MATCH 'migraine'")).all()
+        assert hits == [(1,)]
+
+    indexes = {index['name'] for index in inspect(engine).get_indexes('medical_record')}
+    assert 'ix_medical_record_user_id_record_date' in indexes
+
+
+def test_search_triggers_follow_inserts_updates_and_deletes(tmp_path):
+    engine = _baseline_engine(tmp_path)
+    apply_migrations(engine)
+
+    def matches(conn, term):
+        return [row[0] for row in conn.execute(
+            text("SELECT rowid FROM discussion_fts WHERE discussion_fts MATCH :term"), {'term': term}
+        )]
+
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO discussion (id, title, content) VALUES (3, 'Asthma', 'wheezing at night')"))
+        assert matches(conn, 'wheezing') == [3]
+        conn.execute(text("UPDATE discussion SET content = 'coughing at night' WHERE id = 3"))
+        assert matches(conn, 'wheezing') == []
+        assert matches(conn, 'coughing') == [3]
+        conn.execute(text("DELETE FROM discussion WHERE id = 3"))
+        assert matches(conn, 'coughing') == []
+
+
+def test_only_new_migrations_are_applied(tmp_path):
+    engine = _baseline_engine(tmp_path)
+    apply_migrations(engine)
+    extra = MIGRATIONS + [('9999_test_index', ["CREATE INDEX IF NOT EXISTS ix_comment_user_id ON comment (user_id)"])]
+    assert apply_migrations(engine, extra) == ['9999_test_index']
+    assert apply_migrations(engine, extra) == []
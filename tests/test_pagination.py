@@ -0,0 +1,117 @@
+# test_pagination.py
+"""Keyset pagination: cursors round-trip and pages walk every row exactly once, ties included."""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db, Discussion, MedicalRecord, User
+from Doctor_Patient_communication_system.pagination import (
+    StreamedPage, decode_cursor, encode_cursor, keyset_page, parse_datetime
+)
+
+
+def test_cursor_round_trips_datetimes_and_ids():
+    when = datetime(2024, 5, 17, 9, 30, 15, 123456)
+    cursor = encode_cursor(when, 42)
+    assert '=' not in cursor
+    assert decode_cursor(cursor, (parse_datetime, int)) == (when, 42)
+
+
+@pytest.mark.parametrize('cursor', ['', 'not base64!', encode_cursor(1), encode_cursor('x', 1, 2), 'e30'])
+def test_malformed_cursors_raise_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, (parse_datetime, int))
+
+
+def _seed(app, count=23):
+    """Records and discussions with many shared timestamps, so ids break the ties"""
+    with app.app_context():
+        user = User(username='pager', email='pager@example.com', password='x')
+        db.session.add(user)
+        db.session.flush()
+        start = datetime(2024, 1, 1)
+        for i in range(count):
+            when = start + timedelta(minutes=i // 4)
+            db.session.add(MedicalRecord(user_id=user.id, record_date=when, diagnosis=f"d{i}"))
+            db.session.add(Discussion(title=f"t{i}", content='c', date_posted=when, user_id=user.id))
+        db.session.commit()
+        return user.id
+
+
+@pytest.mark.parametrize('descending', [True, False])
+def test_keyset_page_walks_every_row_once(app, descending):
+    _seed(app)
+    with app.app_context():
+        expected = [
+            row.id for row in MedicalRecord.query.order_by(
+                *(c.desc() if descending else c.asc() for c in (MedicalRecord.record_date, MedicalRecord.id))
+            )
+        ]
+        seen, after = [], None
+        while True:
+            rows, has_more = keyset_page(
+                MedicalRecord.query, [MedicalRecord.record_date, MedicalRecord.id],
+                after=after, limit=5, descending=descending,
+            )
+            seen.extend(row.id for row in rows)
+            if not has_more:
+                break
+            after = decode_cursor(encode_cursor(rows[-1].record_date, rows[-1].id), (parse_datetime, int))
+    assert seen == expected
+
+
+def test_streamed_page_walks_every_row_once(app):
+    user_id = _seed(app)
+    columns = [MedicalRecord.record_date, MedicalRecord.id]
+    with app.app_context():
+        seen, after = [], None
+        while True:
+            page = StreamedPage(
+                db.session, db.select(MedicalRecord).where(MedicalRecord.user_id == user_id), columns,
+                key=lambda row: (row[0].record_date, row[0].id), after=after, limit=6, batch_size=4,
+            )
+            seen.extend(row[0].id for row in page)
+            if page.next_cursor is None:
+                assert not page.has_more
+                break
+            after = decode_cursor(page.next_cursor, (parse_datetime, int))
+    assert sorted(seen) == list(range(1, 24))
+    assert len(seen) == len(set(seen))
+
+
+def test_recent_discussions_api_pages_through_everything(app, login):
+    _seed(app)
+    client = login()
+    seen, cursor = [], None
+    while True:
+        response = client.get('/api/recent_discussions', query_string={'limit': 4, **({'cursor': cursor} if cursor else {})})
+        assert response.status_code == 200
+        body = response.get_json()
+        seen.extend(item['id'] for item in body['discussions'])
+        cursor = body['next_cursor']
+        if cursor is None:
+            break
+    assert sorted(seen) == list(range(1, 24))
+    assert len(seen) == len(set(seen))
+    assert client.get('/api/recent_discussions', query_string={'cursor': 'garbage'}).status_code == 400
+
+
+def test_patients_api_lists_everyone_unless_paged(app, login):
+    with app.app_context():
+        for i in range(7):
+            db.session.add(User(username=f"p{i}", email=f"p{i}@example.com", password='x'))
+        db.session.commit()
+    client = login('doctor@example.com', is_doctor=True)
+
+    body = client.get('/api/patients').get_json()
+    assert set(body) == {'patients'}
+    everyone = [patient['username'] for patient in body['patients']]
+    assert everyone == [f"p{i}" for i in range(7)]
+
+    seen, after_id = [], 0
+    while after_id is not None:
+        body = client.get('/api/patients', query_string={'limit': 3, 'after_id': after_id}).get_json()
+        seen.extend(patient['username'] for patient in body['patients'])
+        after_id = body['next_after_id']
+    assert seen == everyone
@@ -0,0 +1,77 @@
+# test_patient_records_api.py
+"""GET /api/patient/<id>/records keeps its original shape; trimming and streaming are opt-in."""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db, MedicalRecord, User
+
+
+@pytest.fixture
+def patient(app, login):
+    client = login('patient@example.com')
+    with app.app_context():
+        user = User.query.filter_by(email='patient@example.com').one()
+        for i in range(5):
+            db.session.add(MedicalRecord(user_id=user.id, record_date=datetime(2024, 1, 1) + timedelta(days=i),
+                                         diagnosis=f"d{i}", notes=f"n{i}", summary=f"s{i}"))
+        db.session.commit()
+        return client, user.id
+
+
+def test_default_response_matches_the_original_fields(patient):
+    client, user_id = patient
+    response = client.get(f'/api/patient/{user_id}/records')
+    assert response.status_code == 200
+    assert response.content_length is not None
+    body = response.get_json()
+    assert set(body) == {'records'}
+    assert [record['diagnosis'] for record in body['records']] == ['d4', 'd3', 'd2', 'd1', 'd0']
+    assert set(body['records'][0]) == {'id', 'record_date', 'diagnosis', 'summary'}
+    assert body['records'][0]['summary'] == 's4'
+
+
+@pytest.mark.parametrize('fields, expected', [
+    ('notes', {'id', 'record_date', 'diagnosis', 'notes'}),
+    ('notes,summary', {'id', 'record_date', 'diagnosis', 'notes', 'summary'}),
+    ('', {'id', 'record_date', 'diagnosis'}),
+])
+def test_fields_select_the_text_columns(patient, fields, expected):
+    client, user_id = patient
+    records = client.get(f'/api/patient/{user_id}/records', query_string={'fields': fields}).get_json()['records']
+    assert set(records[0]) == expected
+
+
+def test_unknown_fields_are_rejected(patient):
+    client, user_id = patient
+    assert client.get(f'/api/patient/{user_id}/records?fields=password').status_code == 400
+
+
+def test_streaming_is_opt_in_and_returns_the_same_records(patient):
+    client, user_id = patient
+    plain = client.get(f'/api/patient/{user_id}/records').get_json()
+    response = client.get(f'/api/patient/{user_id}/records?stream=1')
+    # Sent in chunks, so there is no Content-Length up front
+    assert response.content_length is None
+    streamed = response.get_json()
+    assert streamed['records'] == plain['records']
+    assert streamed['next_cursor'] is None
+
+
+def test_pages_walk_every_record(patient):
+    client, user_id = patient
+    seen, cursor = [], None
+    while True:
+        query = {'limit': 2, **({'cursor': cursor} if cursor else {})}
+        body = client.get(f'/api/patient/{user_id}/records', query_string=query).get_json()
+        seen.extend(record['diagnosis'] for record in body['records'])
+        cursor = body['next_cursor']
+        if cursor is None:
+            break
+    assert seen == ['d4', 'd3', 'd2', 'd1', 'd0']
+
+
+def test_patients_cannot_read_other_patients_records(patient):
+    client, user_id = patient
+    assert client.get(f'/api/patient/{user_id + 1}/records').status_code == 403
@@ -0,0 +1,70 @@
+# test_qa_scoring.py
+"""Question-answering spans are scored exactly like transformers' pipeline."""
+
+import numpy as np
+import pytest
+
+from Doctor_Patient_communication_system.inference_scheduler import best_qa_span, cached_qa_batch_fn
+
+TINY_QA_MODEL = "hf-internal-testing/tiny-random-BertForQuestionAnswering"
+
+
+def pipeline_postprocess(start_logits, end_logits, p_mask, max_answer_len):
+    """QuestionAnsweringPipeline.postprocess for one feature, with top_k=1"""
+    undesired = np.asarray(p_mask) == 1
+    start = np.where(undesired, -10000.0, start_logits)
+    end = np.where(undesired, -10000.0, end_logits)
+    start = np.exp(start - start.max())
+    start = start / start.sum()
+    end = np.exp(end - end.max())
+    end = end / end.sum()
+    start[0] = end[0] = 0.0
+    candidates = np.tril(np.triu(np.outer(start, end)), max_answer_len - 1)
+    s, e = np.unravel_index(np.argmax(candidates), candidates.shape)
+    return float(candidates[s, e]), int(s), int(e)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_span_scores_match_the_pipeline_including_the_null_answer(seed):
+    rng = np.random.default_rng(seed)
+    # [CLS] question(5) [SEP] context(12) [SEP]
+    length, context_start, context_end = 20, 7, 19
+    start_logits = rng.normal(size=length)
+    end_logits = rng.normal(size=length)
+    # A confident "no answer" must pull every span score down
+    start_logits[0] += 4.0
+    end_logits[0] += 4.0
+    p_mask = np.ones(length, dtype=int)
+    p_mask[0] = 0
+    p_mask[context_start:context_end] = 0
+
+    expected = pipeline_postprocess(start_logits, end_logits, p_mask, max_answer_len=5)
+    score, start, end = best_qa_span(start_logits, end_logits, context_start, context_end,
+                                     null_positions=[0], max_answer_len=5)
+    assert (start + context_start, end + context_start) == expected[1:]
+    assert score == pytest.approx(expected[0], rel=1e-9)
+
+
+def test_empty_context_has_no_span():
+    assert best_qa_span(np.zeros(4), np.zeros(4), 3, 3, [0]) == (0.0, None, None)
+
+
+def test_cached_batch_fn_matches_the_pipeline_on_a_tiny_model():
+    transformers = pytest.importorskip("transformers")
+    pytest.importorskip("torch")
+    try:
+        qa = transformers.pipeline("question-answering", model=TINY_QA_MODEL)
+    except OSError as e:
+        pytest.skip(f"{TINY_QA_MODEL} is not available: {e}")
+
+    pairs = [
+        ("What was prescribed?", "The patient was prescribed amoxicillin for ten days after a throat infection."),
+        ("When is the follow-up?", "Blood pressure was normal. A follow-up visit is booked for next Tuesday morning."),
+        ("Which allergy?", " ".join(["Routine check, nothing of note."] * 80) + " Allergic to penicillin."),
+    ]
+    run = cached_qa_batch_fn(qa, max_answer_len=15)
+    for (question, context), result in zip(pairs, run(pairs)):
+        expected = qa(question=question, context=context, max_answer_len=15)
+        assert result["answer"] == expected["answer"]
+        assert (result["start"], result["end"]) == (expected["start"], expected["end"])
+        assert result["score"] == pytest.approx(expected["score"], rel=1e-4)
@@ -0,0 +1,82 @@
+# test_record_import.py
+"""Record import: nothing is committed for undecodable files, partial commits are reported."""
+
+import io
+
+import pytest
+
+import app as core
+from app import db, MedicalRecord, User
+from Doctor_Patient_communication_system.record_io import ImportFailed, import_records
+
+HEADER = b"patient_email,record_date,diagnosis,prescription,notes\n"
+
+
+def _rows(count):
+    return b"".join(b"pat@example.com,2024-01-02,Diagnosis %d,,\n" % i for i in range(count))
+
+
+@pytest.fixture
+def doctor(app, login):
+    client = login('doctor@example.com', is_doctor=True)
+    with app.app_context():
+        db.session.add(User(username='pat', email='pat@example.com', password='x'))
+        db.session.commit()
+    app.config['IMPORT_CHUNK_SIZE'] = 2
+    return client
+
+
+def _record_count(app):
+    with app.app_context():
+        return MedicalRecord.query.count()
+
+
+def test_undecodable_file_commits_nothing(app, doctor):
+    # Far past the decoder's read buffer, so earlier chunks would have been committed
+    body = HEADER + _rows(2000) + b"pat@example.com,2024-02-01,Caf\xe9 fever,,\n"
+    response = doctor.post('/records/import', data=body, content_type='text/csv')
+    assert response.status_code == 400
+    assert response.get_json()['inserted'] == 0
+    assert _record_count(app) == 0
+
+
+def test_bad_rows_are_reported_and_good_rows_imported(app, doctor):
+    body = HEADER + _rows(3) + b"pat@example.com,not a date,Flu,,\nnobody@example.com,,Flu,,\n"
+    response = doctor.post('/records/import', data=body, content_type='text/csv')
+    assert response.status_code == 200
+    result = response.get_json()
+    assert result['inserted'] == 3
+    assert [error['line'] for error in result['errors']] == [5, 6]
+    assert _record_count(app) == 3
+
+
+def test_database_failure_reports_the_committed_rows(app):
+    with app.app_context():
+        db.session.add(User(username='pat', email='pat@example.com', password='x'))
+        db.session.commit()
+        calls = []
+
+        def on_chunk(session, inserted):
+            calls.append(len(inserted))
+            if len(calls) == 3:
+                raise RuntimeError("disk full")
+
+        stream = io.StringIO((HEADER + _rows(7)).decode())
+        with pytest.raises(ImportFailed) as failure:
+            import_records(db.session, MedicalRecord, User, stream, 'csv', chunk_size=2, on_chunk=on_chunk)
+        assert failure.value.result['inserted'] == 4
+        assert 'line 6' in str(failure.value) and '4 records were committed' in str(failure.value)
+        assert MedicalRecord.query.count() == 4
+
+
+def test_import_route_reports_partial_imports(app, doctor, monkeypatch):
+    def fail(*args, **kwargs):
+        raise ImportFailed("Import stopped at line 4 after 2 records were committed: disk full",
+                           {'inserted': 2, 'error_count': 0, 'errors': []})
+
+    monkeypatch.setattr(core, 'import_records', fail)
+    response = doctor.post('/records/import', data=HEADER + _rows(4), content_type='text/csv')
+    assert response.status_code == 500
+    body = response.get_json()
+    assert body['inserted'] == 2
+    assert '2 records were committed' in body['error']
@@ -0,0 +1,117 @@
+# test_retrieval.py
+"""Retrieval index: owner-aware IVF search, the single writer, and syncing from the database."""
+
+import zlib
+
+import numpy as np
+import pytest
+
+import app as core
+from Doctor_Patient_communication_system.retrieval import PUBLIC_OWNER, RetrievalService, VectorIndex
+
+
+class HashEmbedder:
+    """Deterministic bag-of-words vectors, so tests need no model"""
+
+    dim = 64
+
+    def encode(self, texts):
+        rows = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in zip(rows, texts):
+            for word in text.lower().split():
+                row[zlib.crc32(word.encode()) % self.dim] += 1.0
+            row /= max(np.linalg.norm(row), 1e-9)
+        return rows
+
+
+def _unit(rng, dim=16):
+    vector = rng.normal(size=dim).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_ivf_search_finds_a_users_own_rows_outside_the_probed_lists():
+    rng = np.random.default_rng(0)
+    index = VectorIndex(16, ivf_min_size=200, nprobe=1)
+    for i in range(400):
+        index.upsert(f"discussion:{i}", PUBLIC_OWNER, [f"public {i}"], _unit(rng)[None])
+    private = _unit(rng)
+    index.upsert("record:1", 7, ["private"], private[None])
+    assert index._centroids is not None
+
+    # A query pointing away from the private row: its list is unlikely to be probed
+    results = index.search(-private, k=500, owner=7)
+    assert "record:1" in [key for _, key, _ in results]
+    assert "record:1" not in [key for _, key, _ in index.search(-private, k=500, owner=8)]
+
+
+def test_only_one_service_per_index_path_is_the_writer(tmp_path):
+    path = str(tmp_path / 'index')
+    writer = RetrievalService(HashEmbedder, index_path=path)
+    reader = RetrievalService(HashEmbedder, index_path=path)
+    assert writer.acquire_writer()
+    assert not reader.acquire_writer()
+
+    writer.index_documents([('record', 1, 5, 'chest pain and fever')])
+    assert writer.save(force=True)
+    assert not reader.save(force=True)
+    assert reader.refresh() and reader.ready
+    assert reader.document_ids() == {'record': {1}}
+
+
+@pytest.fixture
+def indexed_app(app, tmp_path):
+    app.extensions['retrieval'] = RetrievalService(HashEmbedder, index_path=str(tmp_path / 'index'))
+    with app.app_context():
+        patient = core.User(username='patient', email='patient@example.com', password='x')
+        core.db.session.add(patient)
+        core.db.session.commit()
+    return app
+
+
+def test_sync_applies_queued_changes(indexed_app):
+    with indexed_app.app_context():
+        record = core.MedicalRecord(user_id=1, diagnosis='Migraine', notes='Severe headache')
+        core.db.session.add(record)
+        core.db.session.commit()
+        assert core.RetrievalChange.query.count() == 1
+
+        core.sync_retrieval_index()
+        assert core.retrieval.ready
+        assert core.RetrievalChange.query.count() == 0
+        assert core.retrieval.document_ids() == {'record': {record.id}}
+
+        record.notes = 'Headache resolved'
+        core.db.session.commit()
+        core.sync_retrieval_index()
+        assert core.retrieval.is_current(*core.retrieval_document(record))
+
+        core.db.session.delete(record)
+        core.db.session.commit()
+        core.sync_retrieval_index()
+        assert core.retrieval.document_ids() == {}
+
+
+def test_reconcile_indexes_rows_written_without_queued_changes(indexed_app):
+    with indexed_app.app_context():
+        core.sync_retrieval_index()
+        # Core inserts bypass the session's flush events
+        core.db.session.execute(core.db.insert(core.MedicalRecord).values(
+            user_id=1, diagnosis='Asthma', record_date=core.datetime.utcnow()))
+        core.db.session.commit()
+        core.sync_retrieval_index()
+        assert core.retrieval.document_ids() == {}
+
+        core.retrieval.reconciled_at -= indexed_app.config['RETRIEVAL_RECONCILE_SECONDS']
+        core.sync_retrieval_index()
+        assert core.retrieval.document_ids() == {'record': {1}}
+
+
+
+def test_first_request_starts_the_sync(indexed_app, client):
+    with indexed_app.app_context():
+        assert core._built('retrieval_sync') is None
+    client.get('/api/patients')
+    with indexed_app.app_context():
+        sync = core._built('retrieval_sync')
+        assert sync is not None
+        sync.stop()
@@ -0,0 +1,52 @@
+# test_search.py
+"""Full-text search: kinds are interleaved rather than mixed by bm25, and LIKE patterns are escaped."""
+
+from datetime import datetime
+
+from app import db, Discussion, MedicalRecord, User
+from Doctor_Patient_communication_system.search import _like_statement, like_pattern, search
+
+
+def _seed(app):
+    with app.app_context():
+        user = User(username='doc', email='doc@example.com', password='x', is_doctor=True)
+        db.session.add(user)
+        db.session.flush()
+        for i in range(4):
+            db.session.add(MedicalRecord(user_id=user.id, record_date=datetime(2024, 1, 1 + i),
+                                         diagnosis='Asthma', notes='asthma asthma asthma'))
+        db.session.add(Discussion(title='Living with asthma', content='Long story about many other things ' * 20,
+                                  user_id=user.id))
+        db.session.add(Discussion(title='Inhalers', content='Which inhaler for asthma at night?', user_id=user.id))
+        db.session.commit()
+        return user.id
+
+
+def test_all_kinds_are_interleaved_by_rank_within_kind(app):
+    user_id = _seed(app)
+    with app.app_context():
+        results, has_more = search(db.session.connection(), 'asthma', user_id, True,
+                                   kinds=('record', 'discussion'), per_page=4)
+    assert [result['kind'] for result in results] == ['record', 'discussion', 'record', 'discussion']
+    # Newest first among equally ranked records
+    assert [result['date'].day for result in results if result['kind'] == 'record'] == [4, 3]
+    assert has_more
+
+
+def test_like_fallback_treats_wildcards_literally(app):
+    with app.app_context():
+        user = User(username='pat', email='pat@example.com', password='x')
+        db.session.add(user)
+        db.session.flush()
+        for diagnosis in ('type_2 diabetes', 'type-2 diabetes', '100% recovered', '100 recovered'):
+            db.session.add(MedicalRecord(user_id=user.id, record_date=datetime(2024, 1, 1), diagnosis=diagnosis))
+        db.session.commit()
+
+        def diagnoses(word):
+            statement = _like_statement('record', False, [word])
+            rows = db.session.connection().execute(statement, {'word0': like_pattern(word), 'limit': 10})
+            return sorted(row.title for row in rows)
+
+        assert diagnoses('type_2') == ['type_2 diabetes']
+        assert diagnoses('100%') == ['100% recovered']
+        assert like_pattern('a\\b') == '%a\\\\b%'
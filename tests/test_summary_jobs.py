@@ -0,0 +1,60 @@
+# test_summary_jobs.py
+"""Summary jobs are claimed atomically, so any worker may queue any job."""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as core
+
+
+@pytest.fixture
+def job_ids(app):
+    with app.app_context():
+        patient = core.User(username='patient', email='patient@example.com', password='x')
+        core.db.session.add(patient)
+        jobs = []
+        for i in range(3):
+            record = core.MedicalRecord(patient=patient, diagnosis=f'Diagnosis {i}', notes=f'Notes {i}')
+            jobs.append(core.SummaryJob(record=record))
+        core.db.session.add_all(jobs)
+        core.db.session.commit()
+        return [job.id for job in jobs]
+
+
+def _age(job_id, seconds):
+    job = core.db.session.get(core.SummaryJob, job_id)
+    job.updated_at = datetime.utcnow() - timedelta(seconds=seconds)
+    core.db.session.commit()
+
+
+def test_a_job_is_claimed_once(app, job_ids):
+    with app.app_context():
+        assert sorted(core.claim_summary_jobs(job_ids)) == job_ids
+        assert core.claim_summary_jobs(job_ids) == []
+        job = core.db.session.get(core.SummaryJob, job_ids[0])
+        assert (job.status, job.attempts) == ('running', 1)
+
+
+def test_stale_running_jobs_are_reclaimed(app, job_ids):
+    with app.app_context():
+        core.claim_summary_jobs(job_ids)
+        _age(job_ids[0], app.config['SUMMARY_JOB_STALE_SECONDS'] + 60)
+        assert core.claim_summary_jobs(job_ids) == [job_ids[0]]
+        assert core.db.session.get(core.SummaryJob, job_ids[0]).attempts == 2
+
+
+def test_requeue_skips_live_jobs_and_fails_exhausted_ones(app, job_ids, monkeypatch):
+    submitted = []
+    monkeypatch.setattr(core, 'submit_summary_batches', submitted.extend)
+    with app.app_context():
+        core.claim_summary_jobs(job_ids[:2])
+        exhausted = core.db.session.get(core.SummaryJob, job_ids[1])
+        exhausted.attempts = app.config['SUMMARY_JOB_MAX_ATTEMPTS']
+        core.db.session.commit()
+        _age(job_ids[1], app.config['SUMMARY_JOB_STALE_SECONDS'] + 60)
+        
+        assert core.requeue_pending_summary_jobs() == 1
+        assert submitted == [job_ids[2]]
+        assert core.db.session.get(core.SummaryJob, job_ids[0]).status == 'running'
+        assert core.db.session.get(core.SummaryJob, job_ids[1]).status == 'failed'
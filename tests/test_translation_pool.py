@@ -0,0 +1,92 @@
+# test_translation_pool.py
+"""Translation model pool: room is made before a model loads, not after."""
+
+import pytest
+
+from Doctor_Patient_communication_system.translation_engine import DEFAULT_MODEL_BYTES, TranslationModelPool
+
+MB = 1024 * 1024
+
+
+class Weights:
+    def __init__(self, nbytes):
+        self.nbytes = nbytes
+
+    def numel(self):
+        return self.nbytes
+
+    def element_size(self):
+        return 1
+
+
+class FakeModel:
+    def __init__(self, nbytes):
+        self._weights = [Weights(nbytes)]
+
+    def parameters(self):
+        return iter(self._weights)
+
+    def buffers(self):
+        return iter(())
+
+
+class FakePipe:
+    def __init__(self, nbytes):
+        self.model = FakeModel(nbytes)
+
+
+MODELS = {('en', 'fr'): 'en-fr', ('en', 'de'): 'en-de', ('en', 'es'): 'en-es'}
+
+
+def test_least_recently_used_pairs_are_unloaded_before_loading():
+    resident_at_load = []
+    pool = None
+
+    def loader(name):
+        resident_at_load.append(pool.stats()['loaded'])
+        return FakePipe(DEFAULT_MODEL_BYTES)
+
+    pool = TranslationModelPool(loader, memory_budget=2 * DEFAULT_MODEL_BYTES, models=MODELS)
+    pool.get('en', 'fr')
+    pool.get('en', 'de')
+    pool.get('en', 'fr')
+    pool.get('en', 'es')
+
+    # en-de was least recently used, and was gone before en-es started loading
+    assert resident_at_load == [[], ['en-fr'], ['en-fr']]
+    assert pool.stats()['loaded'] == ['en-fr', 'en-es']
+    assert pool.stats()['reserved_bytes'] == 0
+
+
+def test_reservation_uses_the_last_measured_size():
+    sizes = {'en-fr': 100 * MB, 'en-de': 100 * MB, 'en-es': 700 * MB}
+    resident_at_load = {}
+    pool = None
+
+    def loader(name):
+        resident_at_load[name] = pool.stats()['loaded']
+        return FakePipe(sizes[name])
+
+    pool = TranslationModelPool(loader, memory_budget=800 * MB, models=MODELS)
+    pool.get('en', 'es')
+    pool.get('en', 'fr')
+    pool.get('en', 'de')
+    # en-de was unknown, so a default-sized reservation pushed en-es out first
+    assert resident_at_load['en-de'] == ['en-fr']
+    assert pool.stats()['loaded'] == ['en-fr', 'en-de']
+
+    # en-es is now known to need 700 MB: only the least recent small pair goes
+    pool.get('en', 'es')
+    assert resident_at_load['en-es'] == ['en-de']
+    assert pool.stats()['resident_bytes'] == 800 * MB
+
+
+def test_a_failed_load_releases_its_reservation():
+    def loader(name):
+        raise OSError("sentencepiece is not installed")
+
+    pool = TranslationModelPool(loader, memory_budget=DEFAULT_MODEL_BYTES, models=MODELS)
+    with pytest.raises(OSError):
+        pool.get('en', 'fr')
+    assert pool.stats()['reserved_bytes'] == 0
+    assert 'en-fr' in pool.stats()['failed']
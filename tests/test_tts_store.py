@@ -0,0 +1,44 @@
+# test_tts_store.py
+"""Audio store: pending markers stay fresh while jobs are queued or running."""
+
+import time
+
+from Doctor_Patient_communication_system.tts_store import AudioStore, StubBackend
+
+
+def test_markers_of_queued_and_running_jobs_are_kept_fresh(tmp_path):
+    backend = StubBackend(delay=0.8)
+    store = AudioStore(str(tmp_path), backend, sweep_interval=0, pending_timeout=0.4, max_workers=1)
+    other = AudioStore(str(tmp_path), StubBackend(), sweep_interval=0, pending_timeout=0.4)
+    try:
+        running, _ = store.request('first', 'en')
+        queued, _ = store.request('second', 'en')
+
+        # Both outlive pending_timeout, yet another process still sees them as in progress
+        time.sleep(0.6)
+        for key in (running, queued):
+            assert other.status(key) == ('pending', None)
+            assert not other._claim(key)
+
+        deadline = time.time() + 5
+        while store.status(queued)[0] != 'done' and time.time() < deadline:
+            time.sleep(0.05)
+        assert other.status(queued)[0] == 'done'
+        assert backend.calls == 2
+    finally:
+        store.close()
+        other.close()
+
+
+def test_status_endpoint_reports_failures_and_unknown_jobs(app, login):
+    client = login()
+    store = app.extensions['audio_store']
+    key = store.key('broken', 'en')
+    with open(store._path(f"{key}.failed"), 'w', encoding='utf-8') as f:
+        f.write('engine crashed')
+
+    response = client.get(f'/text_to_speech/{key}')
+    assert response.status_code == 500
+    assert response.get_json()['status'] == 'failed'
+    assert 'engine crashed' in response.get_json()['error']
+    assert client.get(f'/text_to_speech/{"0" * 64}').status_code == 404
@@ -0,0 +1,142 @@
+# test_write_behind.py
+"""Write-behind buffer: failing batches, the pending cap, and writes after close."""
+
+import time
+from datetime import datetime
+
+from sqlalchemy.exc import OperationalError
+
+from app import db, ChatHistory, User
+from Doctor_Patient_communication_system.write_behind import WriteBehindBuffer
+
+
+class Transient(Exception):
+    pass
+
+
+class FlakyStore:
+    """Rejects batches containing a ``bad`` row, and every batch while ``down``"""
+
+    def __init__(self):
+        self.rows = []
+        self.down = False
+
+    def __call__(self, rows):
+        if self.down:
+            raise Transient("database is locked")
+        if any(row.get('bad') for row in rows):
+            raise ValueError("constraint failed")
+        self.rows.extend(rows)
+
+
+def _buffer(store, **kwargs):
+    kwargs.setdefault('max_delay', 3600)
+    return WriteBehindBuffer(store, retryable=lambda exc: isinstance(exc, Transient), **kwargs)
+
+
+def test_bad_rows_are_isolated_and_dead_lettered():
+    store, dead = FlakyStore(), []
+    buffer = _buffer(store, dead_letter=lambda rows, exc: dead.extend(rows))
+    rows = [{'n': i, 'bad': i in (3, 6)} for i in range(8)]
+    for row in rows:
+        buffer.append(row)
+
+    assert buffer.flush() == 6
+    assert [row['n'] for row in store.rows] == [0, 1, 2, 4, 5, 7]
+    assert [row['n'] for row in dead] == [3, 6]
+    assert buffer.pending() == 0
+    assert buffer.stats()['dead_rows'] == 2
+    buffer.close()
+
+
+def test_retryable_failures_are_requeued_in_order():
+    store = FlakyStore()
+    buffer = _buffer(store)
+    for i in range(3):
+        buffer.append({'n': i})
+    store.down = True
+    assert buffer.flush() == 0
+    buffer.append({'n': 3})
+    assert buffer.pending() == 4
+
+    store.down = False
+    assert buffer.flush() == 4
+    assert [row['n'] for row in store.rows] == [0, 1, 2, 3]
+    assert buffer.stats()['dead_rows'] == 0
+    buffer.close()
+
+
+def test_requeued_rows_respect_the_pending_cap():
+    store = FlakyStore()
+    buffer = _buffer(store, max_pending=5)
+    store.down = True
+    for i in range(4):
+        buffer.append({'n': i})
+    buffer.flush()
+    for i in range(4, 8):
+        buffer.append({'n': i})
+    assert buffer.pending() == 5
+    assert buffer.stats()['dropped_rows'] == 3
+
+    store.down = False
+    buffer.flush()
+    assert [row['n'] for row in store.rows] == [3, 4, 5, 6, 7]
+    buffer.close()
+
+
+def test_append_after_close_writes_synchronously():
+    store = FlakyStore()
+    buffer = _buffer(store)
+    buffer.append({'n': 0})
+    buffer.close()
+    assert [row['n'] for row in store.rows] == [0]
+
+    buffer.append({'n': 1})
+    assert [row['n'] for row in store.rows] == [0, 1]
+    assert buffer.pending() == 0
+
+    # Nothing is left to retry a transient failure, so the row is dropped, not stranded
+    store.down = True
+    buffer.append({'n': 2})
+    assert buffer.pending() == 0
+    assert buffer.stats()['dead_rows'] == 1
+
+
+def test_chat_history_buffer_skips_rows_the_database_rejects(app):
+    with app.app_context():
+        user = User(username='chatter', email='chatter@example.com', password='x')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+        buffer = app.extensions['chat_history_buffer']
+        now = datetime.utcnow()
+        buffer.append({'user_id': user_id, 'message': 'hi', 'response': 'hello', 'timestamp': now})
+        buffer.append({'user_id': user_id, 'message': None, 'response': 'bad', 'timestamp': now})
+        buffer.append({'user_id': user_id, 'message': 'bye', 'response': 'goodbye', 'timestamp': now})
+        assert buffer.flush() == 2
+        assert sorted(row.message for row in ChatHistory.query) == ['bye', 'hi']
+        assert buffer.retryable(OperationalError('INSERT', {}, Exception('database is locked')))
+        buffer.close()
+
+
+def test_retryable_failures_back_off_instead_of_spinning():
+    calls = []
+
+    def flush_fn(rows):
+        calls.append(time.monotonic())
+        if len(calls) < 4:
+            raise Transient("database is locked")
+
+    buffer = WriteBehindBuffer(flush_fn, max_rows=1, max_delay=0.01, retryable=lambda exc: isinstance(exc, Transient),
+                               retry_delay=0.1, max_retry_delay=0.2)
+    buffer.append({'n': 0})
+    deadline = time.monotonic() + 5
+    while buffer.stats()['flushed_rows'] == 0 and time.monotonic() < deadline:
+        time.sleep(0.02)
+
+    # Three failures, waiting 0.1s, 0.2s and 0.2s (capped) before each retry
+    assert len(calls) == 4
+    gaps = [later - earlier for earlier, later in zip(calls, calls[1:])]
+    assert gaps[0] >= 0.09 and gaps[1] >= 0.19 and gaps[2] >= 0.19
+    assert buffer.stats()['failed_flushes'] == 3
+    buffer.close()